@@ -0,0 +1,20 @@
+from fastapi import Depends
+
+from app.core.clients import ClientRegistry, get_clients
+from app.services.query_service import QueryService
+from app.services.supermemory_service import SupermemoryService
+from app.services.voice_service import VoiceService
+
+
+# Services are thin wrappers over the shared clients, so building one per request is free
+
+def get_voice_service(clients: ClientRegistry = Depends(get_clients)) -> VoiceService:
+    return VoiceService(clients)
+
+
+def get_supermemory_service(clients: ClientRegistry = Depends(get_clients)) -> SupermemoryService:
+    return SupermemoryService(clients)
+
+
+def get_query_service(clients: ClientRegistry = Depends(get_clients)) -> QueryService:
+    return QueryService(clients)
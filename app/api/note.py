@@ -1,52 +1,68 @@
-from fastapi import HTTPException
+import asyncio
+
+from fastapi import Depends, HTTPException
 from fastapi.routing import APIRouter
-import supermemory
 
+from app.api.dependencies import get_supermemory_service, get_voice_service
+from app.core.auth import get_current_user_id
 from app.services.voice_service import VoiceService
-from app.services import supermemory_service
-from app.services.query_service import QueryService
+from app.services.supermemory_service import SupermemoryService
+from app.utilities.sse import sse_response
 
 
 router = APIRouter()
 
 
 @router.post("/add-note")
-async def add_notes(text: str) -> dict:  # ✅ Fixed: returns dict not str
+async def add_notes(
+    text: str,
+    user_id: str = Depends(get_current_user_id),
+    voiceservice: VoiceService = Depends(get_voice_service),
+    supermemory: SupermemoryService = Depends(get_supermemory_service)
+) -> dict:  # ✅ Fixed: returns dict not str
     try:
-        voiceservice = VoiceService()
-        supermemory = supermemory_service.SupermemoryService()
-        extracted_data = voiceservice.extract_and_split(text)
+        extracted_data = await voiceservice.extract_and_split(text, user_id)
 
 
-        responses = []
-        for item in extracted_data["items"]:  # ✅ Fixed: iterate over items
-              result = await supermemory.add_document(item, "demo_user")  # ✅ Fixed: await
-              responses.append(result)
+        # All items go out at once - latency tracks the slowest write, not the sum
+        written, _ = await asyncio.gather(
+            supermemory.add_documents(extracted_data["items"], user_id),
+            voiceservice.update_summaries(extracted_data["items"], user_id)
+        )
+        if written["errors"] and not written["results"]:
+            raise Exception(f"Failed to add any items: {written['errors']}")
 
         return {
-            "status": "success",
-            "items_created": len(responses),
-            "items": responses
+            "status": "partial" if written["errors"] else "success",
+            "items_created": len(written["results"]),
+            "items": written["results"],
+            "errors": written["errors"]
         }
     except Exception as e:
         print(f"Error adding note: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/chat")
-async def chat_notes(q: str):
+async def chat_notes(
+    q: str,
+    stream: bool = False,
+    user_id: str = Depends(get_current_user_id),
+    supermemory: SupermemoryService = Depends(get_supermemory_service)
+):
+    """Search memories for a question. `stream=true` also synthesizes an answer, streamed as SSE."""
+    if stream:
+        return sse_response(supermemory.stream_two_phrase_search(user_id, q, limit=10))
     try:
-        supermemory = supermemory_service.SupermemoryService()
-        return await supermemory.two_phrase_search("demo_user", q, limit=10)
+        return await supermemory.two_phrase_search(user_id, q, limit=10)
     except Exception as e:
         print(f"Failed to fetch {e}")
         raise HTTPException(status_code=500, detail="failed to fetch")
 
 
 @router.post("/chat-test")
-async def chat_test(q: str):
+async def chat_test(q: str, user_id: str = Depends(get_current_user_id), supermemory: SupermemoryService = Depends(get_supermemory_service)):
     try:
-        supermemory = supermemory_service.SupermemoryService()
-        return supermemory._analyze_query(q)  # ✅ No await - not an async method
+        return await supermemory._analyze_query(q)
     except Exception as e:
         print(f"Failed to fetch {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,12 +1,19 @@
+import asyncio
 import uuid
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from typing import List
-from app.core.supabase_client import get_supabase
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from typing import Literal, Optional
 import os
 from datetime import datetime
-from app.services.voice_service import VoiceService
+from app.services.voice_service import VoiceService, max_audio_size
+from app.services.job_service import IngestionJobQueue, format_ingestion_result, get_ingestion_queue
+from app.api.dependencies import get_query_service, get_supermemory_service, get_voice_service
 from app.services.supermemory_service import SupermemoryService
 from app.services.query_service import QueryService
+from app.utilities.audio_buffer import AudioTooLargeError, InvalidUploadError, read_upload
+from app.core.auth import get_current_user_id
+from app.core.config import settings
+from app.utilities.pagination import InvalidPageRequestError
+from app.utilities.sse import sse_response
 
 router = APIRouter()
 
@@ -14,10 +21,19 @@ router = APIRouter()
 ALLOWED_EXTENSIONS = {".wav", ".m4a", ".mp3", ".webm", ".ogg", ".flac"}
 
 
-def validate_audio_file(file: UploadFile) -> None:
+def audio_form(field: str) -> dict:
+    """OpenAPI body for an endpoint that streams the `field` file itself (see read_upload)"""
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "properties": {field: {"type": "string", "format": "binary"}},
+        "required": [field]
+    }}}}}
+
+
+def validate_audio_file(filename: str, content_type: str) -> None:
     """Validate uploaded audio file format and size."""
     # Check file extension
-    file_ext = os.path.splitext(file.filename)[1].lower()
+    file_ext = os.path.splitext(filename)[1].lower()
     if file_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
@@ -25,7 +41,7 @@ def validate_audio_file(file: UploadFile) -> None:
         )
 
     # Check content type
-    if not file.content_type or not file.content_type.startswith("audio/"):
+    if not content_type or not content_type.startswith("audio/"):
         raise HTTPException(
             status_code=400,
             detail="File must be an audio file"
@@ -33,120 +49,186 @@ def validate_audio_file(file: UploadFile) -> None:
         
 
 
-@router.post("/add-voice", response_model=dict)
-async def add_voice_notes(audio: UploadFile = File(...)) -> dict:
-    audio_bytes = await audio.read()
-    voice_service = VoiceService()
+@router.post("/add-voice", status_code=202, response_model=dict, openapi_extra=audio_form("audio"))
+async def add_voice_notes(
+    request: Request,
+    user_id: str = Depends(get_current_user_id),
+    queue: IngestionJobQueue = Depends(get_ingestion_queue)
+) -> dict:
+    """
+    Accept a recording and process it in the background.
 
+    Returns 202 with a job id - follow it via /jobs/{job_id} or /jobs/{job_id}/events.
+    """
     filename = f"{uuid.uuid4().hex[:5]}.wav" # temporary for the frontend integrations 
 
     try:
-        result = await voice_service.upload_and_create(filename, audio_bytes)
-
-        # Detect if this is a query response (has 'results' key)
-        # or a push response (list of database notes)
-        if isinstance(result, dict) and "results" in result:
-            # Query response: {transcription, query, results: [...]}
-            return {
-                "notes_created": len(result["results"]),
-                "notes": result["results"],
-                "status": "retrieved",
-                "transcription": result["transcription"],
-                "query": result["query"]
-            }
-        else:
-            # Push response: list of database notes
-            return {
-                "notes_created": len(result),
-                "notes": result,
-                "status": "pushed"
-            }
-    except ValueError as e:  # File size validation
-        raise HTTPException(status_code=400, detail=str(e))
+        audio_buffer = await read_upload(request, "audio", filename, max_size=max_audio_size())
+    except AudioTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Server is busy with other uploads, try again shortly")
+
+    try:
+        job = await queue.submit(filename, audio_buffer, user_id)
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "stage": job["stage"]
+        }
+    except asyncio.QueueFull:
+        await audio_buffer.close()
+        raise HTTPException(status_code=503, detail="Ingestion queue is full, try again shortly")
 
     except Exception as e:  # Storage/DB errors
-        print(f"Upload failed: {e}")
+        await audio_buffer.close()
+        print(f"Failed to queue upload: {e}")
         raise HTTPException(status_code=500, detail="Upload failed")
 
-@router.post("/upload", response_model=dict)
-async def upload_voice_note(file: UploadFile = File(...)):
+
+@router.get("/jobs/{job_id}", response_model=dict)
+async def get_ingestion_job(job_id: str, user_id: str = Depends(get_current_user_id), queue: IngestionJobQueue = Depends(get_ingestion_queue)) -> dict:
+    try:
+        job = await queue.get_job(job_id)
+    except Exception as e:
+        print(f"Failed to fetch job {e}")
+        raise HTTPException(status_code=500, detail="failed to fetch")
+
+    # Someone else's job looks exactly like a missing one
+    if job is None or job.get("user_id") != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_ingestion_job(job_id: str, user_id: str = Depends(get_current_user_id), queue: IngestionJobQueue = Depends(get_ingestion_queue)):
+    """Server-Sent Events stream of job progress; closes after completed/failed."""
+    job = await queue.get_job(job_id)
+    if job is None or job.get("user_id") != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for job in queue.events(job_id):
+            yield job["status"], job
+
+    return sse_response(events())
+
+
+@router.post("/upload", response_model=dict, openapi_extra=audio_form("file"))
+async def upload_voice_note(
+    request: Request,
+    user_id: str = Depends(get_current_user_id),
+    voice_service: VoiceService = Depends(get_voice_service)
+):
     """
     Upload a voice note for transcription and categorization.
 
-    Accepts: .wav, .m4a, .mp3, .webm, .ogg, .flac (max 25MB)
+    Accepts: .wav, .m4a, .mp3, .webm, .ogg, .flac (long recordings are transcribed in chunks)
     """
-    # Validate file
-    validate_audio_file(file)
-
-    # Read file content
-    content = await file.read()
-
-    voice_service = VoiceService()
+    try:
+        # Validated from the part headers, before any audio is read
+        audio_buffer = await read_upload(request, "file", validate=validate_audio_file, max_size=max_audio_size())
+    except AudioTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Server is busy with other uploads, try again shortly")
 
     try:
-        result = await voice_service.upload_and_create(file.filename, content)
-        # result is now a list of created notes (one per split item)
-        return {
-            "notes_created": len(result),
-            "notes": result,
-            "status": "uploaded"
-        }
+        result = await voice_service.upload_and_create(audio_buffer.filename, audio_buffer, user_id)
+        # New notes, a repeat of earlier ones, or a question's answer - same shapes as the /add-voice job result
+        return format_ingestion_result(result, saved_status="uploaded")
     except ValueError as e:  # File size validation
         raise HTTPException(status_code=400, detail=str(e))
 
     except Exception as e:  # Storage/DB errors
         print(f"Upload failed: {e}")
         raise HTTPException(status_code=500, detail="Upload failed")
-
-
-@router.get("/notes", response_model=List[dict])
-async def get_voice_notes():
+    finally:
+        await audio_buffer.close()
+
+
+@router.get("/notes")
+async def get_voice_notes(
+    limit: int = Query(settings.default_page_size, ge=1, le=settings.max_page_size),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id),
+    voice_service: VoiceService = Depends(get_voice_service)
+):
+    """Notes newest first. Pass `next_cursor` back as `cursor` for the next page; `fields` is comma-separated."""
     try:
-        voice_service = VoiceService()
-        return voice_service.get_all_notes()
+        return await voice_service.list_notes(user_id, limit, fields, cursor)
+    except InvalidPageRequestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:  # Storage/DB errors
         print(f"Failed to fetch {e}")
         raise HTTPException(status_code=500, detail="failed to fetch")
 
 
-@router.get("/search", response_model=List[dict])
-async def search_notes(q:str):
+@router.get("/search")
+async def search_notes(
+    q: str,
+    limit: int = Query(settings.default_page_size, ge=1, le=settings.max_page_size),
+    mode: Literal["fulltext", "substring"] = "fulltext",
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id),
+    voice_service: VoiceService = Depends(get_voice_service)
+):
     try:
-        print(f"query is")
-        voice_service = VoiceService()
-        return voice_service.search_notes(q)
+        print(f"query is {q}")
+        return await voice_service.search_notes(user_id, q, limit, mode, fields, cursor)
+    except InvalidPageRequestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Failed to fetch {e}")
         raise HTTPException(status_code=500, detail="failed to fetch")
 
     
 @router.post("/query")
-async def query_memory(q:str):
+async def query_memory(q:str, user_id: str = Depends(get_current_user_id), supermemory: SupermemoryService = Depends(get_supermemory_service)):
     try:
         print(f"query  memory {q}")
-        supermemory = SupermemoryService()
-        return await supermemory.query_memory("demo_user", q, 5)
+        return await supermemory.query_memory(user_id, q, 5)
     except Exception as e:
         print(f"Failed to fetch {e}")
         raise HTTPException(status_code=500, detail="failed to fetch")
 
 @router.post("/chat")
-async def chat_query(q:str):
+async def chat_query(
+    q:str,
+    stream: bool = False,
+    user_id: str = Depends(get_current_user_id),
+    query_service: QueryService = Depends(get_query_service)
+):
+    """Answer a question from the user's notes. `stream=true` sends sources + tokens as SSE."""
+    if stream:
+        return sse_response(query_service.stream_answer(q, user_id))
     try:
         print(f"chat {q}")
-        query_service = QueryService()
-        return await query_service.answer_query(q, "demo_user")
+        return await query_service.answer_query(q, user_id)
     except Exception as e:
         print(f"Failed to fetch {e}")
         raise HTTPException(status_code=500, detail="failed to fetch")
 
 
 @router.get("/memories")
-def get_memories():
+async def get_memories(
+    limit: int = Query(settings.default_page_size, ge=1, le=settings.max_page_size),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id),
+    supermemory: SupermemoryService = Depends(get_supermemory_service)
+):
     try:
-        print("we are getting all the memories assocaited with user_demo_user")
-        supermemory = SupermemoryService()
-        return supermemory.check_user_memories("demo_user")
+        print(f"we are getting all the memories assocaited with {user_id}")
+        return await supermemory.list_memories(user_id, limit, fields, cursor)
+    except InvalidPageRequestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Failed to fetch {e}")
         raise HTTPException(status_code=500, detail="failed to fetch")
@@ -0,0 +1,51 @@
+from typing import Optional
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+
+from app.core.config import settings
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+def decode_user_id(token: str) -> str:
+    """Verify a Supabase access token and return its subject (the auth user id)"""
+    if not settings.supabase_jwt_secret:
+        raise _unauthorized("Authentication is not configured")
+    try:
+        claims = jwt.decode(
+            token,
+            settings.supabase_jwt_secret,
+            algorithms=[settings.jwt_algorithm],
+            audience=settings.jwt_audience or None,
+            options={"verify_aud": bool(settings.jwt_audience), "require_aud": bool(settings.jwt_audience)}
+        )
+    except JWTError as e:
+        # Why it failed (expired, bad signature, wrong audience) is for our logs, not the caller
+        print(f"Rejected access token: {e}")
+        raise _unauthorized("Invalid token")
+
+    user_id = claims.get("sub")
+    if not user_id:
+        print("Rejected access token: no subject")
+        raise _unauthorized("Invalid token")
+    return user_id
+
+
+def get_current_user_id(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> str:
+    """
+    Dependency for the id every query, cache key and Supermemory container is scoped to.
+
+    Requests carry a Supabase access token as `Authorization: Bearer ...`. For
+    local development only, `dev_user_id` lets token-less requests run as that user.
+    """
+    if credentials is not None:
+        return decode_user_id(credentials.credentials)
+    if settings.dev_user_id:
+        return settings.dev_user_id
+    raise _unauthorized("Not authenticated")
@@ -0,0 +1,110 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from app.core.config import settings
+
+
+class PersistentCache:
+    """
+    Small SQLite-backed key/value cache shared by every worker on the instance.
+
+    Entries carry their own TTL; when the stored payload grows past `max_bytes`
+    the least recently read entries are evicted first. Values are JSON. All
+    methods are blocking - call them through asyncio.to_thread from async code.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite connections can't be shared across threads, and to_thread hops between them
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        with self._init_lock:
+            if not self._initialized:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS cache (
+                        namespace TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        expires_at REAL NOT NULL,
+                        accessed_at REAL NOT NULL,
+                        PRIMARY KEY (namespace, key)
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_idx ON cache (accessed_at)")
+                self._initialized = True
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at = row
+        if expires_at < now:
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+            return None
+
+        conn.execute(
+            "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+            (now, namespace, key)
+        )
+        return json.loads(value)
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float):
+        conn = self._conn()
+        now = time.time()
+        payload = json.dumps(value, default=str)
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (namespace, key, payload, len(payload), now + ttl, now)
+        )
+        self._evict(conn, now)
+
+    def delete(self, namespace: str, key: str):
+        self._conn().execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Trim to 90% so we're not evicting on every single write once full
+        target = int(self.max_bytes * 0.9)
+        rows = conn.execute("SELECT namespace, key, size FROM cache ORDER BY accessed_at ASC").fetchall()
+        doomed = []
+        for namespace, key, size in rows:
+            if total <= target:
+                break
+            doomed.append((namespace, key))
+            total -= size
+        conn.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", doomed)
+
+
+cache = PersistentCache(os.path.join(settings.cache_dir, "cache.sqlite3"), settings.cache_max_bytes)
+
+
+def get_cache() -> PersistentCache:
+    """Dependency to get the shared persistent cache."""
+    return cache
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+from typing import TYPE_CHECKING, Optional
+
+import httpx
+
+from app.core.config import settings
+
+if TYPE_CHECKING:  # the SDKs are slow to import - only pull them in when a client is first built
+    from openai import AsyncOpenAI
+    from supabase import Client
+    from supermemory import AsyncSupermemory
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry
+    )
+
+
+class ClientRegistry:
+    """
+    The app's upstream clients, created once per process and shared by every request.
+
+    Each client sits on its own keep-alive httpx pool, so TLS handshakes happen
+    once per connection instead of once per request. The async clients are safe
+    to share across tasks on the loop; the sync Supabase client is only used
+    through asyncio.to_thread and httpx.Client is thread-safe.
+
+    Clients (and their SDK imports) are built on first use, so startup stays
+    cheap; warm_up() does that eagerly in the background once the server is up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._openai: Optional["AsyncOpenAI"] = None
+        self._supermemory: Optional["AsyncSupermemory"] = None
+        self._supabase: Optional["Client"] = None
+        self._openai_http: Optional[httpx.AsyncClient] = None
+        self._supermemory_http: Optional[httpx.AsyncClient] = None
+        self._supabase_http: Optional[httpx.Client] = None
+
+    @property
+    def openai(self) -> "AsyncOpenAI":
+        if self._openai is None:
+            with self._lock:
+                if self._openai is None:
+                    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+                    self._openai_http = DefaultAsyncHttpxClient(limits=_limits(), timeout=settings.http_timeout)
+                    self._openai = AsyncOpenAI(api_key=settings.openai_api_key, http_client=self._openai_http)
+        return self._openai
+
+    @property
+    def supermemory(self) -> "AsyncSupermemory":
+        if self._supermemory is None:
+            with self._lock:
+                if self._supermemory is None:
+                    from supermemory import AsyncSupermemory, DefaultAsyncHttpxClient
+
+                    self._supermemory_http = DefaultAsyncHttpxClient(limits=_limits(), timeout=settings.http_timeout)
+                    self._supermemory = AsyncSupermemory(api_key=settings.supermemory_api_key, http_client=self._supermemory_http)
+        return self._supermemory
+
+    @property
+    def supabase(self) -> "Client":
+        if self._supabase is None:
+            with self._lock:
+                if self._supabase is None:
+                    from supabase import ClientOptions, create_client
+
+                    self._supabase_http = httpx.Client(limits=_limits(), timeout=settings.http_timeout)
+                    self._supabase = create_client(
+                        settings.supabase_url,
+                        settings.supabase_anon_key,
+                        options=ClientOptions(httpx_client=self._supabase_http)
+                    )
+        return self._supabase
+
+    async def warm_up(self) -> dict:
+        """
+        Build every client and open a connection to each upstream.
+
+        Any HTTP response counts - the point is to pay DNS + TCP + TLS now, on a
+        pooled keep-alive connection, instead of on the first user request.
+        Returns {upstream: "ok" | error}.
+        """
+        # Client construction does the heavy imports - keep it off the loop
+        await asyncio.to_thread(lambda: (self.openai, self.supermemory, self.supabase))
+
+        async def ping_openai():
+            await self._openai_http.get(str(self.openai.base_url))
+
+        async def ping_supermemory():
+            await self._supermemory_http.get(str(self.supermemory.base_url))
+
+        async def ping_supabase():
+            await asyncio.to_thread(
+                self._supabase_http.get,
+                f"{settings.supabase_url}/rest/v1/",
+                headers={"apikey": settings.supabase_anon_key}
+            )
+
+        upstreams = {"openai": ping_openai, "supermemory": ping_supermemory, "supabase": ping_supabase}
+        outcomes = await asyncio.gather(*(ping() for ping in upstreams.values()), return_exceptions=True)
+        return {
+            name: "ok" if not isinstance(outcome, Exception) else str(outcome)
+            for name, outcome in zip(upstreams, outcomes)
+        }
+
+    async def aclose(self):
+        if self._openai is not None:
+            await self._openai.close()
+        if self._supermemory is not None:
+            await self._supermemory.close()
+        if self._supabase_http is not None:
+            self._supabase_http.close()
+
+
+registry: Optional[ClientRegistry] = None
+
+
+def get_clients() -> ClientRegistry:
+    """Dependency to get the shared client registry created in the app lifespan."""
+    if registry is None:
+        raise RuntimeError("Client registry has not been initialized")
+    return registry
@@ -19,8 +19,101 @@ class Settings(BaseSettings):
 
     # Security
     secret_key: str = "change-this-in-production"
+    supabase_jwt_secret: str = ""  # verifies the Supabase access tokens clients send as Bearer
+    jwt_algorithm: str = "HS256"
+    jwt_audience: str = "authenticated"
+    dev_user_id: str = ""  # local development only: token-less requests run as this user
 
     supermemory_api_key: str = ""
+    supermemory_concurrency: int = 8  # parallel document writes per batch
+    supermemory_page_size: int = 50  # memories per list call when iterating
+
+    # Shared upstream HTTP pools (one set per process, see app/core/clients.py)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http_timeout: float = 120.0
+
+    # Audio uploads
+    max_upload_size: int = 200 * 1024 * 1024  # long recordings are chunked, see below; 25MB (Whisper's limit) without ffmpeg
+    upload_chunk_size: int = 256 * 1024
+    audio_spool_threshold: int = 1024 * 1024  # spill to a temp file past 1MB
+    inflight_audio_budget: int = 200 * 1024 * 1024  # total audio bytes held per process
+    audio_budget_wait_seconds: float = 30.0
+
+    # Chunked transcription (needs pydub + the ffmpeg binary; decodes one chunk window at a time)
+    chunked_transcription: bool = True
+    chunked_transcription_threshold: int = 2 * 1024 * 1024  # below this one Whisper call is faster
+    transcription_chunk_seconds: int = 60
+    transcription_chunk_overlap_ms: int = 1500
+    transcription_concurrency: int = 4
+
+    # Persistent cache (transcripts, extractions, storage URLs)
+    cache_dir: str = ".cache"
+    cache_max_bytes: int = 256 * 1024 * 1024
+    transcript_cache_ttl: int = 30 * 24 * 3600
+    extraction_cache_ttl: int = 6 * 3600  # keyed per UTC day too - "tomorrow" etc. resolve against it
+
+    # Query analysis (rules fast path, then cache, then LLM)
+    rule_based_query_analysis: bool = True
+    query_analysis_cache_size: int = 1000  # in-process LRU entries
+    query_analysis_cache_ttl: int = 7 * 24 * 3600
+
+    # Supermemory search results, per user and process; any write by the user invalidates theirs in every worker
+    memory_search_cache_size: int = 500
+    memory_search_cache_ttl: int = 120  # documents are indexed asynchronously after add
+
+    # Listings (/notes, /search, /memories)
+    default_page_size: int = 20
+    max_page_size: int = 100
+
+    # Repeated recordings: an exact repeat links to the earlier notes, a near one is saved and tagged similar_to
+    near_duplicate_detection: bool = True
+    near_duplicate_threshold: float = 0.8  # estimated Jaccard over character shingles; only used for the tag
+    near_duplicate_window: int = 14 * 24 * 3600
+    minhash_permutations: int = 128
+    minhash_bands: int = 16
+
+    # Local vector index over saved notes
+    vector_index_enabled: bool = False  # index even while semantic_retrieval doesn't read it (it does for "local"/"both")
+    vector_index_dir: str = ".cache/vectors"
+    vector_shard_size: int = 4096  # rows per .npy shard
+    vector_search_k: int = 5
+    embedding_provider: str = "openai"  # "openai" | "hashing" (offline, deterministic)
+    embedding_model: str = "text-embedding-3-small"
+    embedding_dimensions: int = 512
+
+    # Chat retrieval - each source gets its own budget, synthesis runs with whatever came back
+    semantic_retrieval: str = "supermemory"  # "supermemory" | "local" | "both"
+    supabase_retrieval_timeout: float = 5.0
+    supermemory_retrieval_timeout: float = 5.0
+    vector_retrieval_timeout: float = 2.0
+
+    # Synthesis context - ranked, deduplicated and packed into a fixed token budget
+    synthesis_context_tokens: int = 2000
+    context_candidate_limit: int = 200  # newest matching notes considered per question
+    context_recency_half_life_days: float = 14.0
+    context_recency_weight: float = 0.3  # the rest is lexical relevance to the semantic query
+
+    # Rolling per-user summaries (overall + per intent), folded on ingest, answer pattern questions
+    rolling_summaries: bool = True
+    summary_max_words: int = 150
+    summary_fold_retries: int = 3  # fold attempts per scope; each lost concurrent write re-reads and folds again
+
+    # Model routing (app/services/model_router.py) - calls start on the cheapest tier their policy allows
+    model_routing: bool = True  # off: every task uses its policy's default_tier
+    chat_model_tiers: list[str] = ["gpt-4o-mini", "gpt-4o"]  # cheapest first
+    transcription_model_tiers: list[str] = ["gpt-4o-mini-transcribe", "whisper-1"]  # whisper-1 for long single calls
+    model_routing_policies: dict[str, dict] = {}  # e.g. {"extraction": {"escalate_above": 800}}
+    model_stats_window: int = 50  # recent calls per model behind the error-rate / latency checks
+    model_max_error_rate: float = 0.25  # a tier failing more than this is skipped until it recovers
+    model_recovery_seconds: float = 60.0  # then one call is let through to check
+
+    # Background ingestion
+    ingestion_workers: int = 4
+    ingestion_queue_size: int = 100
+    job_heartbeat_seconds: float = 30.0  # live workers touch their queued/running jobs this often
+    stale_job_seconds: float = 300.0  # a job untouched this long lost its worker (restart, crash) and is failed
 
     model_config = SettingsConfigDict(
         env_file=".env",
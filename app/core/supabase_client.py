@@ -1,13 +1,11 @@
-from supabase import create_client, Client
-from app.core.config import settings
+from typing import TYPE_CHECKING
 
-# Initialize Supabase client
-supabase: Client = create_client(
-    settings.supabase_url,
-    settings.supabase_anon_key
-)
+from app.core.clients import get_clients
 
+if TYPE_CHECKING:
+    from supabase import Client
 
-def get_supabase() -> Client:
-    """Dependency to get Supabase client."""
-    return supabase
+
+def get_supabase() -> "Client":
+    """Dependency to get Supabase client (built lazily by the client registry)."""
+    return get_clients().supabase
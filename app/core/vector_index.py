@@ -0,0 +1,212 @@
+import fcntl
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from app.core.config import settings
+
+
+class _Shard:
+    """One immutable slab of a user's index: an (n, dim) float32 matrix plus a row per vector"""
+
+    def __init__(self, name: str, vectors: np.ndarray, rows: list[dict]):
+        self.name = name
+        self.vectors = vectors
+        self.rows = rows
+
+
+class VectorIndex:
+    """
+    On-disk cosine-similarity index, one directory per (embedding space, user).
+
+    Vectors are L2-normalized float32 rows stored in `.npy` shards of at most
+    `shard_size` rows, each with a JSON sidecar holding the note id/title/text.
+    Shards are opened memory-mapped, so the page cache - not the heap - holds
+    large indexes.
+
+    Shards are never rewritten: `add` writes new shard files and then swaps
+    `meta.json`, the list of live shards, atomically. Writers hold an
+    exclusive file lock and re-read `meta.json` under it, so several worker
+    processes can share one directory; readers re-read it on every search and
+    only load shards they haven't seen. Once a user has more than
+    `max_partial_shards` partly filled shards, they're merged into new full
+    ones. All methods are blocking - call them through asyncio.to_thread from
+    async code.
+    """
+
+    def __init__(self, root: str, shard_size: int, max_partial_shards: int = 8):
+        self.root = root
+        self.shard_size = shard_size
+        self.max_partial_shards = max_partial_shards
+        self._shards: dict[tuple[str, str], _Shard] = {}  # (directory, name) -> shard; shards are immutable
+        self._shards_guard = threading.Lock()
+
+    def _user_dir(self, space: str, user_id: str) -> str:
+        safe = lambda value: re.sub(r"[^\w.-]", "_", value)
+        return os.path.join(self.root, safe(space), safe(user_id))
+
+    @contextmanager
+    def _write_lock(self, directory: str):
+        # Across threads and worker processes alike
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self, directory: str) -> dict:
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"shards": [], "next_shard": 0}
+
+    def _current(self, directory: str) -> list[_Shard]:
+        """The live shards for a reader"""
+        try:
+            return self._load(directory, self._read_meta(directory))
+        except FileNotFoundError:
+            # A compaction retired a shard between reading meta.json and opening it
+            return self._load(directory, self._read_meta(directory))
+
+    def _load(self, directory: str, meta: dict) -> list[_Shard]:
+        shards = []
+        with self._shards_guard:
+            for name in meta["shards"]:
+                shard = self._shards.get((directory, name))
+                if shard is None:
+                    vectors = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                    with open(os.path.join(directory, f"{name}.json")) as f:
+                        rows = json.load(f)
+                    shard = self._shards[(directory, name)] = _Shard(name, vectors, rows)
+                shards.append(shard)
+            # Forget shards a compaction (possibly in another process) retired
+            live = set(meta["shards"])
+            for key in [key for key in self._shards if key[0] == directory and key[1] not in live]:
+                del self._shards[key]
+        return shards
+
+    def add(self, space: str, user_id: str, vectors: np.ndarray, rows: list[dict]) -> int:
+        """
+        Append normalized `vectors` with their `rows` ({"id", "title", "text"}).
+
+        Rows whose id is already indexed are skipped, so re-ingesting a note is a
+        no-op. Returns how many vectors were added.
+        """
+        directory = self._user_dir(space, user_id)
+        with self._write_lock(directory):
+            meta = self._read_meta(directory)
+            shards = self._load(directory, meta)
+            known = {row["id"] for shard in shards for row in shard.rows}
+
+            keep = [i for i, row in enumerate(rows) if row["id"] not in known]
+            if not keep:
+                return 0
+            vectors = np.asarray(vectors, dtype=np.float32)[keep]
+            rows = [rows[i] for i in keep]
+
+            names = list(meta["shards"])
+            next_shard = meta.get("next_shard", len(names))
+            for start in range(0, len(rows), self.shard_size):
+                name = f"{next_shard:05d}"
+                next_shard += 1
+                self._write_shard(directory, name, vectors[start:start + self.shard_size], rows[start:start + self.shard_size])
+                names.append(name)
+
+            retired = []
+            partial = [shard for shard in self._load(directory, {"shards": names}) if len(shard.rows) < self.shard_size]
+            if len(partial) > self.max_partial_shards:
+                names, next_shard, retired = self._compact(directory, names, partial, next_shard)
+
+            self._replace_json(os.path.join(directory, "meta.json"), {
+                "dim": int(vectors.shape[1]),
+                "shards": names,
+                "next_shard": next_shard
+            })
+            # Readers that mapped a retired file keep it until they close it (POSIX unlink semantics)
+            for name in retired:
+                for ext in ("npy", "json"):
+                    os.remove(os.path.join(directory, f"{name}.{ext}"))
+            return len(rows)
+
+    def _compact(self, directory: str, names: list[str], partial: list[_Shard], next_shard: int) -> tuple[list[str], int, list[str]]:
+        """Merge partly filled shards into new files. Returns (live names, next shard number, retired names)."""
+        merged = np.vstack([np.asarray(shard.vectors) for shard in partial])
+        merged_rows = [row for shard in partial for row in shard.rows]
+        retired = [shard.name for shard in partial]
+        names = [name for name in names if name not in retired]
+        for start in range(0, len(merged_rows), self.shard_size):
+            name = f"{next_shard:05d}"
+            next_shard += 1
+            self._write_shard(directory, name, merged[start:start + self.shard_size], merged_rows[start:start + self.shard_size])
+            names.append(name)
+        return names, next_shard, retired
+
+    def search(self, space: str, user_id: str, queries: np.ndarray, k: int) -> list[list[dict]]:
+        """
+        Top-k rows by cosine similarity for each normalized query vector.
+
+        All queries are scored against a shard in one matrix product; each shard
+        contributes its own top-k and the candidates are merged at the end.
+        Returns one list per query of row dicts with a "score" added.
+        """
+        directory = self._user_dir(space, user_id)
+        shards = self._current(directory)
+
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        candidate_scores, candidate_refs = [], []
+        for shard_index, shard in enumerate(shards):
+            scores = queries @ np.asarray(shard.vectors).T  # (queries, rows)
+            top = min(k, scores.shape[1])
+            if top == 0:
+                continue
+            idx = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+            candidate_scores.append(np.take_along_axis(scores, idx, axis=1))
+            candidate_refs.append(np.stack([np.full_like(idx, shard_index), idx], axis=-1))
+
+        if not candidate_scores:
+            return [[] for _ in range(len(queries))]
+
+        scores = np.concatenate(candidate_scores, axis=1)
+        refs = np.concatenate(candidate_refs, axis=1)
+        order = np.argsort(-scores, axis=1)[:, :k]
+
+        results = []
+        for q in range(len(queries)):
+            hits = []
+            for column in order[q]:
+                shard_index, row_index = refs[q, column]
+                hits.append({**shards[shard_index].rows[row_index], "score": float(scores[q, column])})
+            results.append(hits)
+        return results
+
+    def count(self, space: str, user_id: str) -> int:
+        directory = self._user_dir(space, user_id)
+        return sum(len(shard.rows) for shard in self._current(directory))
+
+    def _write_shard(self, directory: str, name: str, vectors: np.ndarray, rows: list[dict]):
+        tmp_path = os.path.join(directory, f".{name}.npy.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
+        os.replace(tmp_path, os.path.join(directory, f"{name}.npy"))
+        self._replace_json(os.path.join(directory, f"{name}.json"), rows)
+
+    def _replace_json(self, path: str, value):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+
+vector_index = VectorIndex(settings.vector_index_dir, settings.vector_shard_size)
+
+
+def get_vector_index() -> VectorIndex:
+    """Dependency to get the shared on-disk vector index."""
+    return vector_index
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+from typing import Iterable
+
+from app.repositories.voice_repository import DatabaseError
+
+
+class JobRepository:
+
+    def __init__(self, supabase_client):
+        self.supabase_client = supabase_client
+
+    def create_job(self, user_id: str, filename: str) -> dict:
+        try:
+            result = self.supabase_client.table("ingestion_jobs").insert({
+                "user_id": user_id,
+                "filename": filename,
+                "status": "queued",
+                "stage": "queued"
+            }).execute()
+            return result.data[0]
+        except Exception as e:
+            raise DatabaseError(f"Error creating ingestion job: {str(e)}")
+
+    def update_job(self, job_id: str, fields: dict) -> dict:
+        try:
+            fields = {**fields, "updated_at": datetime.now(timezone.utc).isoformat()}
+            result = self.supabase_client.table("ingestion_jobs").update(fields).eq("id", job_id).execute()
+            return result.data[0]
+        except Exception as e:
+            raise DatabaseError(f"Error updating ingestion job: {str(e)}")
+
+    def get_job(self, job_id: str) -> dict | None:
+        try:
+            result = self.supabase_client.table("ingestion_jobs").select("*").eq("id", job_id).limit(1).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            raise DatabaseError(f"Error reading ingestion job: {str(e)}")
+
+    def touch_jobs(self, job_ids: Iterable[str]):
+        """Heartbeat: mark jobs as still owned by a live worker"""
+        try:
+            self.supabase_client.table("ingestion_jobs").update({
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }).in_("id", list(job_ids)).execute()
+        except Exception as e:
+            raise DatabaseError(f"Error touching ingestion jobs: {str(e)}")
+
+    def fail_stale_jobs(self, not_updated_since: datetime, error: str) -> list[dict]:
+        """Fail queued/running jobs nobody has touched since `not_updated_since` - their worker is gone"""
+        try:
+            result = self.supabase_client.table("ingestion_jobs").update({
+                "status": "failed",
+                "error": error,
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }).in_("status", ["queued", "running"]).lt("updated_at", not_updated_since.isoformat()).execute()
+            return result.data
+        except Exception as e:
+            raise DatabaseError(f"Error failing stale ingestion jobs: {str(e)}")
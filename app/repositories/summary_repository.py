@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.repositories.voice_repository import DatabaseError
+
+
+class SummaryRepository:
+    """user_summaries access (migrations/006_user_summaries.sql)"""
+
+    def __init__(self, supabase_client):
+        self.supabase_client = supabase_client
+
+    def get_summaries(self, user_id: str) -> dict[str, dict]:
+        """Every summary row of the user, keyed by scope"""
+        try:
+            result = self.supabase_client.table("user_summaries").select("*").eq("user_id", user_id).execute()
+            return {row["scope"]: row for row in result.data}
+        except Exception as e:
+            raise DatabaseError(f"Error reading summaries: {str(e)}")
+
+    def save_summary(self, user_id: str, scope: str, summary: str, item_count: int, version: int) -> bool:
+        """
+        Compare-and-set write: `version` is the one the summary was folded from
+        (0 for a scope with no row yet). Returns False when another writer got
+        there first, so the caller can re-read and fold again.
+        """
+        fields = {
+            "summary": summary,
+            "item_count": item_count,
+            "version": version + 1,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }
+        table = self.supabase_client.table("user_summaries")
+        try:
+            if version == 0:
+                result = table.insert({"user_id": user_id, "scope": scope, **fields}).execute()
+            else:
+                result = table.update(fields).eq("user_id", user_id).eq("scope", scope).eq("version", version).execute()
+        except Exception as e:
+            # Lost the race to create the row
+            if version == 0 and ("duplicate key" in str(e) or "23505" in str(e)):
+                return False
+            raise DatabaseError(f"Error saving summary: {str(e)}")
+        return bool(result.data)
+
+    def delete_summaries(self, user_id: str, scopes: Optional[list[str]] = None):
+        """Delete the user's summaries - all of them, or just `scopes`"""
+        try:
+            query = self.supabase_client.table("user_summaries").delete().eq("user_id", user_id)
+            if scopes is not None:
+                query = query.in_("scope", scopes)
+            query.execute()
+        except Exception as e:
+            raise DatabaseError(f"Error deleting summaries: {str(e)}")
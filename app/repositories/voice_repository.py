@@ -1,5 +1,7 @@
 
-from typing import Literal
+from datetime import datetime
+from pathlib import Path
+from typing import Literal, Optional
 
 
 class DatabaseError(Exception):
@@ -7,23 +9,46 @@ class DatabaseError(Exception):
     pass
 
 class VoiceRepository:
+    """user_files access. Every read and write is scoped to one user_id (migrations/005_user_partitioning.sql)."""
 
     def __init__(self, supabase_client):
         self.supabase_client = supabase_client
 
-    def upload_audio_file(self, filename: str, content:bytes) -> str:
-        
-        response =self.supabase_client.storage.from_("voice-recordings").upload(filename, content)
+    def upload_audio_file(self, filename: str, content: bytes | Path) -> str:
+        """
+        Upload audio bytes, or a spooled file path (storage streams it from disk).
+
+        Filenames are content-addressed by the caller, so an object that already
+        exists is the same recording - reuse it instead of uploading again.
+        """
+        bucket = self.supabase_client.storage.from_("voice-recordings")
+
+        if bucket.exists(filename):
+            return bucket.get_public_url(filename)
+
+        try:
+            response = bucket.upload(filename, content)
+            path = response.path
+        except Exception as e:
+            # Lost a race with a concurrent upload of the same recording
+            if "Duplicate" not in str(e) and "already exists" not in str(e):
+                raise
+            path = filename
 
         # Get public URL (not full_path!)
-        public_url = self.supabase_client.storage.from_("voice-recordings").get_public_url(response.path)
+        public_url = bucket.get_public_url(path)
         
         return public_url
 
-    def create_voice_note(self, audio_filename: str, audio_url:str) -> dict:
+    def delete_audio_file(self, filename: str):
+        """Remove a stored recording that no note points to"""
+        self.supabase_client.storage.from_("voice-recordings").remove([filename])
+
+    def create_voice_note(self, user_id: str, audio_filename: str, audio_url:str) -> dict:
         try:
             """Insert DB record, return created row. No business logic."""
             result = self.supabase_client.table("user_files").insert({
+                "user_id": user_id,
                 "audio_filename": audio_filename,
                 "audio_url": audio_url,
                 "category": "uncategorized"
@@ -33,48 +58,117 @@ class VoiceRepository:
             raise DatabaseError(f"Error creating a new record: {str(e)}")
 
 
-    def update_transcription(self, id, transcription, title, formatted_text) -> dict:
+    def update_transcription(self, user_id: str, id, transcription, title, formatted_text) -> dict:
         try:
-            response = self.supabase_client.table("user_files").update({"transcription": transcription, "title":title, "formatted_content":formatted_text}).eq("id", id).execute()
+            response = self.supabase_client.table("user_files").update({"transcription": transcription, "title":title, "formatted_content":formatted_text}).eq("user_id", user_id).eq("id", id).execute()
             return response.data[0]
         except Exception as e:
             raise DatabaseError(f"Error updating comment status: {str(e)}")   
 
-    def get_all_notes(self):
+    def get_all_notes(self, user_id: str):
         try:
-            result = self.supabase_client.table("user_files").select("*").not_.is_("transcription", "null").execute()  # Use None for actual NULL values.eq("story_id", story_id).execute()
+            result = self.supabase_client.table("user_files").select("*").eq("user_id", user_id).not_.is_("transcription", "null").execute()  # Use None for actual NULL values.eq("story_id", story_id).execute()
             return result.data 
         except Exception as e:
             raise DatabaseError(f"Error reading all the transcription {str(e)}")
 
 
-    def search_notes(self, query:str):
+    def search_notes(self, user_id: str, query:str):
         try:
-            result = self.supabase_client.table("user_files").select("*").ilike("transcription", f"%{query}%").execute()  # Use None for actual NULL values.eq("story_id", story_id).execute()
+            result = self.supabase_client.table("user_files").select("*").eq("user_id", user_id).ilike("transcription", f"%{query}%").execute()  # Use None for actual NULL values.eq("story_id", story_id).execute()
             return result.data 
         except Exception as e:
             raise DatabaseError(f"Error reading all the transcription {str(e)}")
 
 
-    def create_note_with_metadata(self, audio_file_name, audio_url, transcription, title, formatted_content, metadata) -> dict:
+    def list_notes(self, user_id: str, fields: list[str], limit: int, after: Optional[tuple[str, str]] = None, contains: Optional[str] = None) -> list[dict]:
+        """
+        One page of notes, newest first, keyset-paginated on (uploaded_at, id).
+
+        `after` is the (uploaded_at, id) of the previous page's last row;
+        `contains` filters to transcriptions with that substring.
+        """
         try:
-            """Insert DB record, return created row. No business logic."""
-            result = self.supabase_client.table("user_files").insert({
-                "audio_filename": audio_file_name,
-                "audio_url": audio_url,
-                "transcription": transcription,
-                "title": title,
-                "formatted_content":formatted_content,
-                "metadata":metadata
-            }).execute()
+            query = self.supabase_client.table("user_files").select(",".join(fields)).eq("user_id", user_id).not_.is_("transcription", "null")
+            if contains:
+                query = query.ilike("transcription", f"%{contains}%")
+            if after:
+                uploaded_at, note_id = after
+                query = query.or_(f'uploaded_at.lt."{uploaded_at}",and(uploaded_at.eq."{uploaded_at}",id.lt."{note_id}")')
+            result = query.order("uploaded_at", desc=True).order("id", desc=True).limit(limit).execute()
+            return result.data
+        except Exception as e:
+            raise DatabaseError(f"Error listing notes {str(e)}")
+
+    def search_notes_ranked(self, user_id: str, query: str, limit: int = 20, after: Optional[tuple[float, str, bool]] = None) -> list[dict]:
+        """
+        Full-text search through the search_notes RPC (migrations/007_fuzzy_search_snippets.sql).
+
+        Returns note rows, best match first, each with `rank`, `fuzzy` and a
+        `snippet` where matched words (for fuzzy hits, the words close to a
+        query word) are wrapped in <mark>. `after` is the
+        (rank, id, fuzzy) of the previous page's last row.
+        """
+        params = {"search_user_id": user_id, "search_query": query, "match_limit": limit}
+        if after:
+            params.update({"after_rank": after[0], "after_id": str(after[1]), "fuzzy": after[2]})
+        try:
+            result = self.supabase_client.rpc("search_notes", params).execute()
+            return [
+                {**row["note"], "rank": row["rank"], "snippet": row["snippet"], "fuzzy": row["is_fuzzy"]}
+                for row in result.data
+            ]
+        except Exception as e:
+            raise DatabaseError(f"Error searching notes {str(e)}")
+
+
+    def create_notes_with_metadata(self, user_id: str, notes: list[dict]) -> list[dict]:
+        """
+        Insert every note from one recording in a single request.
+
+        PostgREST runs a multi-row insert as one statement (all or nothing) and
+        returns the created rows in the same order as `notes`.
+        """
+        if not notes:
+            return []
+        try:
+            result = self.supabase_client.table("user_files").insert([{**note, "user_id": user_id} for note in notes]).execute()
+            return result.data
+        except Exception as e:
+            raise DatabaseError(f"Error creating new records: {str(e)}")
 
+    def get_notes_by_ids(self, user_id: str, note_ids: list) -> list[dict]:
+        try:
+            result = self.supabase_client.table("user_files").select("*").eq("user_id", user_id).in_("id", note_ids).execute()
+            return result.data
+        except Exception as e:
+            raise DatabaseError(f"Error reading notes {str(e)}")
+
+    def update_note_metadata(self, user_id: str, note_id, metadata: dict) -> dict:
+        try:
+            result = self.supabase_client.table("user_files").update({"metadata": metadata}).eq("user_id", user_id).eq("id", note_id).execute()
             return result.data[0]
         except Exception as e:
-            raise DatabaseError(f"Error creating a new record: {str(e)}")
+            raise DatabaseError(f"Error updating note metadata: {str(e)}")
+
+    def search_notes_by_metadata(self, user_id: str, relevant_intents:list[Literal], limit: Optional[int] = None, start: Optional[datetime] = None, end: Optional[datetime] = None):
+        """
+        Notes of the given intents, on the typed columns from migrations/004_typed_note_columns.sql.
 
-    def search_notes_by_metadata(self, relevant_intents:list[Literal]):
+        With a time range, a note matches when it's scheduled inside it, or -
+        for notes with no schedule - when it was recorded inside it.
+        """
         try:
-            result = self.supabase_client.table("user_files").select("*").in_("metadata->>intent", relevant_intents).execute()
+            query = self.supabase_client.table("user_files").select("*").eq("user_id", user_id).in_("intent", relevant_intents)
+            if start and end:
+                lower, upper = start.isoformat(), end.isoformat()
+                query = query.or_(
+                    f'and(scheduled_for.gte."{lower}",scheduled_for.lte."{upper}"),'
+                    f'and(scheduled_for.is.null,uploaded_at.gte."{lower}",uploaded_at.lte."{upper}")'
+                )
+            if limit:
+                query = query.order("uploaded_at", desc=True).limit(limit)
+            result = query.execute()
             return result.data 
         except Exception as e:
             raise DatabaseError(f"Error reading all the transcription {str(e)}")
\ No newline at end of file
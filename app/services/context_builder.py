@@ -0,0 +1,162 @@
+import math
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.utilities.tokens import count_tokens
+
+STOPWORDS = {
+    "a", "an", "and", "are", "about", "for", "from", "have", "i", "in", "is", "it", "me", "my", "of", "on",
+    "or", "the", "this", "that", "to", "what", "with", "do", "did", "any", "all",
+}
+
+# BM25 term saturation - the third mention of a word adds much less than the first
+TERM_SATURATION = 1.2
+# Share of the smaller item's words found in the other - catches a memory that
+# restates a note, not just identical notes
+NEAR_DUPLICATE_OVERLAP = 0.9
+MIN_DUPLICATE_TERMS = 3
+
+
+@dataclass
+class ContextCandidate:
+    source: str  # "note" | "memory"
+    text: str    # the line that goes into the prompt
+    body: str    # what duplicates are judged on (a note's content, without its title)
+    note: Optional[dict] = None
+    timestamp: Optional[datetime] = None
+    score: float = 0.0
+    tokens: int = 0
+    body_terms: set = field(default_factory=set)
+
+
+@dataclass
+class PackedContext:
+    notes: list[dict]
+    memories: list[str]
+    tokens: int
+    candidates: int
+    dropped_duplicates: int
+    dropped_over_budget: int
+
+    def stats(self) -> dict:
+        return {
+            "tokens": self.tokens,
+            "candidates": self.candidates,
+            "included": len(self.notes) + len(self.memories),
+            "dropped_duplicates": self.dropped_duplicates,
+            "dropped_over_budget": self.dropped_over_budget,
+        }
+
+
+def _terms(text: str) -> list[str]:
+    return [word for word in re.findall(r"\w+", text.lower()) if word not in STOPWORDS]
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _score(candidates: list[ContextCandidate], query: str, now: datetime, half_life_days: float, recency_weight: float):
+    """Lexical BM25-style overlap with the query (normalized to 0..1) blended with exponential recency decay"""
+    query_terms = set(_terms(query))
+    documents = [_terms(candidate.text) for candidate in candidates]
+
+    # idf over the candidate set itself - a word every note shares says nothing
+    idf = {}
+    for term in query_terms:
+        containing = sum(1 for words in documents if term in words)
+        idf[term] = math.log(1 + (len(documents) - containing + 0.5) / (containing + 0.5))
+
+    lexical = []
+    for candidate, words in zip(candidates, documents):
+        score = 0.0
+        for term in query_terms:
+            tf = words.count(term)
+            if tf:
+                score += idf[term] * tf * (TERM_SATURATION + 1) / (tf + TERM_SATURATION)
+        lexical.append(score)
+
+    top = max(lexical, default=0.0) or 1.0
+    for candidate, score in zip(candidates, lexical):
+        if candidate.timestamp is not None:
+            age_days = max((now - candidate.timestamp).total_seconds() / 86400, 0.0)
+            recency = 0.5 ** (age_days / half_life_days)
+        else:
+            recency = 0.5  # undated memories are neither fresh nor stale
+        candidate.score = (1 - recency_weight) * (score / top) + recency_weight * recency
+
+
+def _is_duplicate(candidate: ContextCandidate, kept: list[ContextCandidate], seen: set[str]) -> bool:
+    normalized = " ".join(_terms(candidate.body))
+    if normalized in seen:
+        return True
+    seen.add(normalized)
+    candidate.body_terms = set(normalized.split())
+    for other in kept:
+        smaller = min(len(candidate.body_terms), len(other.body_terms))
+        if smaller >= MIN_DUPLICATE_TERMS and len(candidate.body_terms & other.body_terms) / smaller >= NEAR_DUPLICATE_OVERLAP:
+            return True
+    return False
+
+
+def pack_context(
+    query: str,
+    notes: list[dict],
+    memories: list[str],
+    budget_tokens: int,
+    half_life_days: float = 14.0,
+    recency_weight: float = 0.3,
+    now: Optional[datetime] = None,
+) -> PackedContext:
+    """
+    Pick the notes and memories worth sending to synthesis, best first, within `budget_tokens`.
+
+    Candidates from both sources are scored together, near-duplicates (the
+    same item from Supabase and Supermemory, or a note repeated across
+    recordings) are dropped, and the rest are packed greedily - an item that
+    doesn't fit is skipped so a smaller one behind it still can.
+    """
+    now = now or datetime.now(timezone.utc)
+    candidates = [
+        ContextCandidate(
+            source="note",
+            text=f"- {note.get('title')}: {note.get('formatted_content')}",
+            body=str(note.get("formatted_content") or ""),
+            note=note,
+            timestamp=_parse_timestamp(note.get("uploaded_at")),
+        )
+        for note in notes
+    ] + [ContextCandidate(source="memory", text=f"- {memory}", body=memory) for memory in memories]
+
+    _score(candidates, query, now, half_life_days, recency_weight)
+
+    kept: list[ContextCandidate] = []
+    seen: set[str] = set()
+    used = duplicates = over_budget = 0
+    for candidate in sorted(candidates, key=lambda candidate: candidate.score, reverse=True):
+        if _is_duplicate(candidate, kept, seen):
+            duplicates += 1
+            continue
+        candidate.tokens = count_tokens(candidate.text) + 1  # + the newline joining it
+        if used + candidate.tokens > budget_tokens:
+            over_budget += 1
+            continue
+        kept.append(candidate)
+        used += candidate.tokens
+
+    return PackedContext(
+        notes=[candidate.note for candidate in kept if candidate.source == "note"],
+        memories=[candidate.text[2:] for candidate in kept if candidate.source == "memory"],
+        tokens=used,
+        candidates=len(candidates),
+        dropped_duplicates=duplicates,
+        dropped_over_budget=over_budget,
+    )
@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from app.core.cache import PersistentCache, get_cache
+from app.core.config import settings
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+SHINGLE_SIZE = 5  # characters - transcripts are short, word shingles would be too coarse
+
+
+def normalize_transcript(text: str) -> str:
+    """
+    Case, punctuation and hesitation sounds don't make a recording new.
+    Words like "like"/"so"/"okay" stay - they carry meaning often enough.
+    """
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    text = re.sub(r"\b(um+|uh+|er+|hmm+)\b", " ", text)
+    return " ".join(text.split())
+
+
+class MinHasher:
+    """
+    MinHash signatures over character shingles, with seeded (so stable across
+    processes) universal hashes ((a * x + b) mod p) evaluated in numpy.
+    Signatures are 32-bit values, so they round-trip through JSON exactly.
+    """
+
+    def __init__(self, num_perm: int, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(max(len(text) - SHINGLE_SIZE + 1, 1))}
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little") for s in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+        # uint64 wraps on overflow, which only scrambles further; keep the low 32 bits like datasketch
+        with np.errstate(over="ignore"):
+            permuted = ((np.outer(hashes, self.a) + self.b) % np.uint64(MERSENNE_PRIME)) & np.uint64(MAX_HASH)
+        return permuted.min(axis=0)
+
+
+@dataclass
+class DuplicateMatch:
+    transcript_key: str
+    similarity: float
+    note_ids: list
+    first_seen: str
+    exact: bool = False  # same normalized transcript - nothing new was said
+
+
+class DuplicateDetector:
+    """
+    Per-user near-duplicate lookup for transcripts, run before extraction.
+
+    Signatures are split into LSH bands; each band is a bucket key in the
+    PersistentCache, so candidates come from a handful of key lookups instead
+    of comparing against every past recording. Candidates are then confirmed
+    on estimated Jaccard similarity. Entries expire after
+    `near_duplicate_window`, so only repeats of recent recordings are caught.
+
+    Only an `exact` match is the same recording. A near match can differ in
+    exactly the detail that matters ("Denver" -> "Boston", "$120" -> "$210",
+    one added task), so callers must still extract it.
+    """
+
+    def __init__(self, cache: PersistentCache, num_perm: int, bands: int, threshold: float, window: float):
+        if num_perm % bands:
+            raise ValueError("minhash_permutations must be a multiple of minhash_bands")
+        self.cache = cache
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.window = window
+
+    def _band_keys(self, user_id: str, signature: np.ndarray) -> list[str]:
+        return [
+            f"{user_id}:{band}:{hashlib.sha1(signature[band * self.rows:(band + 1) * self.rows].tobytes()).hexdigest()}"
+            for band in range(self.bands)
+        ]
+
+    def _transcript_key(self, user_id: str, normalized: str) -> str:
+        return f"{user_id}:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+    def find(self, user_id: str, transcript: str) -> Optional[DuplicateMatch]:
+        """Most similar recent recording of this user above the threshold, if any. Blocking."""
+        normalized = normalize_transcript(transcript)
+        if not normalized:
+            return None
+        own_key = self._transcript_key(user_id, normalized)
+        exact = self.cache.get("minhash_signature", own_key)
+        if exact is not None:
+            return DuplicateMatch(own_key, 1.0, exact["note_ids"], exact["first_seen"], exact=True)
+
+        signature = self.hasher.signature(normalized)
+        candidates = set()
+        for band_key in self._band_keys(user_id, signature):
+            candidates.update(self.cache.get("minhash_band", band_key) or [])
+
+        best = None
+        for transcript_key in candidates:
+            entry = self.cache.get("minhash_signature", transcript_key)
+            if entry is None:
+                continue
+            similarity = float(np.mean(np.asarray(entry["signature"], dtype=np.uint64) == signature))
+            if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                best = DuplicateMatch(transcript_key, similarity, entry["note_ids"], entry["first_seen"])
+        return best
+
+    def remember(self, user_id: str, transcript: str, note_ids: list):
+        """Index a processed recording and the notes it produced. Blocking."""
+        normalized = normalize_transcript(transcript)
+        if not normalized or not note_ids:
+            return
+        signature = self.hasher.signature(normalized)
+        transcript_key = self._transcript_key(user_id, normalized)
+
+        self.cache.set("minhash_signature", transcript_key, {
+            "signature": signature.tolist(),
+            "note_ids": note_ids,
+            "first_seen": datetime.now(timezone.utc).isoformat()
+        }, self.window)
+        for band_key in self._band_keys(user_id, signature):
+            members = self.cache.get("minhash_band", band_key) or []
+            if transcript_key not in members:
+                # Bounded so one very common phrasing can't grow a bucket forever
+                self.cache.set("minhash_band", band_key, (members + [transcript_key])[-50:], self.window)
+
+    async def find_async(self, user_id: str, transcript: str) -> Optional[DuplicateMatch]:
+        return await asyncio.to_thread(self.find, user_id, transcript)
+
+    async def remember_async(self, user_id: str, transcript: str, note_ids: list):
+        await asyncio.to_thread(self.remember, user_id, transcript, note_ids)
+
+
+duplicate_detector = DuplicateDetector(
+    get_cache(),
+    settings.minhash_permutations,
+    settings.minhash_bands,
+    settings.near_duplicate_threshold,
+    settings.near_duplicate_window
+)
+
+
+def get_duplicate_detector() -> DuplicateDetector:
+    """Dependency to get the shared near-duplicate detector."""
+    return duplicate_detector
@@ -0,0 +1,84 @@
+import hashlib
+import re
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from app.core.clients import ClientRegistry
+from app.core.config import settings
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class EmbeddingProvider(ABC):
+    """
+    Turns texts into L2-normalized float32 vectors.
+
+    `name` identifies the embedding space - vectors from different providers
+    (or dimensions) are never compared, the index keeps them apart by name.
+    """
+
+    name: str
+    dim: int
+
+    @abstractmethod
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        ...
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, clients: ClientRegistry, model: str, dim: int, batch_size: int = 256):
+        self.llm = clients.openai
+        self.model = model
+        self.dim = dim
+        self.batch_size = batch_size
+        self.name = f"openai-{model}-{dim}"
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            response = await self.llm.embeddings.create(
+                model=self.model,
+                input=texts[start:start + self.batch_size],
+                dimensions=self.dim
+            )
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim))
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Offline, deterministic embeddings: signed feature hashing of words and word pairs.
+
+    No network and the same vector for the same text in every process, so it
+    suits tests and local development. Captures word overlap, not meaning.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = re.findall(r"\w+", text.lower())
+        features = [(word, 1.0) for word in words] + [(f"{a} {b}", 0.5) for a, b in zip(words, words[1:])]
+        for feature, weight in features:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += weight if digest >> 63 else -weight
+        return vector
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return _normalize(np.stack([self._embed_one(text) for text in texts]))
+
+
+def get_embedding_provider(clients: ClientRegistry) -> EmbeddingProvider:
+    if settings.embedding_provider == "hashing":
+        return HashingEmbeddingProvider(settings.embedding_dimensions)
+    if settings.embedding_provider == "openai":
+        return OpenAIEmbeddingProvider(clients, settings.embedding_model, settings.embedding_dimensions)
+    raise ValueError(f"Unknown embedding provider: {settings.embedding_provider}")
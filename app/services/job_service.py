@@ -0,0 +1,206 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+
+from app.core.clients import ClientRegistry
+from app.core.config import settings
+from app.repositories.job_repository import JobRepository
+from app.utilities.audio_buffer import AudioBuffer
+
+# Pipeline stages in the order upload_and_create reaches them
+JOB_STAGES = ("queued", "uploaded", "transcribed", "extracted", "saved", "indexed")
+TERMINAL_STATUSES = {"completed", "failed"}
+
+
+def format_ingestion_result(result, saved_status: str = "pushed") -> dict:
+    """Shape upload_and_create output the way /add-voice has always returned it (/upload says "uploaded" for new notes)."""
+    # Query response: {transcription, query, results: [...]}
+    if isinstance(result, dict) and "results" in result:
+        return {
+            "notes_created": len(result["results"]),
+            "notes": result["results"],
+            "status": "retrieved",
+            "transcription": result["transcription"],
+            "query": result["query"]
+        }
+    # Repeat of a recent recording: {transcription, duplicate_of, similarity, notes}
+    if isinstance(result, dict) and "duplicate_of" in result:
+        return {
+            "notes_created": 0,
+            "notes": result["notes"],
+            "status": "duplicate",
+            "duplicate_of": result["duplicate_of"],
+            "similarity": result["similarity"]
+        }
+    # Push response: list of database notes
+    return {
+        "notes_created": len(result),
+        "notes": result,
+        "status": saved_status
+    }
+
+
+class IngestionJobQueue:
+    """
+    In-process queue + async worker pool for voice ingestion.
+
+    Job records live in Supabase (ingestion_jobs) so any uvicorn worker can report
+    status; live progress events are fanned out to local subscribers, and streams
+    for jobs owned by another process fall back to polling the record.
+
+    Each process heartbeats the jobs it holds; a queued/running job nobody has
+    touched for `stale_job_seconds` died with its worker and is marked failed,
+    so its client isn't left polling forever.
+    """
+
+    def __init__(self, clients: ClientRegistry, num_workers: int = settings.ingestion_workers, max_queued: int = settings.ingestion_queue_size):
+        self.clients = clients
+        self.num_workers = num_workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self.repository = JobRepository(clients.supabase)
+        self._workers: list[asyncio.Task] = []
+        self._jobs: dict[str, dict] = {}  # job_id -> latest state, for jobs owned by this process
+        self._listeners: dict[str, set[asyncio.Queue]] = {}
+
+    async def start(self):
+        # Jobs a previous run of this (or another) process left behind
+        await self._fail_stale_jobs()
+        for i in range(self.num_workers):
+            self._workers.append(asyncio.create_task(self._worker(i)))
+        self._workers.append(asyncio.create_task(self._heartbeat()))
+        print(f"Started {self.num_workers} ingestion workers")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+        # Anything still queued dies with the process - at least free its temp files
+        while not self.queue.empty():
+            job_id, _, audio, _ = self.queue.get_nowait()
+            await audio.close()
+            await self._update(job_id, status="failed", error="Server shut down before processing")
+
+    async def submit(self, filename: str, audio: AudioBuffer, user_id: str) -> dict:
+        """
+        Persist a job record and enqueue it. Raises asyncio.QueueFull when saturated.
+
+        The queue takes ownership of `audio` and closes it once the job finishes.
+        """
+        if self.queue.full():
+            raise asyncio.QueueFull()
+
+        job = await asyncio.to_thread(self.repository.create_job, user_id, filename)
+        self._jobs[job["id"]] = job
+        self.queue.put_nowait((job["id"], filename, audio, user_id))
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        if job_id in self._jobs:
+            return self._jobs[job_id]
+        return await asyncio.to_thread(self.repository.get_job, job_id)
+
+    async def events(self, job_id: str, poll_interval: float = 1.0) -> AsyncIterator[dict]:
+        """Yield job state every time it changes, ending after a terminal status."""
+        listener: asyncio.Queue = asyncio.Queue()
+        self._listeners.setdefault(job_id, set()).add(listener)
+        try:
+            job = await self.get_job(job_id)
+            if job is None:
+                return
+            yield job
+
+            last_seen = (job["status"], job["stage"])
+            while job["status"] not in TERMINAL_STATUSES:
+                try:
+                    job = await asyncio.wait_for(listener.get(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    # Owned by another process (or we missed nothing) - re-read the record
+                    job = await self.get_job(job_id)
+                    if job is None:
+                        return
+
+                if (job["status"], job["stage"]) != last_seen:
+                    last_seen = (job["status"], job["stage"])
+                    yield job
+        finally:
+            self._listeners[job_id].discard(listener)
+            if not self._listeners[job_id]:
+                del self._listeners[job_id]
+
+    async def _worker(self, index: int):
+        # Imported here - voice_service pulls in the whole service graph
+        from app.services.voice_service import VoiceService
+
+        while True:
+            job_id, filename, audio, user_id = await self.queue.get()
+            try:
+                await self._update(job_id, status="running")
+                stage_lock = asyncio.Lock()
+
+                async def on_stage(stage: str):
+                    # Upload and transcription finish in either order - only move forward, one write at a time,
+                    # so the stored stage can't end up behind the one clients were already sent
+                    async with stage_lock:
+                        if JOB_STAGES.index(stage) > JOB_STAGES.index(self._jobs.get(job_id, {}).get("stage") or "queued"):
+                            await self._update(job_id, stage=stage)
+
+                voice_service = VoiceService(self.clients)
+                result = await voice_service.upload_and_create(filename, audio, user_id, on_stage=on_stage)
+                # round-trip through json so datetimes etc. fit in the jsonb column
+                result = json.loads(json.dumps(format_ingestion_result(result), default=str))
+                await self._update(job_id, status="completed", result=result)
+            except Exception as e:
+                print(f"Ingestion job {job_id} failed in worker {index}: {e}")
+                await self._update(job_id, status="failed", error=str(e))
+            finally:
+                await audio.close()
+                self.queue.task_done()
+                if self._jobs.get(job_id, {}).get("status") in TERMINAL_STATUSES:
+                    self._jobs.pop(job_id, None)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(settings.job_heartbeat_seconds)
+            held = [job_id for job_id, job in self._jobs.items() if job.get("status") not in TERMINAL_STATUSES]
+            try:
+                if held:
+                    await asyncio.to_thread(self.repository.touch_jobs, held)
+            except Exception as e:
+                print(f"Failed to heartbeat {len(held)} ingestion jobs: {e}")
+            # A sibling worker that crashed doesn't restart through start()
+            await self._fail_stale_jobs()
+
+    async def _fail_stale_jobs(self):
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.stale_job_seconds)
+        try:
+            failed = await asyncio.to_thread(self.repository.fail_stale_jobs, cutoff, "Server restarted before the job finished")
+        except Exception as e:
+            print(f"Failed to clean up stale ingestion jobs: {e}")
+            return
+        if failed:
+            print(f"Marked {len(failed)} stale ingestion jobs as failed")
+
+    async def _update(self, job_id: str, **fields):
+        job = {**self._jobs.get(job_id, {"id": job_id}), **fields}
+        self._jobs[job_id] = job
+        for listener in self._listeners.get(job_id, ()):
+            listener.put_nowait(job)
+
+        try:
+            await asyncio.to_thread(self.repository.update_job, job_id, fields)
+        except Exception as e:
+            # Progress reporting must never take down the pipeline itself
+            print(f"Failed to persist job {job_id} update {fields}: {e}")
+
+
+ingestion_queue: Optional[IngestionJobQueue] = None
+
+
+def get_ingestion_queue() -> IngestionJobQueue:
+    """Dependency to get the ingestion job queue started in the app lifespan."""
+    if ingestion_queue is None:
+        raise RuntimeError("Ingestion queue has not been started")
+    return ingestion_queue
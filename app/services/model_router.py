@@ -0,0 +1,210 @@
+import time
+from collections import deque
+from dataclasses import dataclass, fields, replace
+from statistics import median
+from typing import Awaitable, Callable, Iterable, Optional, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# Compressed uploads (m4a/mp3 at ~128kbps) - only when the container's duration can't be read (audio_chunker.audio_seconds)
+AUDIO_BYTES_PER_SECOND = 16_000
+
+
+@dataclass(frozen=True)
+class RoutingPolicy:
+    """
+    How one kind of call picks its model.
+
+    `kind` selects the tier list (`chat_model_tiers` / `transcription_model_tiers`,
+    cheapest first). A call starts at `min_tier`, one tier up when its input is
+    larger than `escalate_above` (tokens, or seconds of audio) or the caller
+    flags it complex, and never goes past `max_tier`. With routing off, every
+    call uses `default_tier` (the model the task was hard-coded to before).
+    """
+    kind: str = "chat"
+    min_tier: int = 0
+    max_tier: int = 1
+    default_tier: int = 0
+    escalate_above: Optional[float] = None
+    max_latency: Optional[float] = None  # seconds; a tier slower than this (median) is skipped while it is
+
+
+# Defaults; `model_routing_policies` overrides fields per task
+POLICIES = {
+    # Stays on the stronger model: nothing has measured the fast tier's splits and dates against it yet, and
+    # _usable_extraction only catches empty output. {"extraction": {"min_tier": 0}} opts short notes in.
+    "extraction": RoutingPolicy(min_tier=1, escalate_above=400, default_tier=1),
+    "query_analysis": RoutingPolicy(escalate_above=40, default_tier=1),  # rules and the cache take the short ones first anyway
+    "synthesis": RoutingPolicy(),                                        # escalates only on an empty answer
+    "summary_fold": RoutingPolicy(max_tier=0),
+    "transcription": RoutingPolicy(kind="transcription", escalate_above=300, default_tier=1),
+}
+
+
+class ModelStats:
+    """Recent outcomes of one model (a sliding window, so a bad hour doesn't follow it forever)"""
+
+    def __init__(self, window: int):
+        self.outcomes: deque[tuple[bool, float]] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.escalations = 0
+        self.last_call = 0.0
+
+    def record(self, ok: bool, latency: float):
+        self.outcomes.append((ok, latency))
+        self.last_call = time.monotonic()
+        self.calls += 1
+        self.errors += not ok
+
+    def error_rate(self) -> float:
+        return sum(not ok for ok, _ in self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def median_latency(self) -> Optional[float]:
+        latencies = [latency for ok, latency in self.outcomes if ok]
+        return median(latencies) if latencies else None
+
+    def to_dict(self) -> dict:
+        latency = self.median_latency()
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "escalations": self.escalations,
+            "recent_error_rate": round(self.error_rate(), 3),
+            "median_latency": round(latency, 3) if latency is not None else None,
+        }
+
+
+class ModelRouter:
+    """
+    Picks the model for every LLM and transcription call.
+
+    Most calls are short ("buy milk") and run on the cheapest tier; large or
+    complex inputs start higher. A tier that has recently been failing (or is
+    over its policy's latency budget) is skipped until a cooldown passes. With `run`, an error or an
+    output the caller's `accept` check rejects is retried one tier up.
+    """
+
+    def __init__(self, tiers: dict[str, list[str]], policies: dict[str, RoutingPolicy], enabled: bool = True,
+                 window: int = 50, max_error_rate: float = 0.25, min_samples: int = 5, cooldown: float = 60.0):
+        self.tiers = tiers
+        self.policies = policies
+        self.enabled = enabled
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.window = window
+        self.cooldown = cooldown
+        self.stats: dict[str, ModelStats] = {}
+
+    def _stats(self, model: str) -> ModelStats:
+        if model not in self.stats:
+            self.stats[model] = ModelStats(self.window)
+        return self.stats[model]
+
+    def _healthy(self, model: str, policy: RoutingPolicy) -> bool:
+        stats = self.stats.get(model)
+        if stats is None or len(stats.outcomes) < self.min_samples:
+            return True
+        # Skipped tiers get no new outcomes - after a quiet spell, let one call find out if it recovered
+        if time.monotonic() - stats.last_call > self.cooldown:
+            return True
+        latency = stats.median_latency()
+        return stats.error_rate() <= self.max_error_rate and (
+            policy.max_latency is None or latency is None or latency <= policy.max_latency
+        )
+
+    def candidates(self, task: str, size: float = 0, complex: bool = False) -> list[str]:
+        """Models to try for one call, in order: the routed tier, then each tier above it up to the policy's ceiling"""
+        policy = self.policies[task]
+        tiers = self.tiers[policy.kind]
+        top = min(policy.max_tier, len(tiers) - 1)
+        if not self.enabled:
+            return [tiers[min(policy.default_tier, len(tiers) - 1)]]
+
+        start = policy.min_tier
+        if complex or (policy.escalate_above is not None and size > policy.escalate_above):
+            start += 1
+        start = min(start, top)
+        # Skip tiers that are failing right now, but always keep the top one to fall back on
+        while start < top and not self._healthy(tiers[start], policy):
+            start += 1
+        return tiers[start:top + 1]
+
+    def choose(self, task: str, size: float = 0, complex: bool = False) -> str:
+        """The model for a call that can't be retried (a stream already sent to the client)"""
+        return self.candidates(task, size, complex)[0]
+
+    def record(self, model: str, ok: bool, latency: float):
+        self._stats(model).record(ok, latency)
+
+    async def run(self, task: str, call: Callable[[str], Awaitable[T]], size: float = 0, complex: bool = False,
+                  accept: Optional[Callable[[T], bool]] = None) -> T:
+        """
+        Await `call(model)` on the routed model. On an error or a result `accept`
+        rejects, retry one tier up; the top tier's answer is returned either way.
+        """
+        models = self.candidates(task, size, complex)
+        for position, model in enumerate(models):
+            last = position == len(models) - 1
+            started = time.perf_counter()
+            try:
+                result = await call(model)
+            except Exception as e:
+                self.record(model, False, time.perf_counter() - started)
+                if last:
+                    raise
+                print(f"{task} on {model} failed ({e}) - escalating to {models[position + 1]}")
+                self._stats(model).escalations += 1
+                continue
+
+            ok = accept is None or accept(result)
+            self.record(model, ok, time.perf_counter() - started)
+            if ok or last:
+                return result
+            print(f"{task} on {model} gave a low-quality result - escalating to {models[position + 1]}")
+            self._stats(model).escalations += 1
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "tiers": self.tiers,
+            "models": {model: stats.to_dict() for model, stats in self.stats.items()},
+        }
+
+
+def _policies(overrides: dict[str, dict], kinds: Iterable[str]) -> dict[str, RoutingPolicy]:
+    """POLICIES with `model_routing_policies` applied. A typo there fails here, naming the bad key, not deep in dataclasses."""
+    unknown = sorted(set(overrides) - set(POLICIES))
+    if unknown:
+        raise ValueError(f"MODEL_ROUTING_POLICIES: unknown task(s) {', '.join(unknown)} (tasks: {', '.join(POLICIES)})")
+
+    names = [field.name for field in fields(RoutingPolicy)]
+    policies = {}
+    for task, policy in POLICIES.items():
+        values = overrides.get(task, {})
+        if not isinstance(values, dict):
+            raise ValueError(f"MODEL_ROUTING_POLICIES[{task}] must be an object of policy fields, got {values!r}")
+        unknown = sorted(set(values) - set(names))
+        if unknown:
+            raise ValueError(f"MODEL_ROUTING_POLICIES[{task}]: unknown field(s) {', '.join(unknown)} (fields: {', '.join(names)})")
+        policies[task] = replace(policy, **values)
+        if policies[task].kind not in kinds:
+            raise ValueError(f"MODEL_ROUTING_POLICIES[{task}]: kind must be one of {', '.join(kinds)}")
+    return policies
+
+
+model_router = ModelRouter(
+    {"chat": settings.chat_model_tiers, "transcription": settings.transcription_model_tiers},
+    _policies(settings.model_routing_policies, ("chat", "transcription")),
+    enabled=settings.model_routing,
+    window=settings.model_stats_window,
+    max_error_rate=settings.model_max_error_rate,
+    cooldown=settings.model_recovery_seconds
+)
+
+
+def get_model_router() -> ModelRouter:
+    """Dependency to get the shared model router."""
+    return model_router
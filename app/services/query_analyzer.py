@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.core.cache import get_cache
+from app.core.clients import ClientRegistry
+from app.core.config import settings
+from app.models.response import QueryAnalysis
+from app.services.model_router import get_model_router
+from app.services.query_rules import PATTERN_WORDS, analyze_with_rules
+from app.utilities import prompt
+from app.utilities.tokens import count_tokens
+
+
+def normalize_query(user_query: str) -> str:
+    """Case, whitespace and trailing punctuation don't change what the user is asking"""
+    query = re.sub(r"\s+", " ", user_query.strip().lower())
+    return query.rstrip("?!. ")
+
+
+def _seconds_until_midnight(now: datetime) -> float:
+    now = now.astimezone(timezone.utc)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return (midnight - now).total_seconds()
+
+
+class QueryAnalysisCache:
+    """
+    Two-tier cache of QueryAnalysis results: an in-process LRU in front of the
+    shared PersistentCache, both expiring after `ttl`.
+
+    An analysis without a temporal range doesn't depend on when it was asked,
+    so it's keyed on the normalized query alone. One with a range ("today",
+    "this week", "in October") is keyed on the query plus the UTC date it was
+    resolved on and expires at the next midnight - the range is only ever
+    served on the day it was computed for.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lru: OrderedDict[str, tuple[float, dict]] = OrderedDict()  # key -> (expires_at, entry)
+        self.hits = {"memory": 0, "persistent": 0}
+        self.misses = 0
+
+    def _keys(self, user_query: str, now: datetime) -> tuple[str, str]:
+        """(date-free key, dated key)"""
+        digest = hashlib.sha256(normalize_query(user_query).encode()).hexdigest()
+        return digest, f"{digest}:{now.astimezone(timezone.utc).date().isoformat()}"
+
+    async def get(self, user_query: str, now: datetime) -> Optional[QueryAnalysis]:
+        keys = self._keys(user_query, now)
+
+        for key in keys:
+            cached = self._lru.get(key)
+            if cached is not None:
+                expires_at, entry = cached
+                if expires_at > time.time():
+                    self._lru.move_to_end(key)
+                    self.hits["memory"] += 1
+                    return QueryAnalysis.model_validate(entry)
+                del self._lru[key]
+
+        for key, dated in zip(keys, (False, True)):
+            entry = await asyncio.to_thread(get_cache().get, "query_analysis", key)
+            if entry is not None:
+                # The persistent layer doesn't say how long is left - keep it in memory no longer than a fresh entry
+                self._remember(key, entry, self._ttl(dated, now))
+                self.hits["persistent"] += 1
+                return QueryAnalysis.model_validate(entry)
+
+        self.misses += 1
+        return None
+
+    async def set(self, user_query: str, analysis: QueryAnalysis, now: datetime):
+        timeless, dated = self._keys(user_query, now)
+        has_range = analysis.temporal_range_start is not None or analysis.temporal_range_end is not None
+        key = dated if has_range else timeless
+        ttl = self._ttl(has_range, now)
+        entry = analysis.model_dump(mode="json")
+        self._remember(key, entry, ttl)
+        await asyncio.to_thread(get_cache().set, "query_analysis", key, entry, ttl)
+
+    def _ttl(self, dated: bool, now: datetime) -> float:
+        return min(self.ttl, _seconds_until_midnight(now)) if dated else self.ttl
+
+    def _remember(self, key: str, entry: dict, ttl: float):
+        self._lru[key] = (time.time() + ttl, entry)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def stats(self) -> dict:
+        hits = sum(self.hits.values())
+        lookups = hits + self.misses
+        return {
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries_in_memory": len(self._lru)
+        }
+
+
+analysis_cache = QueryAnalysisCache(settings.query_analysis_cache_size, settings.query_analysis_cache_ttl)
+rule_stats = {"matched": 0, "fallback": 0}
+
+
+def _usable_analysis(analysis: Optional[QueryAnalysis]) -> bool:
+    # The prompt insists on a real range - a zero-width one means the date math went wrong
+    if analysis is None or not analysis.relevant_intents or not analysis.semantic_query.strip():
+        return False
+    start, end = analysis.temporal_range_start, analysis.temporal_range_end
+    return not (start and end and start >= end)
+
+
+class QueryAnalyzer:
+    """Turns a natural-language question into a QueryAnalysis (shared by QueryService and SupermemoryService)"""
+
+    def __init__(self, clients: ClientRegistry):
+        self.llm = clients.openai
+        self.router = get_model_router()
+
+    async def analyze(self, user_query: str) -> QueryAnalysis:
+        now = datetime.now(timezone.utc)
+
+        # Simple lookups ("tasks for today") never need the LLM - resolve them in-process
+        if settings.rule_based_query_analysis:
+            analysis = analyze_with_rules(user_query, now)
+            if analysis is not None:
+                rule_stats["matched"] += 1
+                print(f"Query analyzed by rules: '{user_query}'")
+                return analysis
+            rule_stats["fallback"] += 1
+
+        cached = await analysis_cache.get(user_query, now)
+        if cached is not None:
+            print(f"Query analysis cache hit for '{user_query}'")
+            return cached
+
+        messages = prompt.ANALYZE_QUERY.messages(now, user_query=user_query)
+
+        async def call(model: str) -> Optional[QueryAnalysis]:
+            response = await self.llm.beta.chat.completions.parse(
+                model=model,
+                messages=messages,
+                response_format=QueryAnalysis,
+                temperature=0.3
+            )
+            prompt.ANALYZE_QUERY.record_usage(response.usage)
+            return response.choices[0].message.parsed
+
+        # Questions about patterns over history need more reasoning than "ideas about X"
+        analysis = await self.router.run(
+            "query_analysis",
+            call,
+            size=count_tokens(user_query),
+            complex=bool(PATTERN_WORDS.intersection(normalize_query(user_query).split())),
+            accept=_usable_analysis
+        )
+
+        await analysis_cache.set(user_query, analysis, now)
+        return analysis
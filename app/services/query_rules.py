@@ -0,0 +1,209 @@
+"""
+Deterministic fast path for QueryAnalyzer.
+
+Handles the short, common questions ("tasks for today", "what's scheduled this
+week", "my ideas about software") with keyword -> intent maps and a relative
+date resolver. Anything it can't account for word-for-word returns None and
+goes to the LLM, so a wrong guess here is much less likely than a slow answer.
+"""
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from dateutil.relativedelta import relativedelta, MO, TU, WE, TH, FR, SA, SU
+
+from app.models.response import QueryAnalysis
+
+# keyword -> intents it signals. Order matters only for the semantic query label.
+INTENT_KEYWORDS: dict[str, list[str]] = {
+    "todo": ["tasks", "reminder", "schedules"],
+    "todos": ["tasks", "reminder", "schedules"],
+    "task": ["tasks"],
+    "tasks": ["tasks"],
+    "chores": ["tasks"],
+    "errands": ["tasks"],
+    "schedule": ["schedules"],
+    "scheduled": ["schedules"],
+    "calendar": ["schedules"],
+    "appointment": ["schedules"],
+    "appointments": ["schedules"],
+    "meeting": ["schedules"],
+    "meetings": ["schedules"],
+    "events": ["schedules"],
+    "plans": ["schedules", "decisions"],
+    "reminder": ["reminder"],
+    "reminders": ["reminder"],
+    "idea": ["ideas"],
+    "ideas": ["ideas"],
+    "brainstorm": ["ideas"],
+    "metrics": ["metric"],
+    "progress": ["metric"],
+    "workouts": ["metric"],
+    "reflections": ["reflection"],
+    "feelings": ["reflection"],
+    "decisions": ["decisions"],
+    "decided": ["decisions"],
+    "questions": ["curiosity"],
+    "curiosities": ["curiosity"],
+    "people": ["people"],
+    "notes": ["note"],
+}
+
+INTENT_LABELS = {
+    "tasks": "tasks", "schedules": "scheduled events", "reminder": "reminders", "ideas": "ideas",
+    "note": "notes", "metric": "metrics and progress", "reflection": "reflections",
+    "curiosity": "questions to research", "decisions": "decisions", "people": "notes about people",
+}
+
+STOPWORDS = {
+    "what", "whats", "what's", "which", "do", "does", "i", "i'm", "im", "my", "me", "mine", "have", "has", "had",
+    "is", "are", "was", "were", "the", "a", "an", "for", "to", "all", "any", "show", "list", "give", "tell",
+    "of", "in", "at", "on", "this", "there", "theres", "there's", "get", "got", "need", "am", "be", "with",
+    "and", "or", "please", "can", "you", "from", "did", "due", "up", "set", "made", "make", "saved", "latest",
+    "recent", "about", "regarding", "related", "every", "everything", "anything", "some", "captured",
+    "recorded", "logged", "written", "noted",
+}
+
+# Words that mean the user wants analysis over history, not a lookup - always the LLM's job
+PATTERN_WORDS = {"avoid", "avoiding", "keep", "pattern", "patterns", "why", "how", "mentioned", "forgetting", "should", "urgent"}
+
+# The subset of those about the user's history as a whole - answered from the rolling summaries
+SUMMARY_PATTERNS = re.compile(
+    r"\b(avoid(ing|ed)?|putting off|procrastinat\w*|keep \w+ing|patterns?|recurring|themes?|habits?"
+    r"|(mention|mentioned|talk about) (a lot|often|the most)|always forget\w*)\b"
+)
+
+# Words a pattern question can carry without naming anything specific ("what things do I keep putting off lately?")
+PATTERN_FILLER = {
+    "things", "stuff", "lately", "recently", "most", "often", "usually", "really", "been", "these", "days", "always",
+    "kind", "kinds", "sort", "type", "types", "topics", "subjects", "general", "overall", "seem", "tend", "doing",
+    "lot", "common", "main", "biggest", "top", "notice", "see", "them", "they", "it", "that", "where", "when",
+    "much", "many", "more", "same", "again", "over", "time", "off", "life", "myself", "around", "notes", "think",
+}
+
+TOPIC_MARKERS = {"about", "regarding", "related"}
+MAX_TOPIC_WORDS = 3
+
+WEEKDAYS = {"monday": MO, "tuesday": TU, "wednesday": WE, "thursday": TH, "friday": FR, "saturday": SA, "sunday": SU}
+
+
+def _day(now: datetime, days: int = 0):
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=days)
+    return start, start + timedelta(hours=23, minutes=59, seconds=59)
+
+
+def _week(now: datetime, weeks: int = 0):
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0) + relativedelta(weekday=MO(-1), weeks=weeks)
+    return start, start + timedelta(days=6, hours=23, minutes=59, seconds=59)
+
+
+def _weekend(now: datetime):
+    # On Sunday "this weekend" is the one we're in, which started yesterday
+    saturday = SA(-1) if now.weekday() == 6 else SA(+1)
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0) + relativedelta(weekday=saturday)
+    return start, start + timedelta(days=1, hours=23, minutes=59, seconds=59)
+
+
+def _month(now: datetime, months: int = 0):
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0) + relativedelta(months=months)
+    return start, start + relativedelta(months=1) - timedelta(seconds=1)
+
+
+def _weekday(now: datetime, name: str, direction: str):
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if direction == "last":
+        start = day - timedelta(days=1) + relativedelta(weekday=WEEKDAYS[name](-1))
+    elif direction == "next":
+        start = day + timedelta(days=1) + relativedelta(weekday=WEEKDAYS[name](+1))
+    else:
+        start = day + relativedelta(weekday=WEEKDAYS[name](+1))
+    return start, start + timedelta(hours=23, minutes=59, seconds=59)
+
+
+# (pattern, resolver(now, match) -> (start, end)). Checked in order, first match wins.
+TEMPORAL_PATTERNS = [
+    (r"\b(today|tonight|this (morning|afternoon|evening))\b", lambda now, m: _day(now)),
+    (r"\btomorrow\b", lambda now, m: _day(now, 1)),
+    (r"\byesterday\b", lambda now, m: _day(now, -1)),
+    (r"\bthis weekend\b", lambda now, m: _weekend(now)),
+    (r"\b(this|current) week\b", lambda now, m: _week(now)),
+    (r"\bnext week\b", lambda now, m: _week(now, 1)),
+    (r"\blast week\b", lambda now, m: _week(now, -1)),
+    (r"\b(this|current) month\b", lambda now, m: _month(now)),
+    (r"\bnext month\b", lambda now, m: _month(now, 1)),
+    (r"\blast month\b", lambda now, m: _month(now, -1)),
+    (r"\b(coming up|upcoming|next (few|couple of) days)\b", lambda now, m: (now, now + timedelta(days=7))),
+    (
+        r"\b(?:(next|last|this|on)\s+)?(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b",
+        lambda now, m: _weekday(now, m.group(2), m.group(1) or "on"),
+    ),
+]
+
+
+def resolve_temporal_range(text: str, now: datetime) -> tuple[Optional[tuple[datetime, datetime]], str, str]:
+    """
+    Find one relative-date phrase in `text`.
+
+    Returns ((start, end) or None, the matched phrase, text without the phrase).
+    """
+    for pattern, resolver in TEMPORAL_PATTERNS:
+        match = re.search(pattern, text)
+        if match:
+            remaining = (text[:match.start()] + " " + text[match.end():]).strip()
+            return resolver(now, match), match.group(0), remaining
+    return None, "", text
+
+
+def analyze_with_rules(user_query: str, now: Optional[datetime] = None) -> Optional[QueryAnalysis]:
+    """Return a QueryAnalysis if every word of the query is accounted for, else None."""
+    now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+
+    text = user_query.lower().strip()
+    text = re.sub(r"\b(to[\s-]do|need to do|have to do)\b", " todo ", text)
+    text = re.sub(r"[^\w\s']", " ", text)
+
+    temporal_range, temporal_phrase, text = resolve_temporal_range(text, now)
+    words = text.split()
+    if not words or len(words) > 12 or PATTERN_WORDS.intersection(words):
+        return None
+
+    intents: list[str] = []
+    topics: list[str] = []
+    has_topic_marker = False
+    for word in words:
+        if word in INTENT_KEYWORDS:
+            intents.extend(i for i in INTENT_KEYWORDS[word] if i not in intents)
+        elif word in TOPIC_MARKERS:
+            has_topic_marker = True
+        elif word not in STOPWORDS:
+            topics.append(word)
+
+    # Unknown words are only safe as the object of "about ..." - otherwise the LLM decides
+    if not intents or (topics and not has_topic_marker) or len(topics) > MAX_TOPIC_WORDS:
+        return None
+
+    label = " and ".join(INTENT_LABELS[i] for i in intents[:2])
+    semantic_query = " ".join(topics + [label, temporal_phrase]).strip()
+
+    return QueryAnalysis(
+        relevant_intents=intents,
+        temporal_range_start=temporal_range[0] if temporal_range else None,
+        temporal_range_end=temporal_range[1] if temporal_range else None,
+        semantic_query=semantic_query,
+        requires_synthesis=not user_query.lower().lstrip().startswith(("show", "list"))
+    )
+
+
+def is_pattern_query(user_query: str, now: Optional[datetime] = None) -> bool:
+    """
+    A question about patterns across all of the user's notes. One tied to a date
+    range, or naming a topic ("am I avoiding the dentist?"), still needs the notes
+    themselves - the summaries are too compressed to answer for one thing.
+    """
+    now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    text = re.sub(r"[^\w\s']", " ", user_query.lower())
+    if resolve_temporal_range(text, now)[0] is not None or SUMMARY_PATTERNS.search(text) is None:
+        return False
+    # Intent words ("tasks", "ideas") are fine - each has its own summary
+    leftover = set(SUMMARY_PATTERNS.sub(" ", text).split()) - STOPWORDS - PATTERN_WORDS - PATTERN_FILLER - set(INTENT_KEYWORDS)
+    return not leftover
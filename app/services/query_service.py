@@ -1,94 +1,231 @@
-from openai import OpenAI
+import asyncio
+import time
+from typing import AsyncIterator, Optional
+
+from app.core.clients import ClientRegistry
 from app.core.config import settings
-from app.core.supabase_client import get_supabase
+from app.repositories.voice_repository import VoiceRepository
 from app.services.supermemory_service import SupermemoryService
 from app.models.response import QueryAnalysis
+from app.services.query_analyzer import QueryAnalyzer
+from app.services.context_builder import PackedContext, pack_context
+from app.services.model_router import get_model_router
+from app.services.query_rules import is_pattern_query
+from app.services.summary_service import SummaryService
+from app.services.vector_service import VectorService
 from app.utilities import prompt
-from app.services.voice_service import VoiceService
+from app.utilities.tokens import count_tokens
 
 
 class QueryService:
-    def __init__(self):
-        self.llm = OpenAI(api_key=settings.openai_api_key)
-        self.supermemory = SupermemoryService()
+    def __init__(self, clients: ClientRegistry):
+        self.llm = clients.openai
+        self.repository = VoiceRepository(clients.supabase)
+        self.supermemory = SupermemoryService(clients)
+        self.vectors = VectorService(clients)
+        self.analyzer = QueryAnalyzer(clients)
+        self.summaries = SummaryService(clients)
+        self.router = get_model_router()
 
     async def answer_query(self, user_query: str, user_id: str):
         """Main method: Analyze query, retrieve from both sources, synthesize answer"""
 
         try:
-            query_analysis = self._analyze_query(user_query)
-
-            print(f"Query analysis: \n {query_analysis}")
-            supabase_reponse = self._query_supabase(query_analysis)
+            summaries = await self._pattern_summaries(user_query, user_id)
+            if summaries is not None:
+                result = await self._complete(prompt.PATTERN_ANSWER, prompt.PATTERN_ANSWER.messages(question=user_query, summaries=summaries))
+                return {"answer": result, **self._summary_sources(summaries)}
 
+            query_analysis = await self._analyze_query(user_query)
 
-            supermemory_response = await self._query_supermemory(query_analysis, user_id)
+            print(f"Query analysis: \n {query_analysis}")
+            supabase_reponse, supermemory_response, sources = await self._retrieve(query_analysis, user_id)
+            context = self._pack_context(query_analysis, supabase_reponse, supermemory_response)
 
-            result = self._synthesize_answer(user_query, supabase_reponse, supermemory_response)
-            return result
+            result = await self._synthesize_answer(user_query, context)
+            return {"answer": result, "sources": sources, "context": context.stats()}
         except Exception as e:
             print(f"Error querying {e}")
 
-    def _analyze_query(self, user_query: str) -> QueryAnalysis:
-        """Use LLM to extract structured information from the query"""
-
-        query_prompt = prompt.analyze_query_prompt(user_query)
+    async def stream_answer(self, user_query: str, user_id: str) -> AsyncIterator[tuple[str, object]]:
+        """
+        Same pipeline as answer_query, as (event, data) pairs for SSE:
+        "sources" once retrieval finishes, a "token" per synthesis delta, then "done".
+        """
+        try:
+            summaries = await self._pattern_summaries(user_query, user_id)
+            if summaries is not None:
+                yield "sources", {**self._summary_sources(summaries), "notes": []}
+                template, messages = prompt.PATTERN_ANSWER, prompt.PATTERN_ANSWER.messages(question=user_query, summaries=summaries)
+            else:
+                query_analysis = await self._analyze_query(user_query)
+                supabase_reponse, supermemory_response, sources = await self._retrieve(query_analysis, user_id)
+                context = self._pack_context(query_analysis, supabase_reponse, supermemory_response)
+
+                yield "sources", {
+                    "sources": sources,
+                    "context": context.stats(),
+                    "notes": [{"id": item.get("id"), "title": item.get("title")} for item in context.notes]
+                }
+                template, messages = prompt.SYNTHESIS, self._build_synthesis_prompt(user_query, context)
+
+            answer = []
+            async for token in self._stream_completion(template, messages):
+                answer.append(token)
+                yield "token", {"text": token}
+
+            yield "done", {"answer": "".join(answer)}
+        except Exception as e:
+            print(f"Error streaming answer {e}")
+            yield "error", {"error": "failed to answer"}
+
+    async def _stream_completion(self, template: prompt.PromptTemplate, messages: list[dict]) -> AsyncIterator[str]:
+        # Tokens go straight to the client, so there's no retry on a bigger model - just the routed pick
+        model = self.router.choose("synthesis")
+        started = time.perf_counter()
+        produced = False
         try:
-            response = self.llm.beta.chat.completions.parse(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": query_prompt}],
-                response_format=QueryAnalysis,
-                temperature=0.3
+            stream = await self.llm.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.5,
+                stream=True,
+                stream_options={"include_usage": True}  # the last chunk reports cached prompt tokens
             )
+            async for chunk in stream:
+                template.record_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    produced = True
+                    yield chunk.choices[0].delta.content
+        except Exception:
+            self.router.record(model, False, time.perf_counter() - started)
+            raise
+        self.router.record(model, produced, time.perf_counter() - started)
+
+    async def _pattern_summaries(self, user_query: str, user_id: str) -> Optional[str]:
+        """
+        Rolling summaries for a pattern question ("what am I avoiding?"), or None
+        to take the retrieval path - not a pattern question, no summary yet, or
+        the summaries couldn't be read.
+        """
+        if not settings.rolling_summaries or not is_pattern_query(user_query):
+            return None
+        try:
+            summaries = self.summaries.format_summaries(await self.summaries.get_summaries(user_id))
+        except Exception as e:
+            print(f"Error reading rolling summaries, falling back to retrieval: {e}")
+            return None
+        if summaries is None:
+            print(f"No rolling summary for {user_id} yet, falling back to retrieval")
+        return summaries
+
+    def _summary_sources(self, summaries: str) -> dict:
+        return {"sources": {"summaries": {"status": "ok"}}, "context": {"tokens": count_tokens(summaries)}}
+
+    async def _retrieve(self, analysis: QueryAnalysis, user_id: str) -> tuple[list, list[str], dict]:
+        """
+        Hit Supabase and the semantic source(s) at the same time, each under its own timeout.
+
+        `semantic_retrieval` picks Supermemory, the local vector index, or both.
+        A slow or failing source is dropped rather than failing the answer; the
+        returned `sources` dict records what each one contributed.
+        """
+        retrievers = {"supabase": (self._query_supabase(analysis, user_id), settings.supabase_retrieval_timeout)}
+        if settings.semantic_retrieval in ("supermemory", "both"):
+            retrievers["supermemory"] = (self._query_supermemory(analysis, user_id), settings.supermemory_retrieval_timeout)
+        if settings.semantic_retrieval in ("local", "both"):
+            retrievers["vector_index"] = (self._query_vector_index(analysis, user_id), settings.vector_retrieval_timeout)
+
+        outcomes = await asyncio.gather(
+            *(asyncio.wait_for(retrieve, timeout) for retrieve, timeout in retrievers.values()),
+            return_exceptions=True
+        )
+
+        sources, results = {}, {}
+        for name, outcome in zip(retrievers, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                sources[name] = {"status": "timeout"}
+                print(f"Retrieval from {name} skipped: timed out")
+            elif isinstance(outcome, Exception):
+                # sources goes out in the API response - the message (queries, hosts, keys) only goes to the log
+                sources[name] = {"status": "error", "error": type(outcome).__name__}
+                print(f"Retrieval from {name} skipped: {type(outcome).__name__}: {outcome}")
+            else:
+                sources[name] = {"status": "ok", "count": len(outcome)}
+                results[name] = outcome
+
+        supabase_notes = results.get("supabase", [])
+        # Both semantic sources can surface the same note - keep the first copy
+        memories = list(dict.fromkeys(results.get("supermemory", []) + results.get("vector_index", [])))
+        return supabase_notes, memories, sources
+
+    def _pack_context(self, analysis: QueryAnalysis, notes: list[dict], memories: list[str]) -> PackedContext:
+        """Keep only the most relevant, non-duplicate context that fits the synthesis token budget"""
+        context = pack_context(
+            analysis.semantic_query,
+            notes,
+            memories,
+            settings.synthesis_context_tokens,
+            half_life_days=settings.context_recency_half_life_days,
+            recency_weight=settings.context_recency_weight
+        )
+        print(f"Packed synthesis context: {context.stats()}")
+        return context
+
+    async def _analyze_query(self, user_query: str) -> QueryAnalysis:
+        """Use LLM to extract structured information from the query"""
 
-            return response.choices[0].message.parsed
+        try:
+            return await self.analyzer.analyze(user_query)
         except Exception as e:
             print(f"Exception caught while analyzing query {e}")
             raise
 
-    def _query_supabase(self, analysis: QueryAnalysis):
-        """Query Supabase with structured filters"""
-        try:
-            voice_service = VoiceService()
-            return voice_service.repository.search_notes_by_metadata(analysis.relevant_intents)
-        except Exception as e:
-            print(f"Error reading data from Supabase: {e}")
-            return []  # Return empty list instead of None
+    async def _query_supabase(self, analysis: QueryAnalysis, user_id: str):
+        """Query Supabase with structured filters. Errors propagate so _retrieve can report them."""
+        # Newest candidates only - the packer can't use more than a budget's worth anyway
+        return await asyncio.to_thread(
+            self.repository.search_notes_by_metadata,
+            user_id,
+            analysis.relevant_intents,
+            settings.context_candidate_limit,
+            analysis.temporal_range_start,
+            analysis.temporal_range_end
+        )
 
-    async def _query_supermemory(self, analysis: QueryAnalysis, user_id: str):
+    async def _query_supermemory(self, analysis: QueryAnalysis, user_id: str) -> list[str]:
         """Query Supermemory with semantic search"""
-        return await self.supermemory.query_memory(user_id, analysis.semantic_query)
+        return await self.supermemory.semantic_search(user_id, analysis.semantic_query)
+
+    async def _query_vector_index(self, analysis: QueryAnalysis, user_id: str) -> list[str]:
+        """Query the local vector index with the same semantic query"""
+        return await self.vectors.semantic_search(user_id, analysis.semantic_query)
        
-    def _synthesize_answer(self, user_query: str, supabase_results: list, supermemory_results: str) -> str:
+    async def _synthesize_answer(self, user_query: str, context: PackedContext) -> str:
+        return await self._complete(prompt.SYNTHESIS, self._build_synthesis_prompt(user_query, context))
+
+    async def _complete(self, template: prompt.PromptTemplate, messages: list[dict]) -> str:
+        async def call(model: str) -> Optional[str]:
+            response = await self.llm.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.5
+            )
+            template.record_usage(response.usage)
+            return response.choices[0].message.content
+
+        return await self.router.run("synthesis", call, accept=lambda answer: bool(answer and answer.strip()))
+
+    def _build_synthesis_prompt(self, user_query: str, context: PackedContext) -> list[dict]:
         # Build context from both sources
         supabase_context = "\n".join([
             f"- {item['title']}: {item['formatted_content']}"
-            for item in supabase_results
+            for item in context.notes
         ])
 
-        # Create synthesis prompt
-        synthesis_prompt = f"""You are a helpful AI assistant analyzing a user's notes.
-
-User asked: "{user_query}"
-
-Structured notes from database:
-{supabase_context}
-
-Contextual memories:
-{supermemory_results}
-
-Based on both sources above, provide a clear, concise answer to the user's question.
-- Combine information from both sources
-- Deduplicate if the same item appears in both
-- Use natural, conversational language
-- If it's a task/reminder query, format as a numbered list
-"""
-
-        # Call LLM
-        response = self.llm.chat.completions.create(
-            model="gpt-4o-mini",  # Cheaper model for synthesis
-            messages=[{"role": "user", "content": synthesis_prompt}],
-            temperature=0.5
-        )
+        if context.memories:
+            supermemory_results = "Relevant memories about the user:\n" + "\n".join(context.memories)
+        else:
+            supermemory_results = "No relevant memories found."
 
-        return response.choices[0].message.content
\ No newline at end of file
+        return prompt.SYNTHESIS.messages(user_query=user_query, notes=supabase_context, memories=supermemory_results)
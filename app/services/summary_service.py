@@ -0,0 +1,193 @@
+import asyncio
+import sys
+import weakref
+from typing import Optional
+
+from app.core.clients import ClientRegistry
+from app.core.config import settings
+from app.repositories.summary_repository import SummaryRepository
+from app.repositories.voice_repository import VoiceRepository
+from app.services.model_router import get_model_router
+from app.services.query_rules import INTENT_LABELS
+from app.utilities import prompt
+
+OVERALL = "overall"
+
+# One fold at a time per user in this process; other workers are caught by the version check
+_user_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _user_lock(user_id: str) -> asyncio.Lock:
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = _user_locks[user_id] = asyncio.Lock()
+    return lock
+
+
+def _scopes(notes: list[dict]) -> dict[str, list[dict]]:
+    """Every scope the notes touch - overall plus one per intent"""
+    scopes = {OVERALL: notes}
+    for note in notes:
+        scopes.setdefault(note.get("intent") or "note", []).append(note)
+    return scopes
+
+
+def _note_line(note: dict, repeated: bool) -> str:
+    # Saved rows (formatted_content) and freshly extracted items (formattedText) both come through here
+    text = note.get("formatted_content") or note.get("formattedText") or ""
+    return f"- [{note.get('intent') or 'note'}] {note.get('title')}: {text}{' (mentioned again)' if repeated else ''}"
+
+
+class SummaryService:
+    """
+    Per-user rolling summaries, one overall and one per intent.
+
+    Each ingest folds only the new notes into the previous summary, so the
+    cost of keeping them current doesn't grow with the user's history, and a
+    pattern question reads a few short rows instead of every note.
+    """
+
+    def __init__(self, clients: ClientRegistry):
+        self.llm = clients.openai
+        self.repository = SummaryRepository(clients.supabase)
+        self.notes = VoiceRepository(clients.supabase)
+        self.router = get_model_router()
+
+    async def get_summaries(self, user_id: str) -> dict[str, dict]:
+        return await asyncio.to_thread(self.repository.get_summaries, user_id)
+
+    async def fold_notes(self, user_id: str, notes: list[dict], repeated: bool = False) -> list[str]:
+        """Fold new (or, with `repeated`, re-recorded) notes into every scope they touch. Returns the scopes updated."""
+        if not notes:
+            return []
+        scopes = _scopes(notes)
+
+        async with _user_lock(user_id):
+            current = await self.get_summaries(user_id)
+            await asyncio.gather(*(
+                self._fold_scope(user_id, scope, scope_notes, repeated, current.get(scope))
+                for scope, scope_notes in scopes.items()
+            ))
+        return list(scopes)
+
+    async def _fold_scope(self, user_id: str, scope: str, notes: list[dict], repeated: bool, current: Optional[dict]):
+        new_notes = "\n".join(_note_line(note, repeated) for note in notes)
+        for attempt in range(settings.summary_fold_retries):
+            if attempt:
+                current = (await self.get_summaries(user_id)).get(scope)
+            previous, item_count, version = (
+                (current["summary"], current["item_count"], current["version"]) if current else ("", 0, 0)
+            )
+            summary = await self._fold(scope, previous, new_notes)
+            saved = await asyncio.to_thread(
+                self.repository.save_summary, user_id, scope, summary, item_count + len(notes), version
+            )
+            if saved:
+                return
+            print(f"Summary {scope} for {user_id} changed while folding - retrying")
+        print(f"Gave up folding {len(notes)} notes into the {scope} summary for {user_id}")
+
+    async def _fold(self, scope: str, previous: str, new_notes: str) -> str:
+        label = "all notes" if scope == OVERALL else INTENT_LABELS.get(scope, scope)
+        messages = prompt.FOLD_SUMMARY.messages(
+            scope=label,
+            max_words=settings.summary_max_words,
+            previous_summary=previous or "(empty - these are the first notes)",
+            new_notes=new_notes
+        )
+
+        async def call(model: str) -> str:
+            response = await self.llm.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.2,
+                max_tokens=settings.summary_max_words * 2
+            )
+            prompt.FOLD_SUMMARY.record_usage(response.usage)
+            return (response.choices[0].message.content or "").strip()
+
+        summary = await self.router.run("summary_fold", call, accept=bool)
+        if not summary:
+            # Keep what we had rather than wiping the summary with an empty fold
+            raise ValueError(f"Empty {scope} summary from the model")
+        return summary
+
+    def format_summaries(self, summaries: dict[str, dict]) -> Optional[str]:
+        """Summaries as prompt context, overall first. None until the user has one."""
+        if not summaries.get(OVERALL, {}).get("summary"):
+            return None
+        ordered = [OVERALL] + sorted(scope for scope in summaries if scope != OVERALL)
+        return "\n\n".join(
+            f"{'Overall' if scope == OVERALL else INTENT_LABELS.get(scope, scope).capitalize()} "
+            f"({summaries[scope]['item_count']} notes):\n{summaries[scope]['summary']}"
+            for scope in ordered
+            if summaries[scope]["summary"]
+        )
+
+    async def rebuild(self, user_id: str, batch_size: int = 25) -> int:
+        """
+        Recompute a user's summaries from their saved notes, oldest first (for users who predate them).
+
+        The new summaries are folded in memory and only swapped in at the end, so a
+        failure part way leaves the old ones in place. Notes saved while this ran
+        are folded in before the swap, and each scope is written with the same
+        version check as an ingest - losing it to a concurrent fold re-reads and retries.
+        """
+        notes = await asyncio.to_thread(self.notes.get_all_notes, user_id)
+        notes.sort(key=lambda note: note.get("uploaded_at") or "")
+        rebuilt = await self._refold(notes, batch_size)
+
+        async with _user_lock(user_id):
+            for _ in range(settings.summary_fold_retries):
+                seen = {note["id"] for note in notes}
+                latest = await asyncio.to_thread(self.notes.get_all_notes, user_id)
+                saved_since = sorted((note for note in latest if note["id"] not in seen), key=lambda note: note.get("uploaded_at") or "")
+                if saved_since:
+                    rebuilt = await self._refold(saved_since, batch_size, rebuilt)
+                    notes += saved_since
+
+                current = await self.get_summaries(user_id)
+                saved = await asyncio.gather(*(
+                    asyncio.to_thread(
+                        self.repository.save_summary, user_id, scope, rebuilt[scope]["summary"],
+                        rebuilt[scope]["item_count"], current.get(scope, {}).get("version", 0)
+                    )
+                    for scope in rebuilt
+                ))
+                if all(saved):
+                    # Scopes whose notes are all gone
+                    stale = [scope for scope in current if scope not in rebuilt]
+                    if stale:
+                        await asyncio.to_thread(self.repository.delete_summaries, user_id, stale)
+                    return len(notes)
+                print(f"Summaries for {user_id} changed while rebuilding - retrying the swap")
+        raise RuntimeError(f"Gave up swapping in rebuilt summaries for {user_id}")
+
+    async def _refold(self, notes: list[dict], batch_size: int, summaries: Optional[dict[str, dict]] = None) -> dict[str, dict]:
+        """Fold notes batch by batch into {scope: {summary, item_count}} without touching the stored rows"""
+        summaries = dict(summaries or {})
+        for start in range(0, len(notes), batch_size):
+            scopes = _scopes(notes[start:start + batch_size])
+            folded = await asyncio.gather(*(
+                self._fold(scope, summaries.get(scope, {}).get("summary", ""), "\n".join(_note_line(note, False) for note in scope_notes))
+                for scope, scope_notes in scopes.items()
+            ))
+            for (scope, scope_notes), summary in zip(scopes.items(), folded):
+                summaries[scope] = {"summary": summary, "item_count": summaries.get(scope, {}).get("item_count", 0) + len(scope_notes)}
+        return summaries
+
+if __name__ == "__main__":
+    # python -m app.services.summary_service <user_id>
+    from app.core import clients
+
+    async def main(user_id: str):
+        clients.registry = clients.ClientRegistry()
+        try:
+            folded = await SummaryService(clients.registry).rebuild(user_id)
+            print(f"Folded {folded} notes into summaries for {user_id}")
+        finally:
+            await clients.registry.aclose()
+
+    if len(sys.argv) != 2:
+        sys.exit("usage: python -m app.services.summary_service <user_id>")
+    asyncio.run(main(sys.argv[1]))
@@ -1,18 +1,96 @@
-from typing import Literal, Optional
-from supermemory import Supermemory
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Literal, Optional
+from app.core.cache import PersistentCache, get_cache
+from app.core.clients import ClientRegistry
 from app.core.config import settings
 import json
 
 from app.models.response import QueryAnalysis
+from app.services.query_analyzer import QueryAnalyzer
+from app.services.model_router import get_model_router
 from datetime import datetime, timezone
-from openai import OpenAI
 
-from app.utilities.prompt import systhesize
+from app.utilities.pagination import DEFAULT_MEMORY_FIELDS, MEMORY_FIELDS, decode_cursor, encode_cursor, page, parse_fields
+from app.utilities.prompt import SYSTHESIZE
+
+
+class MemorySearchCache:
+    """
+    In-process LRU of Supermemory search results, keyed per user on
+    (operation, query, filters, limit).
+
+    Every entry remembers the user's write version at the time it was stored;
+    add_document / add_note_memory replace that version, so a user's next search
+    after a write always goes to Supermemory while other users keep their hits.
+    The versions live in the shared PersistentCache, so a write handled by one
+    uvicorn worker invalidates every worker's entries, not just its own. The TTL
+    only covers memories Supermemory finishes indexing after the write.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, versions: PersistentCache):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.versions = versions
+        self._entries: OrderedDict[tuple, tuple[Optional[str], float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, user_id: str, operation: str, query: Optional[str], filters: Optional[dict], limit: int) -> tuple:
+        return (user_id, operation, query, json.dumps(filters, sort_keys=True) if filters else None, limit)
+
+    async def get(self, user_id: str, operation: str, query: Optional[str], filters: Optional[dict], limit: int):
+        key = self._key(user_id, operation, query, filters, limit)
+        entry = self._entries.get(key)
+        if entry is not None:
+            version, stored_at, value = entry
+            if time.monotonic() - stored_at < self.ttl and version == await self.version(user_id):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self._entries.pop(key, None)
+        self.misses += 1
+        return None
+
+    async def version(self, user_id: str) -> Optional[str]:
+        return await asyncio.to_thread(self.versions.get, "memory_search_version", user_id)
+
+    def set(self, user_id: str, operation: str, query: Optional[str], filters: Optional[dict], limit: int, value, version: Optional[str]):
+        """`version` is the user's version from before the search started, so a write that lands mid-search wins"""
+        key = self._key(user_id, operation, query, filters, limit)
+        self._entries[key] = (version, time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, user_id: str):
+        """Give the user a new version - their cached searches, in every worker, are dropped lazily on next lookup"""
+        # A fresh token rather than a counter: two workers writing at once can't land on the same value again
+        await asyncio.to_thread(
+            self.versions.set, "memory_search_version", user_id, uuid.uuid4().hex, max(self.ttl * 10, 24 * 3600)
+        )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries)
+        }
+
+
+search_cache = MemorySearchCache(settings.memory_search_cache_size, settings.memory_search_cache_ttl, get_cache())
 
 
 class SupermemoryService:
-    def __init__(self) -> None:
-        self.client = Supermemory(api_key=settings.supermemory_api_key)
+    def __init__(self, clients: ClientRegistry) -> None:
+        self.client = clients.supermemory
+        self.llm = clients.openai
+        self.analyzer = QueryAnalyzer(clients)
+        self.router = get_model_router()
 
     async def add_note_memory(self, note_data: dict, user_id: str):
         """Add new document to user's memory (Supermemory will create memories from it)"""
@@ -35,10 +113,15 @@ class SupermemoryService:
 
         # Now call the API
         try:
-            response = self.client.documents.add(**payload)
+            response = await self.client.documents.add(**payload)
             print(f"Document added to Supermemory: {response}")
+            return response
         except Exception as e:
             print(f"Error adding document: {e}")
+            raise Exception(f"Failed to add document: {e}")
+        finally:
+            # Even a failed add may have landed upstream
+            await search_cache.invalidate(user_id)
 
     
     async def add_document(self, extracted_item: dict, user_id: str):
@@ -67,19 +150,56 @@ class SupermemoryService:
         }
         # Now call the API
         try:
-            response = self.client.documents.add(**payload)
+            response = await self.client.documents.add(**payload)
             print(f"Document added to Supermemory: {json.dumps(str(response), indent=4)}")
             return response
         except Exception as e:
             print(f"Error adding document: {e}")
             raise Exception(f"Failed to add document: {e}")
+        finally:
+            await search_cache.invalidate(user_id)
+
+    async def add_note_memories(self, notes: list[dict], user_id: str) -> dict:
+        """Push saved notes concurrently. See _fan_out for the result shape."""
+        return await self._fan_out(notes, lambda note: self.add_note_memory(note, user_id))
+
+    async def add_documents(self, extracted_items: list[dict], user_id: str) -> dict:
+        """Push extracted items concurrently. See _fan_out for the result shape."""
+        return await self._fan_out(extracted_items, lambda item: self.add_document(item, user_id))
+
+    async def _fan_out(self, items: list, write: Callable[[object], Awaitable]) -> dict:
+        """
+        Run one write per item, at most `supermemory_concurrency` at a time.
+
+        A failed item doesn't abort the others; returns
+        {"results": [response per successful item, in order], "errors": [{"index", "error"}]}
+        """
+        semaphore = asyncio.Semaphore(settings.supermemory_concurrency)
+
+        async def run(item):
+            async with semaphore:
+                return await write(item)
+
+        outcomes = await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+
+        results, errors = [], []
+        for index, outcome in enumerate(outcomes):
+            if isinstance(outcome, Exception):
+                errors.append({"index": index, "error": str(outcome)})
+            else:
+                results.append(outcome)
+        return {"results": results, "errors": errors}
             
 
     async def query_memory(self, user_id: str, question: str, limit:int):
 
         print(f"the question is {question}")
+        cached = await search_cache.get(user_id, "query_memory", question, None, limit)
+        if cached is not None:
+            return cached
+        version = await search_cache.version(user_id)
         try:
-            results = self.client.search.memories(
+            results = await self.client.search.memories(
                 q=question,
                 container_tag=f"{user_id}",
                 limit=limit
@@ -91,8 +211,11 @@ class SupermemoryService:
                 context = "\n".join([r.memory for r in results.results])
 
                 print(f"context is {context}")
-                return f"Relevant memories about the user:\n{context}"
-            return "No relevant memories found."
+                answer = f"Relevant memories about the user:\n{context}"
+            else:
+                answer = "No relevant memories found."
+            search_cache.set(user_id, "query_memory", question, None, limit, answer, version)
+            return answer
         except Exception as e:
             return f"Error searching memories: {e}"
 
@@ -110,7 +233,7 @@ class SupermemoryService:
         """
 
         # Step 1: Analyze query to extract relevant intents
-        query_analysis = self._analyze_query(question)
+        query_analysis = await self._analyze_query(question)
 
         print(f"Query analysis - relevant intents: {query_analysis.relevant_intents}")
         print(f"Query analysis - temporal range: {query_analysis.temporal_range_start} to {query_analysis.temporal_range_end}")
@@ -151,25 +274,31 @@ class SupermemoryService:
                             end_condition
                 ]}
 
-            latest_context = self.check_user_memories(user_id, filter, limit)
+            cached = await search_cache.get(user_id, "two_phase", None, filter, limit)
+            if cached is not None:
+                return cached
+            version = await search_cache.version(user_id)
 
-            print(f"latest memory is {latest_context}")
+            # One pass: each memory becomes a result as its page arrives, and no page past `limit` is fetched
             results = []
-            for memory in latest_context:
+            async for memory in self.iter_memories(user_id, filter, max_items=limit):
+                metadata = memory.metadata if isinstance(memory.metadata, dict) else {}
                 results.append({
                     "text": memory.summary,  # or memory.title?
-                    "intent": memory.metadata.get('intent'),
-                    "tags": memory.metadata.get('tags', []),
-                    "timestamp": memory.metadata.get('scheduled_for'),
+                    "intent": metadata.get('intent'),
+                    "tags": metadata.get('tags', []),
+                    "timestamp": metadata.get('scheduled_for'),
                     "status": "retrieved"
                 })
 
+            print(f"Retrieved {len(results)} recent memories")
+            search_cache.set(user_id, "two_phase", None, filter, limit, results, version)
             return results      
         else:
             
 
             print(f"Semantic Search")
-            semantic_context = self.semantic_search(user_id, question)
+            semantic_context = await self.semantic_search(user_id, question)
             results = []
             for memory_text in semantic_context:  # semantic_context is already a list of strings
                 results.append({
@@ -195,23 +324,49 @@ class SupermemoryService:
         # )
 
         # return response.choices[0].message.content
-        
 
-    def _analyze_query(self, user_query: str) -> QueryAnalysis:
-        """Analyze query to extract relevant intents (copied from QueryService to avoid circular import)"""
-        from app.utilities import prompt
-
-        llm = OpenAI(api_key=settings.openai_api_key)
-        query_prompt = prompt.analyze_query_prompt(user_query)
+    async def stream_two_phrase_search(self, user_id: str, question: str, limit: int = 10) -> AsyncIterator[tuple[str, object]]:
+        """
+        two_phrase_search plus the Phase 3 synthesis, as (event, data) pairs for SSE:
+        "sources" with the retrieved memories first, a "token" per delta, then "done".
+        """
+        try:
+            results = await self.two_phrase_search(user_id, question, limit)
+            yield "sources", {"results": results}
+
+            recent_context = "\n".join(f"- {r['text']}" for r in results if r["timestamp"] is not None)
+            semantic_context = "\n".join(f"- {r['text']}" for r in results if r["timestamp"] is None)
+            model = self.router.choose("synthesis")
+            started = time.perf_counter()
+            answer = []
+            try:
+                stream = await self.llm.chat.completions.create(
+                    model=model,
+                    messages=SYSTHESIZE.messages(question=question, recent_context=recent_context, semantic_context=semantic_context),
+                    temperature=0.6,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                async for chunk in stream:
+                    SYSTHESIZE.record_usage(chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        answer.append(chunk.choices[0].delta.content)
+                        yield "token", {"text": chunk.choices[0].delta.content}
+            except Exception:
+                self.router.record(model, False, time.perf_counter() - started)
+                raise
+            self.router.record(model, bool(answer), time.perf_counter() - started)
+
+            yield "done", {"answer": "".join(answer)}
+        except Exception as e:
+            print(f"Error streaming search answer: {e}")
+            yield "error", {"error": "failed to answer"}
+        
 
+    async def _analyze_query(self, user_query: str) -> QueryAnalysis:
+        """Analyze query to extract relevant intents (cached, see QueryAnalyzer)"""
         try:
-            response = llm.beta.chat.completions.parse(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": query_prompt}],
-                response_format=QueryAnalysis,
-                temperature=0.3
-            )
-            return response.choices[0].message.parsed
+            return await self.analyzer.analyze(user_query)
         except Exception as e:
             print(f"Exception caught while analyzing query: {e}")
             # Return default analysis if parsing fails
@@ -222,46 +377,86 @@ class SupermemoryService:
                 requires_synthesis=True
             )
 
-    def check_user_memories(self, user_id: str, filters: dict, limit: int = 10):
+    async def iter_memories(self, user_id: str, filters: Optional[dict] = None, max_items: Optional[int] = None, page_size: int = settings.supermemory_page_size) -> AsyncIterator:
+        """
+        Yield the user's memories one at a time, fetching pages from Supermemory only as they're consumed.
 
+        Stops after `max_items`, when the caller stops iterating, or at the last
+        page - whichever comes first. Page size shrinks to `max_items` so a small
+        request is a single small call.
+        """
+        params = {"container_tags": [f"{user_id}"]}
+        if filters:
+            # IMPORTANT: Supermemory requires filters as JSON string
+            params["filters"] = json.dumps(filters)
+        if max_items is not None:
+            page_size = min(page_size, max_items)
+
+        yielded = 0
+        page_number = 1
+        while True:
+            memory_list = await self.client.memories.list(**params, limit=page_size, page=page_number)
+            for memory in memory_list.memories:
+                yield memory
+                yielded += 1
+                if max_items is not None and yielded >= max_items:
+                    return
+            if not memory_list.memories or page_number >= memory_list.pagination.total_pages:
+                return
+            page_number += 1
+
+    async def check_user_memories(self, user_id: str, filters: Optional[dict] = None, limit: int = 10):
+        """Up to `limit` memories matching `filters` (a complete filter dict like {"OR": [...]} or {"AND": [...]})"""
+
+        cached = await search_cache.get(user_id, "list", None, filters, limit)
+        if cached is not None:
+            return cached
+        version = await search_cache.version(user_id)
         try:
-            # Filters should be a complete filter dict like {"OR": [...]} or {"AND": [...]}
-            if not filters:
-                print("No filters provided, fetching all memories")
-                memory_list = self.client.memories.list(
-                    container_tags=[f"{user_id}"],
-                    limit=limit * 3
-                )
-            else:
-                
-                # IMPORTANT: Supermemory requires filters as JSON string
-                filter_json = json.dumps(filters)
-                print(f"Using filters: {filter_json}")
-                memory_list = self.client.memories.list(
-                    container_tags=[f"{user_id}"],
-                    filters=filter_json,
-                    limit=limit * 3
-                )
+            print(f"Using filters: {json.dumps(filters)}" if filters else "No filters provided, fetching all memories")
+            memories = [memory async for memory in self.iter_memories(user_id, filters, max_items=limit)]
+            print(f"Found {len(memories)} memories")
 
-            print(f"Found {len(memory_list.memories)} memories")
-
-            # Debug: Check if any memories have scheduled_for
-            if len(memory_list.memories) > 0:
-                memories_with_scheduled = [
-                    m for m in memory_list.memories
-                    if hasattr(m, 'metadata') and m.metadata and 'scheduled_for' in m.metadata
-                ]
-                print(f"DEBUG: {len(memories_with_scheduled)} memories have scheduled_for field")
-
-                return memory_list.memories
-
-            return [];
+            search_cache.set(user_id, "list", None, filters, limit, memories, version)
+            return memories
         except Exception as error:
             print(f'Error: {error}')
 
-    def semantic_search(self, user_id:str, question:str):
+    async def list_memories(self, user_id: str, limit: int, fields: Optional[str] = None, cursor: Optional[str] = None) -> dict:
+        """
+        A page of the user's memories, newest first: {"items", "next_cursor"}.
+
+        Supermemory paginates by page number, so the cursor wraps that rather
+        than a keyset. Content is only requested when `fields` asks for it.
+        """
+        selected = parse_fields(fields, MEMORY_FIELDS, DEFAULT_MEMORY_FIELDS, required=("id",))
+        position = decode_cursor(cursor, ("p",))
+        page_number = int(position["p"]) if position else 1
+
+        memory_list = await self.client.memories.list(
+            container_tags=[f"{user_id}"],
+            limit=limit,
+            page=page_number,
+            sort="createdAt",
+            order="desc",
+            include_content="content" in selected
+        )
+        items = [
+            {field: value for field, value in memory.model_dump(by_alias=True).items() if field in selected}
+            for memory in memory_list.memories
+        ]
+        has_more = memory_list.pagination.current_page < memory_list.pagination.total_pages
+        return page(items, encode_cursor({"p": page_number + 1}) if has_more else None)
+
+    async def semantic_search(self, user_id:str, question:str):
         # Phase 2: Semantic search (long-term patterns)
-        semantic = self.client.search.memories(
+        cached = await search_cache.get(user_id, "semantic", question, None, 5)
+        if cached is not None:
+            print(f"Semantic search cache hit for '{question}'")
+            return cached
+        version = await search_cache.version(user_id)
+
+        semantic = await self.client.search.memories(
             q=question,
             container_tag=f"{user_id}",
             limit=5
@@ -271,5 +466,6 @@ class SupermemoryService:
         semantic_context = [r.memory for r in semantic.results] if semantic.results else []
 
         print(f"Semantic response is {semantic_context}")
+        search_cache.set(user_id, "semantic", question, None, 5, semantic_context, version)
         return semantic_context
 
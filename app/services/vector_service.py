@@ -0,0 +1,79 @@
+import asyncio
+import hashlib
+import sys
+
+import numpy as np
+
+from app.core.cache import get_cache
+from app.core.clients import ClientRegistry
+from app.core.config import settings
+from app.core.vector_index import get_vector_index
+from app.repositories.voice_repository import VoiceRepository
+from app.services.embeddings import get_embedding_provider
+
+
+class VectorService:
+    """Local semantic search over a user's notes - the in-process counterpart to SupermemoryService.semantic_search"""
+
+    def __init__(self, clients: ClientRegistry):
+        self.provider = get_embedding_provider(clients)
+        self.index = get_vector_index()
+        self.repository = VoiceRepository(clients.supabase)
+        self.cache = get_cache()
+
+    async def add_notes(self, notes: list[dict], user_id: str) -> int:
+        """Embed saved notes (rows from create_notes_with_metadata) and append them to the user's index"""
+        if not notes:
+            return 0
+        rows = [
+            {"id": note["id"], "title": note["title"], "text": note["formatted_content"]}
+            for note in notes
+        ]
+        vectors = await self.provider.embed([f"{row['title']}\n{row['text']}" for row in rows])
+        return await asyncio.to_thread(self.index.add, self.provider.name, user_id, vectors, rows)
+
+    async def search(self, user_id: str, question: str, k: int = settings.vector_search_k) -> list[dict]:
+        """Top-k notes for the question as {"id", "title", "text", "score"}"""
+        query_vector = await self._embed_query(question)
+        results = await asyncio.to_thread(self.index.search, self.provider.name, user_id, query_vector, k)
+        return results[0]
+
+    async def semantic_search(self, user_id: str, question: str, k: int = settings.vector_search_k) -> list[str]:
+        """Same shape as SupermemoryService.semantic_search, so either can feed a prompt"""
+        return [f"{hit['title']}: {hit['text']}" for hit in await self.search(user_id, question, k)]
+
+    async def _embed_query(self, question: str) -> np.ndarray:
+        # Repeated questions shouldn't pay an embedding round trip each time
+        key = f"{self.provider.name}:{hashlib.sha256(question.encode()).hexdigest()}"
+        cached = await asyncio.to_thread(self.cache.get, "query_embedding", key)
+        if cached is not None:
+            return np.asarray([cached], dtype=np.float32)
+
+        vectors = await self.provider.embed([question])
+        await asyncio.to_thread(self.cache.set, "query_embedding", key, vectors[0].tolist(), settings.query_analysis_cache_ttl)
+        return vectors
+
+    async def backfill(self, user_id: str) -> int:
+        """Index every note already in Supabase (re-running only adds what's missing)"""
+        notes = await asyncio.to_thread(self.repository.get_all_notes, user_id)
+        added = 0
+        for start in range(0, len(notes), 256):
+            added += await self.add_notes(notes[start:start + 256], user_id)
+        return added
+
+
+if __name__ == "__main__":
+    # python -m app.services.vector_service <user_id>
+    from app.core import clients
+
+    async def main(user_id: str):
+        clients.registry = clients.ClientRegistry()
+        try:
+            added = await VectorService(clients.registry).backfill(user_id)
+            print(f"Indexed {added} notes for {user_id}")
+        finally:
+            await clients.registry.aclose()
+
+    if len(sys.argv) != 2:
+        sys.exit("usage: python -m app.services.vector_service <user_id>")
+    asyncio.run(main(sys.argv[1]))
@@ -1,25 +1,66 @@
-from datetime import datetime
+import asyncio
+from datetime import datetime, timezone
+import hashlib
 import os
+import re
+import weakref
+from typing import Awaitable, Callable, Optional
 
 from fastapi import HTTPException
-import supermemory
+from app.core.cache import get_cache
+from app.core.clients import ClientRegistry
 from app.core.config import settings
-from app.core.supabase_client import get_supabase
 from app.repositories.voice_repository import VoiceRepository
-from openai import OpenAI
-from io import BytesIO
+from pathlib import Path
 
 from app.models.response import NoteMetadata
 from app.utilities import prompt
+from app.services.duplicate_detector import DuplicateMatch, get_duplicate_detector
+from app.services.model_router import AUDIO_BYTES_PER_SECOND, get_model_router
+from app.services.summary_service import SummaryService
 from app.services.supermemory_service import SupermemoryService
+from app.services.vector_service import VectorService
+from app.utilities.audio_buffer import AudioBuffer
+from app.utilities import audio_chunker
+from app.utilities.pagination import DEFAULT_NOTE_FIELDS, NOTE_FIELDS, decode_cursor, encode_cursor, page, parse_fields
+from app.utilities.tokens import count_tokens
+
+WHISPER_MAX_FILE_SIZE = 25 * 1024 * 1024  # 25MB (Whisper API limit)
+
+# One ingest at a time per recording (user + audio hash) in this process
+_ingest_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _ingest_lock(key: str) -> asyncio.Lock:
+    lock = _ingest_locks.get(key)
+    if lock is None:
+        lock = _ingest_locks[key] = asyncio.Lock()
+    return lock
+
+
+def max_audio_size() -> int:
+    """Largest upload worth reading: past Whisper's limit only when it can be transcribed in chunks"""
+    return settings.max_upload_size if audio_chunker.chunking_available() else min(settings.max_upload_size, WHISPER_MAX_FILE_SIZE)
+
+
+# Sentence ends and joining words - how many separate things a recording probably holds
+COMPOUND_MARKERS = re.compile(r"[.!?;]\s|\b(and then|also|plus|another thing|oh and)\b", re.IGNORECASE)
+
+
+def _usable_extraction(parsed: Optional[NoteMetadata]) -> bool:
+    # A refusal, no items, or an item with nothing to show is worth a retry on the stronger model
+    return parsed is not None and bool(parsed.items) and all(item.title.strip() and item.formattedText.strip() for item in parsed.items)
 
-MAX_FILE_SIZE = 25 * 1024 * 1024  # 25MB (Whisper API limit)
 class VoiceService:
-    def __init__(self):
-        supabase = get_supabase() 
-        self.client = OpenAI(api_key=settings.openai_api_key)
-        self.repository = VoiceRepository(supabase)
-        self.superMemoryService = SupermemoryService()
+    def __init__(self, clients: ClientRegistry):
+        self.client = clients.openai
+        self.repository = VoiceRepository(clients.supabase)
+        self.superMemoryService = SupermemoryService(clients)
+        self.vectorService = VectorService(clients)
+        self.summaries = SummaryService(clients)
+        self.cache = get_cache()
+        self.duplicates = get_duplicate_detector()
+        self.router = get_model_router()
 
     def timestamp_filename(self, file:str) -> str :
         name = file.replace(" ", "_")
@@ -27,22 +68,82 @@ class VoiceService:
         ext = os.path.splitext(name)[1].lower()
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         return f"{name_without_ext}_{timestamp}{ext}"
+
+    def content_filename(self, file: str, content_hash: str, user_id: str) -> str:
+        """Storage name derived from the audio itself, so re-uploads land on the same object - under the user's folder"""
+        ext = os.path.splitext(file)[1].lower()
+        return f"{user_id}/{content_hash}{ext}"
     
-    async def upload_and_create(self, filename: str, content: bytes) -> dict:
-        file_size = len(content)
+    async def upload_and_create(self, filename: str, audio: AudioBuffer, user_id: str, on_stage: Optional[Callable[[str], Awaitable[None]]] = None) -> dict:
+        """Run the full ingestion pipeline. `on_stage` is awaited as each stage finishes (see JOB_STAGES)."""
+        file_size = audio.size
+
+        # Long recordings get split and transcribed in pieces, so only the single-call path has a ceiling
+        if file_size > WHISPER_MAX_FILE_SIZE and not audio_chunker.chunking_available():
+            raise ValueError(f"File too large: {file_size / 1024 / 1024:.2f}MB (max: {WHISPER_MAX_FILE_SIZE / 1024 / 1024}MB)")  
+
+        async def report(stage: str, result=None):
+            if on_stage:
+                await on_stage(stage)
+            return result
 
-        if file_size > MAX_FILE_SIZE:
-            raise ValueError(f"File too large: {file_size / 1024 / 1024:.2f}MB (max: {MAX_FILE_SIZE / 1024 / 1024}MB)")  
+        # Same recording -> same name, so a flaky-network re-upload reuses the stored object
+        unique_name = self.content_filename(filename, audio.content_hash, user_id)
+        transcript_key = f"{user_id}:{audio.content_hash}"
 
+        # The very same audio again (a retried upload) returns what the first one saved - no
+        # transcription, insert or Supermemory push. A retry racing the original waits for it here.
+        async with _ingest_lock(transcript_key):
+            ingested = await self.find_ingested(transcript_key, user_id)
+            if ingested is not None:
+                for stage in ("uploaded", "transcribed", "extracted", "saved", "indexed"):
+                    await report(stage)
+                return ingested
+            return await self._ingest(audio, user_id, unique_name, transcript_key, report)
 
-        unique_name = self.timestamp_filename(filename) # genenrate unique name 
-        audio_url = self.repository.upload_audio_file(unique_name, content) # url for the audio
-        raw_transcription = self.transcribe(content, unique_name) #raw transcription
-        extracted_data = self.extract_and_split(raw_transcription) #extracted
+    async def _ingest(self, audio: AudioBuffer, user_id: str, unique_name: str, transcript_key: str, report: Callable[..., Awaitable]):
+        async def upload():
+            url = await asyncio.to_thread(self.cache.get, "audio_url", unique_name)
+            if url is None:
+                url = await asyncio.to_thread(self.repository.upload_audio_file, unique_name, audio.payload)
+                await asyncio.to_thread(self.cache.set, "audio_url", unique_name, url, settings.transcript_cache_ttl)
+            return await report("uploaded", url)
+
+        async def transcribe():
+            text = await asyncio.to_thread(self.cache.get, "transcript", transcript_key)
+            if text is None:
+                text = await self.transcribe(audio.payload, unique_name)
+                await asyncio.to_thread(self.cache.set, "transcript", transcript_key, text, settings.transcript_cache_ttl)
+            else:
+                print(f"Transcript cache hit for {audio.content_hash}")
+            return await report("transcribed", text)
+
+        # Storage upload and Whisper don't depend on each other - run them together.
+        # The supabase client is sync, so it goes to a worker thread to keep the loop free.
+        audio_url, raw_transcription = await asyncio.gather(upload(), transcribe())
+
+        # Saying exactly the same thing again skips extraction, the insert and the Supermemory push.
+        # A near repeat is still extracted and saved - it may hold a changed detail - and is only tagged.
+        match = await self.find_duplicate(raw_transcription, user_id)
+        repeated = await self.link_duplicate(match, raw_transcription, user_id) if match and match.exact else None
+        if repeated is not None:
+            for stage in ("extracted", "saved"):
+                await report(stage)
+            # Saying it again is exactly what "what do I keep mentioning?" is about
+            await self.update_summaries(repeated["notes"], user_id, repeated=True)
+            await report("indexed")
+            # The upload ran alongside Whisper, before we knew - drop the copy no note points to
+            if unique_name not in {note.get("audio_filename") for note in repeated["notes"]}:
+                await self.discard_audio(unique_name)
+            await self.remember_ingested(transcript_key, raw_transcription, repeated["duplicate_of"])
+            return repeated
+
+        extracted_data = await self.extract_and_split(raw_transcription, user_id) #extracted
+        await report("extracted")
 
         first_item = extracted_data["items"][0]
         if first_item["isQuestion"]:
-           results = await self.query_supermemory(first_item["formattedText"])
+           results = await self.query_supermemory(first_item["formattedText"], user_id)
            # Return transcription + results so frontend can show the question
            return {
                "transcription": raw_transcription,
@@ -51,69 +152,271 @@ class VoiceService:
            }
 
 
-        response = []
+        # 4. Save MULTIPLE notes (one per item) - one round trip for the whole recording
+        response = await asyncio.to_thread(self.repository.create_notes_with_metadata, user_id, [
+            {
+                "audio_filename": unique_name,
+                "audio_url": audio_url,
+                "transcription": raw_transcription,
+                "title": item["title"],
+                "formatted_content": item["formattedText"],
+                "intent": item["intent"],
+                "tags": item["tags"],
+                "scheduled_for": item["scheduled_for"].isoformat() if item["scheduled_for"] else None,
+                "has_deadline": item["has_deadline"],
+                "metadata": {
+                    "intent": item["intent"],
+                    "tags": item["tags"],
+                    **({"similar_to": match.note_ids, "similarity": round(match.similarity, 3)} if match and not match.exact else {})
+                }
+            }
+            for item in extracted_data["items"]
+        ])
+        await report("saved")
+
+        indexed, _, _ = await asyncio.gather(
+            self.superMemoryService.add_note_memories(response, user_id),
+            self.index_locally(response, user_id),
+            self.update_summaries(response, user_id)
+        )
+        if indexed["errors"]:
+            # Notes are already saved in Supabase - a missing memory shouldn't fail the upload
+            print(f"{len(indexed['errors'])} of {len(response)} notes failed to index: {indexed['errors']}")
+        await report("indexed")
+
+        if settings.near_duplicate_detection:
+            await self.duplicates.remember_async(user_id, raw_transcription, [note["id"] for note in response])
+        await self.remember_ingested(transcript_key, raw_transcription, [note["id"] for note in response])
 
-        
-        # 4. Save MULTIPLE notes (one per item)
-        for item in extracted_data["items"]:
-            db_response = self.repository.create_note_with_metadata(
-                    audio_file_name=unique_name,
-                    audio_url=audio_url,
-                    transcription=raw_transcription,
-                    title=item["title"],
-                    formatted_content=item["formattedText"],
-                    metadata={
-                        "intent": item["intent"],
-                        "tags": item["tags"]
-                    }
-                )
-
-            await self.superMemoryService.add_note_memory(db_response, "demo_user")
-            
-            response.append(db_response)
-        # 3. Save to database
         return response
+
+    async def find_ingested(self, transcript_key: str, user_id: str) -> Optional[dict]:
+        """The notes an earlier upload of these exact audio bytes saved, shaped like a repeat. None if it saved none (any more)."""
+        ingested = await asyncio.to_thread(self.cache.get, "ingestion", transcript_key)
+        if ingested is None:
+            return None
+        notes = await asyncio.to_thread(self.repository.get_notes_by_ids, user_id, ingested["note_ids"])
+        if len(notes) != len(ingested["note_ids"]):
+            # Deleted since - ingest it again
+            return None
+        print(f"Ingestion cache hit for {transcript_key}")
+        return {
+            "transcription": ingested["transcription"],
+            "duplicate_of": ingested["note_ids"],
+            "similarity": 1.0,
+            "notes": notes
+        }
+
+    async def remember_ingested(self, transcript_key: str, transcription: str, note_ids: list):
+        await asyncio.to_thread(self.cache.set, "ingestion", transcript_key, {
+            "transcription": transcription,
+            "note_ids": note_ids
+        }, settings.transcript_cache_ttl)
+
+
+
+    async def find_duplicate(self, transcription: str, user_id: str) -> Optional[DuplicateMatch]:
+        """The recent recording this one repeats (exactly or nearly), if any"""
+        if not settings.near_duplicate_detection:
+            return None
+        return await self.duplicates.find_async(user_id, transcription)
+
+    async def link_duplicate(self, match: DuplicateMatch, transcription: str, user_id: str) -> Optional[dict]:
+        """
+        For an exact repeat, bump the repeat count on the earlier recording's
+        notes and return them instead of creating new ones. Returns None when
+        those notes are gone.
+        """
+        notes = await asyncio.to_thread(self.repository.get_notes_by_ids, user_id, match.note_ids)
+        if not notes:
+            return None
+
+        now = datetime.now(timezone.utc).isoformat()
+        updated = await asyncio.gather(*(
+            asyncio.to_thread(self.repository.update_note_metadata, user_id, note["id"], {
+                **(note.get("metadata") or {}),
+                "repeat_count": (note.get("metadata") or {}).get("repeat_count", 1) + 1,
+                "last_repeated_at": now
+            })
+            for note in notes
+        ))
+        print(f"Recording repeats {match.transcript_key} (similarity {match.similarity:.2f}) - linked to {len(updated)} notes")
+        return {
+            "transcription": transcription,
+            "duplicate_of": match.note_ids,
+            "similarity": round(match.similarity, 3),
+            "notes": updated
+        }
+
+    async def discard_audio(self, unique_name: str):
+        """Delete an uploaded recording that ended up unused. Best effort - an orphan only costs storage."""
+        try:
+            # Cache first, so a failed delete never leaves a cached URL to a missing object
+            await asyncio.to_thread(self.cache.delete, "audio_url", unique_name)
+            await asyncio.to_thread(self.repository.delete_audio_file, unique_name)
+        except Exception as e:
+            print(f"Failed to delete unused recording {unique_name}: {e}")
+
+    async def index_locally(self, notes: list[dict], user_id: str):
+        """Add saved notes to the local vector index. Best effort, like the Supermemory push."""
+        # Embeddings cost a call per ingest - only pay it when something reads the index
+        if not (settings.vector_index_enabled or settings.semantic_retrieval in ("local", "both")):
+            return
+        try:
+            added = await self.vectorService.add_notes(notes, user_id)
+            print(f"Added {added} notes to the local vector index")
+        except Exception as e:
+            print(f"Error adding notes to the local vector index: {e}")
+
+    async def update_summaries(self, notes: list[dict], user_id: str, repeated: bool = False):
+        """Fold notes into the user's rolling summaries. Best effort - a stale summary shouldn't fail an upload."""
+        if not settings.rolling_summaries:
+            return
+        try:
+            scopes = await self.summaries.fold_notes(user_id, notes, repeated)
+            print(f"Folded {len(notes)} notes into summaries: {scopes}")
+        except Exception as e:
+            print(f"Error updating rolling summaries: {e}")
     
 
-    def transcribe(self, audio_content: bytes, filename: str):
-        audio_file = BytesIO(audio_content)
-        audio_file.name = filename
-        transcription = self.client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file,
-            language="en"
+    async def transcribe(self, audio_content: bytes | Path, filename: str):
+        file_size = audio_content.stat().st_size if isinstance(audio_content, Path) else len(audio_content)
+
+        if settings.chunked_transcription and audio_chunker.chunking_available() and file_size > settings.chunked_transcription_threshold:
+            try:
+                return await self.transcribe_chunked(audio_content, filename)
+            except Exception as e:
+                # ffmpeg missing / undecodable container - one call still works below the Whisper limit
+                if file_size > WHISPER_MAX_FILE_SIZE:
+                    raise
+                print(f"Chunked transcription failed, falling back to a single call: {e}")
+
+        # The router escalates long recordings - a size estimate reads an uncompressed WAV as ~10x too long
+        seconds = await asyncio.to_thread(audio_chunker.audio_seconds, audio_content, filename)
+        # (name, content) tuple lets Whisper see the extension; the SDK reads a spilled Path fully into memory
+        return await self._transcribe_once(filename, audio_content, seconds if seconds is not None else file_size / AUDIO_BYTES_PER_SECOND)
+
+    async def _transcribe_once(self, filename: str, audio_content: bytes | Path, seconds: float) -> str:
+        """One transcription call on the routed model; an empty transcript is retried one tier up"""
+        async def call(model: str) -> str:
+            transcription = await self.client.audio.transcriptions.create(
+                model=model,
+                file=(filename, audio_content),
+                language="en"
+            )
+            return transcription.text
+
+        return await self.router.run("transcription", call, size=seconds, accept=lambda text: bool(text.strip()))
+
+    async def transcribe_chunked(self, audio_content: bytes | Path, filename: str) -> str:
+        """Split at pauses, transcribe the pieces concurrently, stitch them back in order."""
+        chunks = audio_chunker.split_audio(
+            audio_content,
+            filename,
+            chunk_ms=settings.transcription_chunk_seconds * 1000,
+            overlap_ms=settings.transcription_chunk_overlap_ms
         )
-        return transcription.text
+        # A slot is taken before the next chunk is decoded, so at most transcription_concurrency chunks exist at once
+        semaphore = asyncio.Semaphore(settings.transcription_concurrency)
+        tasks: list[asyncio.Task] = []
+
+        async def transcribe_chunk(chunk: audio_chunker.AudioChunk) -> str:
+            try:
+                return await self._transcribe_once(f"chunk_{chunk.index}.wav", chunk.content, (chunk.end_ms - chunk.start_ms) / 1000)
+            finally:
+                semaphore.release()
+
+        try:
+            while True:
+                await semaphore.acquire()
+                # Decoding/resampling is CPU + ffmpeg work - keep it off the event loop
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                tasks.append(asyncio.create_task(transcribe_chunk(chunk)))
+            print(f"Transcribing {filename} as {len(tasks)} chunks")
+            parts = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return audio_chunker.stitch_transcripts(parts)
 
 
-    def extract_and_split(self, raw_transcript):
+    async def extract_and_split(self, raw_transcript, user_id: str):
         
         if len(raw_transcript.strip()) < 5:
             raise ValueError("Transcription too short - please speak more clearly")
-        extract_prompt = prompt.extract_items_prompt(raw_transcript)
 
+        # "tomorrow" / "on Friday" resolve against the day of the call - one day's extraction is no good the next
+        now = datetime.now(timezone.utc)
+        cache_key = f"{user_id}:{now.date().isoformat()}:{hashlib.sha256(raw_transcript.strip().encode()).hexdigest()}"
+        cached = await asyncio.to_thread(self.cache.get, "extraction", cache_key)
+        if cached is not None:
+            print(f"Extraction cache hit for {cache_key}")
+            return NoteMetadata.model_validate(cached).model_dump()
 
-        response = self.client.beta.chat.completions.parse(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": extract_prompt}],
-            response_format=NoteMetadata,
-            temperature=0.3
+        messages = prompt.EXTRACT_ITEMS.messages(now=now, text=raw_transcript)
+
+        async def call(model: str):
+            response = await self.client.beta.chat.completions.parse(
+                model=model,
+                messages=messages,
+                response_format=NoteMetadata,
+                temperature=0.3
+            )
+            prompt.EXTRACT_ITEMS.record_usage(response.usage)
+            return response.choices[0].message.parsed
+
+        # With the fast tier opted in (see POLICIES), a long or many-part ramble still starts on the strong one
+        parsed = await self.router.run(
+            "extraction",
+            call,
+            size=count_tokens(raw_transcript),
+            complex=len(COMPOUND_MARKERS.findall(raw_transcript)) >= 4,
+            accept=_usable_extraction
         )
-        parsed = response.choices[0].message.parsed
 
+        await asyncio.to_thread(self.cache.set, "extraction", cache_key, parsed.model_dump(mode="json"), settings.extraction_cache_ttl)
         return parsed.model_dump()
 
-    def get_all_notes(self) -> list[dict]:
-        return self.repository.get_all_notes()
+    async def get_all_notes(self, user_id: str) -> list[dict]:
+        return await asyncio.to_thread(self.repository.get_all_notes, user_id)
         
-    def search_notes(self, query) -> list[dict]:
-        return self.repository.search_notes(query)
+    async def list_notes(self, user_id: str, limit: int, fields: Optional[str] = None, cursor: Optional[str] = None, contains: Optional[str] = None) -> dict:
+        """A page of notes, newest first: {"items", "next_cursor"}. Raises InvalidPageRequestError on a bad cursor/field."""
+        columns = parse_fields(fields, NOTE_FIELDS, DEFAULT_NOTE_FIELDS, required=("id", "uploaded_at"))
+        position = decode_cursor(cursor, ("u", "i"))
+        after = (position["u"], position["i"]) if position else None
+
+        # One extra row tells us whether there's a next page without a count query
+        rows = await asyncio.to_thread(self.repository.list_notes, user_id, columns, limit + 1, after, contains)
+        items = rows[:limit]
+        next_cursor = encode_cursor({"u": items[-1]["uploaded_at"], "i": items[-1]["id"]}) if len(rows) > limit else None
+        return page(items, next_cursor)
+
+    async def search_notes(self, user_id: str, query, limit: int = 20, mode: str = "fulltext", fields: Optional[str] = None, cursor: Optional[str] = None) -> dict:
+        """`fulltext` is ranked and indexed; `substring` is the old unranked ILIKE match, newest first"""
+        if mode == "substring":
+            return await self.list_notes(user_id, limit, fields, cursor, contains=query)
+
+        columns = parse_fields(fields, NOTE_FIELDS, DEFAULT_NOTE_FIELDS, required=("id",))
+        position = decode_cursor(cursor, ("r", "i", "f"))
+        after = (position["r"], position["i"], position["f"]) if position else None
+
+        rows = await asyncio.to_thread(self.repository.search_notes_ranked, user_id, query, limit + 1, after)
+        items = [
+            {**{column: row.get(column) for column in columns}, "rank": row["rank"], "snippet": row["snippet"]}
+            for row in rows[:limit]
+        ]
+        last = rows[limit - 1] if len(rows) > limit else None
+        next_cursor = encode_cursor({"r": last["rank"], "i": last["id"], "f": last["fuzzy"]}) if last else None
+        return page(items, next_cursor)
 
 
-    async def query_supermemory(self, query):
+    async def query_supermemory(self, query, user_id: str):
         try:
-            supermemory = SupermemoryService()
-            return await supermemory.two_phrase_search("demo_user", query, limit=10)
+            return await self.superMemoryService.two_phrase_search(user_id, query, limit=10)
         except Exception as e:
             print(f"Failed to fetch {e}")
-            raise HTTPException(status_code=500, detail="failed to fetch")
\ No newline at end of file
+            raise HTTPException(status_code=500, detail="failed to fetch")
@@ -0,0 +1,244 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable, Optional
+
+from fastapi import Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from app.core.config import settings
+
+
+class AudioTooLargeError(ValueError):
+    """Raised while reading an upload as soon as it crosses the size limit"""
+    pass
+
+
+class AudioByteBudget:
+    """
+    Process-wide cap on audio bytes held by in-flight uploads.
+
+    Each upload reserves its size before reading and releases it once the
+    pipeline is done with the buffer, so total audio memory stays bounded no
+    matter how many requests arrive - extra uploads wait for room instead.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_use = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, amount: int, timeout: Optional[float] = None) -> int:
+        # A single upload larger than the whole budget still gets to run, alone
+        amount = min(amount, self.capacity)
+        async with self._condition:
+            await asyncio.wait_for(
+                self._condition.wait_for(lambda: self.in_use + amount <= self.capacity),
+                timeout
+            )
+            self.in_use += amount
+        return amount
+
+    async def release(self, amount: int):
+        async with self._condition:
+            self.in_use -= amount
+            self._condition.notify_all()
+
+
+audio_budget = AudioByteBudget(settings.inflight_audio_budget)
+
+
+class AudioBuffer:
+    """
+    Write-once buffer for one uploaded recording.
+
+    Small recordings stay in memory as a single bytes object; past the spool
+    threshold everything moves to a temp file. Either way `payload` is handed
+    as-is to both storage and Whisper. In-memory bytes are shared by both, but a
+    spilled file is not streamed: each consumer (the OpenAI SDK included) reads
+    it fully into memory for the duration of its call. Spilling bounds what is
+    held while the upload is read and queued, not the peak during those calls.
+
+    The sha256 of the audio is computed while it streams in, so callers get a
+    content key for free (see VoiceService.upload_and_create).
+    """
+
+    def __init__(self, filename: str, spool_threshold: int = settings.audio_spool_threshold):
+        self.filename = filename
+        self.size = 0
+        self.spool_threshold = spool_threshold
+        self._chunks: list[bytes] = []
+        self._data: Optional[bytes] = None
+        self._file = None
+        self._path: Optional[Path] = None
+        self.content_type: Optional[str] = None
+        self._reserved = 0
+        self._hasher = hashlib.sha256()
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        self._hasher.update(chunk)
+        if self._file is None and self.size > self.spool_threshold:
+            self._spill()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._chunks.append(chunk)
+
+    def _spill(self):
+        suffix = os.path.splitext(self.filename)[1]
+        self._file = tempfile.NamedTemporaryFile(prefix="trunq_audio_", suffix=suffix, delete=False)
+        self._path = Path(self._file.name)
+        for chunk in self._chunks:
+            self._file.write(chunk)
+        self._chunks = []
+
+    def seal(self):
+        """Finish writing. Joins in-memory chunks once or flushes the temp file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        elif self._data is None:
+            self._data = b"".join(self._chunks)
+            self._chunks = []
+
+    @property
+    def payload(self) -> bytes | Path:
+        """What to hand to storage/OpenAI: the shared bytes, or the spooled file path"""
+        return self._path if self._path is not None else self._data
+
+    @property
+    def content_hash(self) -> str:
+        return self._hasher.hexdigest()
+
+    @property
+    def spilled(self) -> bool:
+        return self._path is not None
+
+    async def close(self):
+        """Drop the audio and give its bytes back to the budget. Safe to call twice."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._path is not None:
+            self._path.unlink(missing_ok=True)
+            self._path = None
+        self._chunks = []
+        self._data = None
+
+        if self._reserved:
+            reserved, self._reserved = self._reserved, 0
+            await audio_budget.release(reserved)
+
+
+class InvalidUploadError(ValueError):
+    """The request isn't a multipart upload with the expected file field"""
+    pass
+
+
+# Boundaries and part headers around the file in a multipart body
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+async def read_upload(
+    request: Request,
+    field: str,
+    filename: Optional[str] = None,
+    validate: Optional[Callable[[str, str], None]] = None,
+    max_size: int = settings.max_upload_size
+) -> AudioBuffer:
+    """
+    Stream the `field` file of a multipart request body into an AudioBuffer.
+
+    Reads `request.stream()` directly instead of letting Starlette spool the
+    form first, so the audio is written exactly once and an oversized upload
+    is rejected before it's read (declared Content-Length) or the moment the
+    running total crosses `max_size`. `validate(filename, content_type)` runs
+    as soon as the part's headers arrive, before any of its bytes.
+
+    Waits on the global audio budget for the upload's real size; raises
+    asyncio.TimeoutError if no room frees up in time.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise InvalidUploadError("Expected a multipart/form-data upload")
+
+    declared = request.headers.get("content-length")
+    declared = int(declared) if declared and declared.isdigit() else None
+    if declared is not None and declared > max_size + MULTIPART_OVERHEAD:
+        raise AudioTooLargeError(f"File too large: {declared / 1024 / 1024:.2f}MB (max: {max_size / 1024 / 1024}MB)")
+
+    # Without a length (chunked encoding) only the spool threshold is ever in memory while
+    # reading - reserve that now and the rest once the real size is known
+    reserved = await audio_budget.acquire(min(declared or settings.audio_spool_threshold, max_size), timeout=settings.audio_budget_wait_seconds)
+
+    part = {"headers": {}, "header_field": b"", "header_value": b"", "target": None}
+    buffers: list[AudioBuffer] = []
+
+    def on_part_begin():
+        part.update(headers={}, target=None)
+
+    def on_header_field(data: bytes, start: int, end: int):
+        part["header_field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        part["header_value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["header_field"].lower()] = part["header_value"]
+        part.update(header_field=b"", header_value=b"")
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        if disposition.get(b"name", b"").decode() != field or b"filename" not in disposition or buffers:
+            return
+        upload_name = disposition[b"filename"].decode(errors="replace")
+        upload_type = part["headers"].get(b"content-type", b"").decode(errors="replace")
+        if validate:
+            validate(upload_name, upload_type)
+        buffer = AudioBuffer(filename or upload_name or "audio.wav")
+        buffer.content_type = upload_type
+        buffer._reserved = reserved
+        buffers.append(buffer)
+        part["target"] = buffer
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if part["target"] is not None:
+            part["target"].write(data[start:end])
+            if part["target"].size > max_size:
+                raise AudioTooLargeError(f"File too large (max: {max_size / 1024 / 1024}MB)")
+
+    def on_part_end():
+        part["target"] = None
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    try:
+        async for chunk in request.stream():
+            # Parsing is a byte scan, and writes past the spool threshold go to disk - both cheap per chunk
+            parser.write(chunk)
+        parser.finalize()
+        if not buffers:
+            raise InvalidUploadError(f"Missing file field '{field}'")
+
+        buffer = buffers[0]
+        buffer.seal()
+        if declared is None and buffer.size > reserved:
+            buffer._reserved += await audio_budget.acquire(buffer.size - reserved, timeout=settings.audio_budget_wait_seconds)
+        return buffer
+    except BaseException:
+        if buffers:
+            await buffers[0].close()
+        else:
+            await audio_budget.release(reserved)
+        raise
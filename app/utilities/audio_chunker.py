@@ -0,0 +1,171 @@
+import importlib.util
+import io
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import wave
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import count
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+def chunking_available() -> bool:
+    # optional - chunked transcription needs pydub and the ffmpeg binary (nixpacks.toml installs it, render.yaml doesn't).
+    # pydub is checked without importing it: it probes for ffmpeg on import, which slows startup
+    return importlib.util.find_spec("pydub") is not None and shutil.which("ffmpeg") is not None
+
+
+SAMPLE_RATE = 16000
+
+
+@dataclass
+class AudioChunk:
+    index: int
+    start_ms: int
+    end_ms: int
+    content: bytes  # 16kHz mono wav, small enough for one Whisper call
+
+
+def audio_seconds(audio: bytes | Path, filename: str) -> Optional[float]:
+    """
+    Duration read from the container, when that's cheap: the header of a WAV
+    (no ffmpeg needed), otherwise ffprobe via pydub for a file already on disk.
+    None when neither works - callers fall back to estimating from the size.
+    """
+    if os.path.splitext(filename)[1].lower() == ".wav":
+        try:
+            with wave.open(str(audio) if isinstance(audio, Path) else io.BytesIO(audio)) as wav:
+                return wav.getnframes() / wav.getframerate()
+        except (wave.Error, EOFError):
+            pass  # float/extensible WAVs the stdlib can't read - ffprobe can
+    if not isinstance(audio, Path) or importlib.util.find_spec("pydub") is None or shutil.which("ffprobe") is None:
+        return None
+    from pydub.utils import mediainfo
+
+    try:
+        return float(mediainfo(str(audio))["duration"])
+    except (KeyError, ValueError, OSError):
+        return None
+
+
+def _decode_window(source: Path, start_ms: int, length_ms: int):
+    """Decode only [start_ms, start_ms + length_ms) of a recording, as 16kHz mono - ffmpeg seeks to the start"""
+    from pydub import AudioSegment
+
+    result = subprocess.run(
+        ["ffmpeg", "-v", "error", "-ss", f"{start_ms / 1000:.3f}", "-t", f"{length_ms / 1000:.3f}", "-i", str(source),
+         "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1"],
+        capture_output=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode the recording: {result.stderr.decode(errors='replace').strip()}")
+    return AudioSegment(result.stdout, sample_width=2, frame_rate=SAMPLE_RATE, channels=1)
+
+
+@contextmanager
+def _as_file(audio: bytes | Path, filename: str) -> Iterator[Path]:
+    # Uploads this long are normally spooled to disk already; ffmpeg needs a seekable file either way
+    if isinstance(audio, Path):
+        yield audio
+        return
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(filename)[1]) as spooled:
+        spooled.write(audio)
+        spooled.flush()
+        yield Path(spooled.name)
+
+
+def _pick_cut(silences: list[list[int]], target_ms: int, window_ms: int) -> int | None:
+    """Middle of the silence closest to target_ms, if one falls within +/- window_ms."""
+    best = None
+    for start, end in silences:
+        middle = (start + end) // 2
+        if abs(middle - target_ms) <= window_ms and (best is None or abs(middle - target_ms) < abs(best - target_ms)):
+            best = middle
+    return best
+
+
+def split_audio(
+    audio: bytes | Path,
+    filename: str,
+    chunk_ms: int = 60_000,
+    overlap_ms: int = 2_000,
+    min_silence_ms: int = 400,
+    silence_margin_db: float = 16.0,
+) -> Iterator[AudioChunk]:
+    """
+    Split a long recording into ~chunk_ms segments, cutting inside pauses.
+
+    Chunks are produced one at a time: ffmpeg decodes only the window the next
+    cut is looked for in (about a chunk and a quarter), so memory doesn't grow
+    with the recording and a caller transcribing as it goes holds only the
+    chunks in flight.
+
+    Each cut is placed in the silence nearest the target length (searched within
+    a quarter chunk either side) and falls back to a hard cut when the speaker
+    never pauses. Every chunk after the first starts overlap_ms early so a word
+    clipped at a boundary is heard whole by at least one Whisper call; the
+    duplicated words are removed again by stitch_transcripts.
+    """
+    from pydub.silence import detect_silence
+
+    window_ms = chunk_ms // 4
+    with _as_file(audio, filename) as source:
+        cut = 0
+        for index in count():
+            start = max(0, cut - overlap_ms) if index else 0
+            target = cut - start + chunk_ms  # relative to the decoded window
+            segment = _decode_window(source, start, target + window_ms)
+
+            if len(segment) <= target:
+                # The rest of the recording fits in this chunk
+                end = len(segment)
+            else:
+                # Silence is relative to the recording's own loudness - phones vary wildly
+                silences = [] if segment.dBFS == float("-inf") else detect_silence(
+                    segment, min_silence_len=min_silence_ms, silence_thresh=segment.dBFS - silence_margin_db, seek_step=10
+                )
+                end = _pick_cut(silences, target, window_ms)
+                if not end or end <= cut - start + overlap_ms:
+                    end = target
+
+            buffer = io.BytesIO()
+            segment[:end].export(buffer, format="wav")
+            yield AudioChunk(index=index, start_ms=start, end_ms=start + end, content=buffer.getvalue())
+
+            if len(segment) <= target:
+                return
+            cut = start + end
+
+
+def _normalize(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def stitch_transcripts(parts: list[str], max_overlap_words: int = 25, min_overlap_words: int = 2) -> str:
+    """
+    Join chunk transcripts, dropping the words repeated across each overlap.
+
+    Finds the longest run of words that ends the previous text and starts the
+    next one (compared case/punctuation-insensitively) and keeps it once. Single
+    word matches are ignored - "the the" across a cut is as likely real speech.
+    """
+    merged: list[str] = []
+    for part in parts:
+        words = part.split()
+        if not words:
+            continue
+
+        tail = [_normalize(w) for w in merged[-max_overlap_words:]]
+        head = [_normalize(w) for w in words[:max_overlap_words]]
+        overlap = 0
+        for size in range(min(len(tail), len(head)), min_overlap_words - 1, -1):
+            if tail[-size:] == head[:size]:
+                overlap = size
+                break
+
+        merged.extend(words[overlap:])
+    return " ".join(merged)
@@ -0,0 +1,86 @@
+import base64
+import binascii
+import json
+import math
+from datetime import datetime
+from typing import Optional
+
+
+class InvalidPageRequestError(ValueError):
+    """Bad cursor or unknown field in `fields` - the client's mistake, surfaced as a 400"""
+    pass
+
+
+# What /voice/notes and /voice/search can project. The raw transcription is
+# repeated on every note of a recording, so it's opt-in.
+NOTE_FIELDS = {
+    "id", "title", "formatted_content", "transcription", "metadata", "uploaded_at", "audio_url", "audio_filename",
+    "intent", "tags", "scheduled_for", "has_deadline",
+}
+DEFAULT_NOTE_FIELDS = ["id", "title", "formatted_content", "metadata", "uploaded_at", "audio_url"]
+
+MEMORY_FIELDS = {"id", "title", "summary", "metadata", "status", "type", "createdAt", "updatedAt", "customId", "containerTags", "content"}
+DEFAULT_MEMORY_FIELDS = ["id", "title", "summary", "metadata", "status", "createdAt"]
+
+
+def _is_timestamp(value) -> bool:
+    if not isinstance(value, str):
+        return False
+    try:
+        datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    return True
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_rank(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+# What each cursor key holds. Cursors come back from the client and their values go
+# into PostgREST filter strings and RPC params, so a tampered one must stop here as a 400
+CURSOR_VALUES = {
+    "u": _is_timestamp,                                 # uploaded_at of the last note
+    "i": _is_int,                                       # id of the last note
+    "r": _is_rank,                                      # search rank of the last hit
+    "f": lambda value: isinstance(value, bool),         # whether that hit came from the fuzzy phase
+    "p": lambda value: _is_int(value) and value >= 1,   # Supermemory page number
+}
+
+
+def encode_cursor(position: dict) -> str:
+    """Opaque, URL-safe cursor for the position after the last item of a page"""
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], keys: tuple[str, ...]) -> Optional[dict]:
+    if not cursor:
+        return None
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise InvalidPageRequestError("Invalid cursor")
+    if not isinstance(position, dict) or any(key not in position or not CURSOR_VALUES[key](position[key]) for key in keys):
+        raise InvalidPageRequestError("Invalid cursor")
+    return position
+
+
+def parse_fields(fields: Optional[str], allowed: set[str], default: list[str], required: tuple[str, ...] = ()) -> list[str]:
+    """
+    "title,metadata" -> ["title", "metadata"] plus `required` (what the cursor is built from).
+
+    Unknown names are rejected rather than ignored, so a typo doesn't look like empty data.
+    """
+    selected = [name.strip() for name in fields.split(",") if name.strip()] if fields else list(default)
+    unknown = [name for name in selected if name not in allowed]
+    if unknown:
+        raise InvalidPageRequestError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys([*required, *selected]))
+
+
+def page(items: list, next_cursor: Optional[str]) -> dict:
+    return {"items": items, "next_cursor": next_cursor}
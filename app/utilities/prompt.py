@@ -1,13 +1,75 @@
-from typing import LiteralString
-
+"""
+Prompt templates.
+
+Every prompt is split into a static prefix - instructions, categories,
+few-shot examples - and a short per-call suffix. The prefix goes first, as
+the system message, and is byte-identical on every call, so the provider can
+serve it from its prompt cache. Anything that changes per call (the current
+time, the user's text) is formatted into the suffix and sent last.
+"""
+import inspect
+import re
 from datetime import datetime, timezone
-# Get current datetime
-now = datetime.now(timezone.utc)
-current_date = now.strftime("%Y-%m-%d")
-current_datetime = now.strftime("%Y-%m-%d %H:%M:%S UTC")
-
-def format_text_prompt(raw_transcribed_text:str) -> str:
-    return f"""Your job is to transform raw transcribed voice notes into clean, structured notes.
+from typing import Optional
+
+from app.utilities.tokens import count_tokens
+
+
+def _compact(text: str) -> str:
+    # Indentation from the source file and runs of blank lines are tokens the model doesn't need
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(line.rstrip() for line in inspect.cleandoc(text).splitlines()))
+
+
+class PromptTemplate:
+    """A static, cacheable prefix plus a `str.format` suffix rendered per call, with token accounting."""
+
+    def __init__(self, name: str, prefix: str, suffix: str):
+        self.name = name
+        self.prefix = _compact(prefix)
+        self.suffix = _compact(suffix)
+        self.prefix_tokens = count_tokens(self.prefix)
+        self.calls = 0
+        self.suffix_tokens = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def messages(self, now: Optional[datetime] = None, **values) -> list[dict]:
+        """
+        Chat messages for one call. `{current_date}` and `{current_datetime}` in
+        the suffix come from `now` (default: the moment of the call).
+        """
+        now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+        suffix = self.suffix.format(
+            current_date=now.strftime("%Y-%m-%d"),
+            current_datetime=now.strftime("%A %Y-%m-%d %H:%M:%S UTC"),
+            **values
+        )
+        self.calls += 1
+        self.suffix_tokens += count_tokens(suffix)
+        return [{"role": "system", "content": self.prefix}, {"role": "user", "content": suffix}]
+
+    def record_usage(self, usage):
+        """Add a response's reported `usage` - how much of the prompt the provider served from cache"""
+        if usage is None:
+            return
+        self.prompt_tokens += usage.prompt_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_tokens += (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+    def stats(self) -> dict:
+        return {
+            "prefix_tokens": self.prefix_tokens,
+            "calls": self.calls,
+            "avg_suffix_tokens": round(self.suffix_tokens / self.calls, 1) if self.calls else 0,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_hit_rate": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0,
+        }
+
+
+FORMAT_TEXT = PromptTemplate(
+    "format_text",
+    """Your job is to transform raw transcribed voice notes into clean, structured notes.
 
         Rules:
         1. Remove filler words (um, like, you know, uh, etc.)
@@ -18,16 +80,16 @@ def format_text_prompt(raw_transcribed_text:str) -> str:
             - Use bullets for lists
             - Use **bold** for emphasis
             - Use proper spacing and paragraphs
-        6. Convert spoken numbers to digits ("seventeen" → "17")
-
-        Raw Transcription: {raw_transcribed_text}"""
+        6. Convert spoken numbers to digits ("seventeen" → "17")""",
+    """Raw Transcription: {text}"""
+)
 
 
+EXTRACT_ITEMS = PromptTemplate(
+    "extract_items",
+    """Your job is to break down rambling voice notes into discrete, actionable items and a clean, structured notes.
 
-def extract_items_prompt(raw_transcribed_text: str) -> str:
-      return f"""Your job is to break down rambling voice notes into discrete, actionable items and a clean, structured notes.
-
-        IMPORTANT: Current date and time is {current_datetime}
+        IMPORTANT: The current date and time is given with each transcription - resolve relative dates against it.
 
         Rules:
         1. Identify if the input is referring to one thing or multiple separate things
@@ -42,7 +104,7 @@ def extract_items_prompt(raw_transcribed_text: str) -> str:
             - "reflection" - Personal feelings, insights, or introspective thoughts (e.g., "feeling motivated today", "realized I need more rest")
             - "curiosity" - Knowledge-seeking questions or things to research (e.g., "what's the best CrossFit program?", "how does RAG work?")
             - "decisions" - Committed choices or strategic plans (e.g., "decided to switch gyms", "planning to launch in Q2")
-            - "people" - Notes about people, relationships, or social context (e.g., "Shreyas mentioned he's traveling", "mom's birthday is June 5") 
+            - "people" - Notes about people, relationships, or social context (e.g., "Shreyas mentioned he's traveling", "mom's birthday is June 5")
         4. Generate relevant topic tags (people, places, activities, concepts mentioned)
         5. Keep original meaning intact
         7. Remove filler words (um, like, you know, uh, etc.)
@@ -60,7 +122,7 @@ def extract_items_prompt(raw_transcribed_text: str) -> str:
         10. Convert spoken numbers to digits ("seventeen" → "17")
         11. Extract temporal information:
             - scheduled_for: ISO datetime when this event/task happens
-              * "tomorrow at 2pm" → calculate actual datetime based on current date {current_date}
+              * "tomorrow at 2pm" → calculate actual datetime based on the current date
               * "next Monday" → calculate actual date
               * "meeting on Oct 25 at 3pm" → 2025-10-25T15:00:00Z
               * If no specific time mentioned, set to None
@@ -78,24 +140,27 @@ def extract_items_prompt(raw_transcribed_text: str) -> str:
         Input: "Yesterday I did a CrossFit workout and it was 8 box jumps with 24 inches height and 200 meters run, 6 rounds. I was able to finish this in 15 minutes 12 seconds."
 
         Output:
-        content: "CrossFit workout with metrics", intent: "metric", tags: ["CrossFit", "workout", "box-jumps", "running"], title: "🏋️‍♂️ CrossFit Workout", formattedText: "- 8 box jumps (24 inches)\n- 200m run\n- 6 rounds\n- **Time:** 15:12", scheduled_for: None, has_deadline: False
+        content: "CrossFit workout with metrics", intent: "metric", tags: ["CrossFit", "workout", "box-jumps", "running"], title: "🏋️‍♂️ CrossFit Workout", formattedText: "- 8 box jumps (24 inches)\\n- 200m run\\n- 6 rounds\\n- **Time:** 15:12", scheduled_for: None, has_deadline: False
 
-        Example for multiple simple items:
+        Example for multiple simple items (current date 2025-10-24):
         Input: "I have to go to CrossFit tomorrow at 6am and maybe I can call Shreyas today and in the evening I have to update the software menus"
 
         Output should have 3 items:
         - content: "Go to CrossFit", intent: "schedules", tags: ["CrossFit", "fitness", "workout"], title: "🏋️‍♂️ CrossFit Session", formattedText: "Go to CrossFit tomorrow at 6am", scheduled_for: "2025-10-25T06:00:00Z", has_deadline: True
         - content: "Call Shreyas", intent: "reminder", tags: ["Shreyas", "call", "communication"], title: "📞 Call Shreyas", formattedText: "Call Shreyas today", scheduled_for: "2025-10-24T12:00:00Z", has_deadline: True
-        - content: "Update software menus", intent: "tasks", tags: ["software", "development", "menus", "update"], title: "💻 Update Software", formattedText: "Update the software menus in the evening", scheduled_for: None, has_deadline: False
+        - content: "Update software menus", intent: "tasks", tags: ["software", "development", "menus", "update"], title: "💻 Update Software", formattedText: "Update the software menus in the evening", scheduled_for: None, has_deadline: False""",
+    """Current date and time: {current_datetime}
 
         Raw transcription to process:
-        {raw_transcribed_text}"""
+        {text}"""
+)
 
 
-def analyze_query_prompt(user_query: str) -> str:
-    return f"""Your job is to analyze a natural language query about personal notes and extract structured information for retrieval.
+ANALYZE_QUERY = PromptTemplate(
+    "analyze_query",
+    """Your job is to analyze a natural language query about personal notes and extract structured information for retrieval.
 
-    IMPORTANT: Current date and time is {current_datetime}
+    IMPORTANT: The current date and time is given with each query - resolve time ranges against it.
 
     The user has notes categorized by these 10 intent types:
     - "tasks" - Concrete actionable items
@@ -118,7 +183,7 @@ def analyze_query_prompt(user_query: str) -> str:
 
     Examples:
 
-    Query: "What do I need to do today?"
+    Query: "What do I need to do today?" (current date 2025-10-26)
     Output:
     - relevant_intents: ["tasks", "reminder", "schedules"]
     - temporal_range_start: "2025-10-26T00:00:00+00:00"  (start of today)
@@ -150,40 +215,40 @@ def analyze_query_prompt(user_query: str) -> str:
     - temporal_range_start: null
     - temporal_range_end: null
     - semantic_query: "software ideas and concepts"
-    - requires_synthesis: false
-
-    User query: "{user_query}"
-    """
+    - requires_synthesis: false""",
+    """Current date and time: {current_datetime}
 
-def synthesis_prompt(user_query:str, supabase_context: list, supermemory_results: str ) -> str:
-    return f"""You are a helpful AI assistant analyzing a user's notes.
+    User query: "{user_query}\""""
+)
 
-    User asked: "{user_query}"
 
-    Structured notes from database:
-    {supabase_context}
+SYNTHESIS = PromptTemplate(
+    "synthesis",
+    """You are a helpful AI assistant analyzing a user's notes.
 
-    Contextual memories:
-    {supermemory_results}
-
-    Based on both sources above, provide a clear, concise answer to the user's question.
+    You get the user's question with structured notes from their database and contextual memories.
+    Based on both sources, provide a clear, concise answer to the user's question.
     - Combine information from both sources
     - Deduplicate if the same item appears in both
     - Use natural, conversational language
-    - If it's a task/reminder query, format as a numbered list
-    """
+    - If it's a task/reminder query, format as a numbered list""",
+    """Current date and time: {current_datetime}
 
+    Structured notes from database:
+    {notes}
 
-def systhesize(question: str, recent_context: LiteralString | str, semantic_context: str):
-    return  f"""You are analyzing a user's ADHD notes to answer their question naturally and empathetically.
+    Contextual memories:
+    {memories}
 
-        User asked: "{question}"
+    User asked: "{user_query}\""""
+)
 
-        Recent activity (working memory):
-        {recent_context}
 
-        Related patterns (long-term memory):
-        {semantic_context}
+SYSTHESIZE = PromptTemplate(
+    "two_phase_synthesis",
+    """You are analyzing a user's ADHD notes to answer their question naturally and empathetically.
+
+        You get their recent activity (working memory) and related patterns (long-term memory), then their question.
 
         IMPORTANT Instructions:
         - Answer in natural, conversational language
@@ -192,6 +257,70 @@ def systhesize(question: str, recent_context: LiteralString | str, semantic_cont
         - If they keep mentioning something but not doing it, call it out gently
         - Be specific with examples from their notes
         - Format lists clearly if there are multiple items
-        - Be empathetic but honest about patterns you see
+        - Be empathetic but honest about patterns you see""",
+    """Current date and time: {current_datetime}
+
+        Recent activity (working memory):
+        {recent_context}
+
+        Related patterns (long-term memory):
+        {semantic_context}
+
+        User asked: "{question}"
+
+        Answer their question now:"""
+)
+
+
+FOLD_SUMMARY = PromptTemplate(
+    "fold_summary",
+    """You maintain a running summary of a user's ADHD voice notes.
+
+        You get the current summary, the part of their notes it covers, and new notes to fold in.
+
+        Rules:
+        1. Return the updated summary only, within the word limit given
+        2. Keep recurring themes, things mentioned again and again, and how often (e.g. "gym mentioned 4 times")
+        3. Keep things the user keeps planning but never reports doing - those are the avoidance patterns
+        4. Merge new notes into existing themes instead of appending them one by one
+        5. Drop one-off details once they no longer say anything about a pattern
+        6. Write in the second person ("You keep mentioning...")""",
+    """Summary covers: {scope}
+        Word limit: {max_words}
+
+        Current summary:
+        {previous_summary}
+
+        New notes to fold in:
+        {new_notes}"""
+)
+
+
+PATTERN_ANSWER = PromptTemplate(
+    "pattern_answer",
+    """You are answering a question about patterns in a user's ADHD notes.
+
+        You get running summaries of everything they've noted, overall and by category, then their question.
+
+        IMPORTANT Instructions:
+        - Answer only from the summaries
+        - Speak directly to the user ("You keep mentioning..." NOT "User mentioned...")
+        - Call out repetitions and things they keep putting off, gently and specifically
+        - Format lists clearly if there are multiple items""",
+    """Summaries:
+        {summaries}
+
+        User asked: "{question}"
+
+        Answer their question now:"""
+)
+
+
+TEMPLATES = {template.name: template for template in (
+    FORMAT_TEXT, EXTRACT_ITEMS, ANALYZE_QUERY, SYNTHESIS, SYSTHESIZE, FOLD_SUMMARY, PATTERN_ANSWER
+)}
+
 
-        Answer their question now:"""
\ No newline at end of file
+def template_stats() -> dict:
+    """Per-template token accounting (per worker)"""
+    return {name: template.stats() for name, template in TEMPLATES.items()}
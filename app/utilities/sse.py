@@ -0,0 +1,23 @@
+import json
+from typing import AsyncIterator
+
+from fastapi.responses import StreamingResponse
+
+
+def format_sse(event: str, data) -> str:
+    """One Server-Sent Events frame. `data` is JSON-encoded on a single line."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def sse_response(events: AsyncIterator[tuple[str, object]]) -> StreamingResponse:
+    """Stream (event, data) pairs as text/event-stream, unbuffered by proxies."""
+
+    async def body():
+        async for event, data in events:
+            yield format_sse(event, data)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,34 @@
+import math
+import re
+from functools import lru_cache
+from importlib.util import find_spec
+
+
+def exact_counting_available() -> bool:
+    # optional - tiktoken gives exact counts for OpenAI models; without it we estimate
+    return find_spec("tiktoken") is not None
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """
+    Tokens `text` costs in a prompt for `model`, counted locally.
+
+    Falls back to a conservative estimate (the larger of ~4 chars per token
+    and ~0.75 words per token) when tiktoken isn't installed, so budgets err
+    on the side of sending less.
+    """
+    if not text:
+        return 0
+    if exact_counting_available():
+        return len(_encoding(model).encode(text))
+    return max(math.ceil(len(text) / 4), math.ceil(len(re.findall(r"\w+|[^\w\s]", text)) / 0.75))
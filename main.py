@@ -1,13 +1,51 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api import voice
 from app.api import note
+from app.core import clients
+from app.services import job_service
+from app.services.model_router import model_router
+from app.services.query_analyzer import analysis_cache, rule_stats
+from app.services.supermemory_service import search_cache
+from app.utilities.prompt import template_stats
+
+
+async def warm_up(app: FastAPI):
+    """Open upstream connection pools in the background, then flip /ready."""
+    try:
+        app.state.warm_up = await clients.registry.warm_up()
+        print(f"Warm-up finished: {app.state.warm_up}")
+    except Exception as e:
+        # Still serve traffic - requests will build what they need on demand
+        print(f"Warm-up failed: {e}")
+    app.state.ready = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the shared upstream clients and start the background ingestion workers."""
+    app.state.ready = False
+    app.state.warm_up = {}
+    clients.registry = clients.ClientRegistry()
+    job_service.ingestion_queue = job_service.IngestionJobQueue(clients.registry)
+    await job_service.ingestion_queue.start()
+    warm_up_task = asyncio.create_task(warm_up(app))
+    yield
+    warm_up_task.cancel()
+    await job_service.ingestion_queue.stop()
+    await clients.registry.aclose()
+
 
 app = FastAPI(
     title=settings.app_name,
     debug=settings.debug,
-    openapi_url=f"{settings.api_v1_prefix}/openapi.json"
+    openapi_url=f"{settings.api_v1_prefix}/openapi.json",
+    lifespan=lifespan
 )
 
 # CORS middleware for frontend access
@@ -36,6 +74,36 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe - 503 until upstream connections have been warmed."""
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {"status": "ready", "upstreams": app.state.warm_up}
+
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Hit rates for the in-process caches (per worker)."""
+    return {
+        "query_analysis": analysis_cache.stats(),
+        "query_analysis_rules": dict(rule_stats),
+        "memory_search": search_cache.stats()
+    }
+
+
+@app.get("/metrics/prompts")
+async def prompt_metrics():
+    """Static prefix size, per-call tokens and provider cache hits per prompt template (per worker)."""
+    return template_stats()
+
+
+@app.get("/metrics/models")
+async def model_metrics():
+    """Calls, errors, escalations and recent latency per routed model (per worker)."""
+    return model_router.metrics()
+
+
 # Include API routers
 app.include_router(voice.router, prefix=f"{settings.api_v1_prefix}/voice", tags=["voice"])
 app.include_router(note.router, prefix=f"{settings.api_v1_prefix}/note", tags=["note"])
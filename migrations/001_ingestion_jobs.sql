@@ -0,0 +1,17 @@
+-- Background ingestion jobs for /voice/add-voice.
+-- One row per uploaded recording; workers advance `stage` as the pipeline runs.
+
+create table if not exists ingestion_jobs (
+    id uuid primary key default gen_random_uuid(),
+    user_id text not null,
+    filename text not null,
+    status text not null default 'queued',   -- queued | running | completed | failed
+    stage text not null default 'queued',    -- queued | uploaded | transcribed | extracted | saved | indexed
+    result jsonb,
+    error text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists ingestion_jobs_user_created_idx
+    on ingestion_jobs (user_id, created_at desc);
@@ -0,0 +1,70 @@
+-- Ranked full-text search over user_files for /voice/search.
+-- Replaces the leading-wildcard ILIKE scan: a GIN index on the notes' tsvector
+-- for word matches, and a trigram index on the transcription for typos.
+
+create extension if not exists pg_trgm;
+
+-- An expression index rather than a stored column, so `select *` elsewhere
+-- doesn't start shipping tsvectors. Queries must call this same function.
+create or replace function user_files_search_vector(title text, formatted_content text, transcription text)
+returns tsvector
+language sql
+immutable
+as $$
+    select
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(formatted_content, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(transcription, '')), 'C')
+$$;
+
+create index if not exists user_files_search_vector_idx
+    on user_files using gin (user_files_search_vector(title, formatted_content, transcription));
+
+create index if not exists user_files_transcription_trgm_idx
+    on user_files using gin (transcription gin_trgm_ops);
+
+-- Returns at most `match_limit` notes, best first, as {note, rank, snippet}.
+-- Word matches are tried first; only when nothing matches does it fall back to
+-- trigram word similarity, so "grocerys" still finds "groceries".
+-- Snippets are only built for the rows being returned.
+create or replace function search_notes(search_query text, match_limit int default 20)
+returns table (note jsonb, rank real, snippet text)
+language plpgsql
+stable
+as $$
+#variable_conflict use_column
+declare
+    tsq tsquery := websearch_to_tsquery('english', search_query);
+    headline_options text := 'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5';
+begin
+    return query
+        select
+            to_jsonb(hits) - 'rank',
+            hits.rank,
+            ts_headline('english', coalesce(hits.transcription, ''), tsq, headline_options)
+        from (
+            select f.*, ts_rank_cd(user_files_search_vector(f.title, f.formatted_content, f.transcription), tsq) as rank
+            from user_files f
+            where user_files_search_vector(f.title, f.formatted_content, f.transcription) @@ tsq
+            order by rank desc
+            limit match_limit
+        ) hits
+        order by hits.rank desc;
+
+    if not found then
+        return query
+            select
+                to_jsonb(hits) - 'rank',
+                hits.rank,
+                ts_headline('english', coalesce(hits.transcription, ''), tsq, headline_options)
+            from (
+                select f.*, word_similarity(search_query, f.transcription) as rank
+                from user_files f
+                where search_query <% f.transcription
+                order by rank desc
+                limit match_limit
+            ) hits
+            order by hits.rank desc;
+    end if;
+end;
+$$;
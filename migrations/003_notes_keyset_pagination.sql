@@ -0,0 +1,77 @@
+-- Keyset pagination for /voice/notes and /voice/search.
+-- Listings walk (uploaded_at desc, id desc); ranked search walks (rank desc, id).
+
+create index if not exists user_files_uploaded_at_id_idx
+    on user_files (uploaded_at desc, id desc);
+
+-- search_notes gains a cursor: the rank and id of the last row of the previous
+-- page, and which phase produced it. `fuzzy` is null on the first page (try
+-- word matches, fall back to trigram similarity), then pinned by the cursor so
+-- running out of word matches on page 3 doesn't start returning fuzzy ones.
+drop function if exists search_notes(text, int);
+
+create or replace function search_notes(
+    search_query text,
+    match_limit int default 20,
+    after_rank real default null,
+    after_id text default null,
+    fuzzy boolean default null
+)
+returns table (note jsonb, rank real, snippet text, is_fuzzy boolean)
+language plpgsql
+stable
+as $$
+#variable_conflict use_column
+declare
+    tsq tsquery := websearch_to_tsquery('english', search_query);
+    headline_options text := 'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5';
+begin
+    if fuzzy is not true then
+        return query
+            select
+                to_jsonb(hits) - 'rank',
+                hits.rank,
+                ts_headline('english', coalesce(hits.transcription, ''), tsq, headline_options),
+                false
+            from (
+                select *
+                from (
+                    select f.*, ts_rank_cd(user_files_search_vector(f.title, f.formatted_content, f.transcription), tsq) as rank
+                    from user_files f
+                    where user_files_search_vector(f.title, f.formatted_content, f.transcription) @@ tsq
+                ) ranked
+                where after_rank is null
+                    or ranked.rank < after_rank
+                    or (ranked.rank = after_rank and ranked.id::text > after_id)
+                order by ranked.rank desc, ranked.id::text
+                limit match_limit
+            ) hits
+            order by hits.rank desc, hits.id::text;
+
+        if found or fuzzy is false then
+            return;
+        end if;
+    end if;
+
+    return query
+        select
+            to_jsonb(hits) - 'rank',
+            hits.rank,
+            ts_headline('english', coalesce(hits.transcription, ''), tsq, headline_options),
+            true
+        from (
+            select *
+            from (
+                select f.*, word_similarity(search_query, f.transcription) as rank
+                from user_files f
+                where search_query <% f.transcription
+            ) ranked
+            where after_rank is null
+                or ranked.rank < after_rank
+                or (ranked.rank = after_rank and ranked.id::text > after_id)
+            order by ranked.rank desc, ranked.id::text
+            limit match_limit
+        ) hits
+        order by hits.rank desc, hits.id::text;
+end;
+$$;
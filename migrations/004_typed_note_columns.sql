@@ -0,0 +1,31 @@
+-- Promote the extraction fields chat filters on from metadata jsonb to typed,
+-- indexed columns, so intent and time filters run inside Postgres instead of
+-- fetching every note of an intent and leaving the rest to the LLM.
+-- `metadata` keeps its copy of intent/tags for existing readers (Supermemory push).
+
+alter table user_files
+    add column if not exists intent text,
+    add column if not exists tags text[] not null default '{}',
+    add column if not exists scheduled_for timestamptz,
+    add column if not exists has_deadline boolean not null default false;
+
+update user_files
+set
+    intent = metadata->>'intent',
+    tags = coalesce(
+        (select array_agg(tag) from jsonb_array_elements_text(metadata->'tags') as tag),
+        '{}'
+    )
+where intent is null
+    and metadata ? 'intent';
+
+-- "tasks" newest first (chat candidates), and "schedules between Monday and Friday"
+create index if not exists user_files_intent_uploaded_at_idx
+    on user_files (intent, uploaded_at desc);
+
+create index if not exists user_files_intent_scheduled_for_idx
+    on user_files (intent, scheduled_for)
+    where scheduled_for is not null;
+
+create index if not exists user_files_tags_idx
+    on user_files using gin (tags);
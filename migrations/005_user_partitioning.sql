@@ -0,0 +1,113 @@
+-- Scope every note to its owner. Until now everything was written as the
+-- shared "demo_user" and queries had no user predicate, so each request
+-- scanned every user's rows. Indexes now lead with user_id, so a request
+-- only touches the caller's slice.
+
+create extension if not exists btree_gin;
+
+alter table user_files add column if not exists user_id text;
+
+-- Existing rows were all written by the single demo account
+update user_files set user_id = 'demo_user' where user_id is null;
+
+alter table user_files alter column user_id set not null;
+
+-- Listings and keyset pages: (user_id, uploaded_at desc, id desc)
+create index if not exists user_files_user_uploaded_at_id_idx
+    on user_files (user_id, uploaded_at desc, id desc);
+drop index if exists user_files_uploaded_at_id_idx;
+
+-- Chat candidates by intent, newest first / inside a scheduled window
+create index if not exists user_files_user_intent_uploaded_at_idx
+    on user_files (user_id, intent, uploaded_at desc);
+drop index if exists user_files_intent_uploaded_at_idx;
+
+create index if not exists user_files_user_intent_scheduled_for_idx
+    on user_files (user_id, intent, scheduled_for)
+    where scheduled_for is not null;
+drop index if exists user_files_intent_scheduled_for_idx;
+
+create index if not exists user_files_user_tags_idx
+    on user_files using gin (user_id, tags);
+drop index if exists user_files_tags_idx;
+
+-- Full-text and trigram search, with the user as the leading (btree_gin) key
+create index if not exists user_files_user_search_vector_idx
+    on user_files using gin (user_id, user_files_search_vector(title, formatted_content, transcription));
+drop index if exists user_files_search_vector_idx;
+
+create index if not exists user_files_user_transcription_trgm_idx
+    on user_files using gin (user_id, transcription gin_trgm_ops);
+drop index if exists user_files_transcription_trgm_idx;
+
+-- search_notes from 003, restricted to one user's notes
+drop function if exists search_notes(text, int, real, text, boolean);
+
+create or replace function search_notes(
+    search_user_id text,
+    search_query text,
+    match_limit int default 20,
+    after_rank real default null,
+    after_id text default null,
+    fuzzy boolean default null
+)
+returns table (note jsonb, rank real, snippet text, is_fuzzy boolean)
+language plpgsql
+stable
+as $$
+#variable_conflict use_column
+declare
+    tsq tsquery := websearch_to_tsquery('english', search_query);
+    headline_options text := 'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5';
+begin
+    if fuzzy is not true then
+        return query
+            select
+                to_jsonb(hits) - 'rank',
+                hits.rank,
+                ts_headline('english', coalesce(hits.transcription, ''), tsq, headline_options),
+                false
+            from (
+                select *
+                from (
+                    select f.*, ts_rank_cd(user_files_search_vector(f.title, f.formatted_content, f.transcription), tsq) as rank
+                    from user_files f
+                    where f.user_id = search_user_id
+                        and user_files_search_vector(f.title, f.formatted_content, f.transcription) @@ tsq
+                ) ranked
+                where after_rank is null
+                    or ranked.rank < after_rank
+                    or (ranked.rank = after_rank and ranked.id::text > after_id)
+                order by ranked.rank desc, ranked.id::text
+                limit match_limit
+            ) hits
+            order by hits.rank desc, hits.id::text;
+
+        if found or fuzzy is false then
+            return;
+        end if;
+    end if;
+
+    return query
+        select
+            to_jsonb(hits) - 'rank',
+            hits.rank,
+            ts_headline('english', coalesce(hits.transcription, ''), tsq, headline_options),
+            true
+        from (
+            select *
+            from (
+                select f.*, word_similarity(search_query, f.transcription) as rank
+                from user_files f
+                where f.user_id = search_user_id
+                    and search_query <% f.transcription
+            ) ranked
+            where after_rank is null
+                or ranked.rank < after_rank
+                or (ranked.rank = after_rank and ranked.id::text > after_id)
+            order by ranked.rank desc, ranked.id::text
+            limit match_limit
+        ) hits
+        order by hits.rank desc, hits.id::text;
+end;
+$$;
@@ -0,0 +1,14 @@
+-- Rolling per-user summaries for pattern questions ("what am I avoiding?").
+-- One row per user and scope: "overall", plus one per intent. Each ingest
+-- folds the new notes into the previous summary, so answering reads a
+-- handful of short rows instead of the user's whole history.
+
+create table if not exists user_summaries (
+    user_id text not null,
+    scope text not null,                    -- overall | tasks | schedules | reminder | ...
+    summary text not null default '',
+    item_count int not null default 0,      -- notes folded in so far
+    version int not null default 1,         -- bumped on every fold; writers compare-and-set on it
+    updated_at timestamptz not null default now(),
+    primary key (user_id, scope)
+);
@@ -0,0 +1,112 @@
+-- Snippets for fuzzy search hits. search_notes (005) built every snippet with
+-- ts_headline over the websearch tsquery, but the fuzzy branch only runs when
+-- that tsquery matched nothing - so fuzzy snippets never had a <mark>. They
+-- now mark the words that are trigram-similar to a query word ("dentst" ->
+-- <mark>dentist</mark>) and start just before the first one.
+
+create or replace function trigram_snippet(body text, search_query text, max_words int default 20)
+returns text
+language sql
+immutable
+as $$
+    with words as (
+        select w.word, w.position
+        from regexp_split_to_table(coalesce(body, ''), '\s+') with ordinality as w(word, position)
+        where w.word <> ''
+    ),
+    terms as (
+        select q.term
+        from regexp_split_to_table(lower(search_query), '\s+') as q(term)
+        where length(q.term) > 2
+    ),
+    marked as (
+        select words.word, words.position, exists (
+            select 1
+            from terms
+            where similarity(terms.term, lower(regexp_replace(words.word, '[^[:alnum:]'']', '', 'g'))) >= 0.4
+        ) as hit
+        from words
+    ),
+    -- A couple of words of lead-in before the first hit; the opening words when nothing is close enough
+    window_start as (
+        select greatest(coalesce(min(marked.position) filter (where marked.hit), 1) - 3, 1) as position
+        from marked
+    )
+    select string_agg(
+        case when marked.hit then '<mark>' || marked.word || '</mark>' else marked.word end,
+        ' ' order by marked.position
+    )
+    from marked, window_start
+    where marked.position >= window_start.position
+        and marked.position < window_start.position + max_words
+$$;
+
+-- search_notes from 005, with trigram snippets on the fuzzy branch
+create or replace function search_notes(
+    search_user_id text,
+    search_query text,
+    match_limit int default 20,
+    after_rank real default null,
+    after_id text default null,
+    fuzzy boolean default null
+)
+returns table (note jsonb, rank real, snippet text, is_fuzzy boolean)
+language plpgsql
+stable
+as $$
+#variable_conflict use_column
+declare
+    tsq tsquery := websearch_to_tsquery('english', search_query);
+    headline_options text := 'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5';
+begin
+    if fuzzy is not true then
+        return query
+            select
+                to_jsonb(hits) - 'rank',
+                hits.rank,
+                ts_headline('english', coalesce(hits.transcription, ''), tsq, headline_options),
+                false
+            from (
+                select *
+                from (
+                    select f.*, ts_rank_cd(user_files_search_vector(f.title, f.formatted_content, f.transcription), tsq) as rank
+                    from user_files f
+                    where f.user_id = search_user_id
+                        and user_files_search_vector(f.title, f.formatted_content, f.transcription) @@ tsq
+                ) ranked
+                where after_rank is null
+                    or ranked.rank < after_rank
+                    or (ranked.rank = after_rank and ranked.id::text > after_id)
+                order by ranked.rank desc, ranked.id::text
+                limit match_limit
+            ) hits
+            order by hits.rank desc, hits.id::text;
+
+        if found or fuzzy is false then
+            return;
+        end if;
+    end if;
+
+    return query
+        select
+            to_jsonb(hits) - 'rank',
+            hits.rank,
+            trigram_snippet(hits.transcription, search_query),
+            true
+        from (
+            select *
+            from (
+                select f.*, word_similarity(search_query, f.transcription) as rank
+                from user_files f
+                where f.user_id = search_user_id
+                    and search_query <% f.transcription
+            ) ranked
+            where after_rank is null
+                or ranked.rank < after_rank
+                or (ranked.rank = after_rank and ranked.id::text > after_id)
+            order by ranked.rank desc, ranked.id::text
+            limit match_limit
+        ) hits
+        order by hits.rank desc, hits.id::text;
+end;
+$$;
@@ -0,0 +1,36 @@
+-- 005 assigned every pre-existing note to 'demo_user', but authenticated
+-- requests are scoped to the token's `sub` - a Supabase auth user id (uuid) -
+-- so the people who recorded those notes could no longer see them.
+--
+-- Hand them to their owner once, from the SQL editor:
+--     select claim_demo_user_rows('<auth.users.id of the owner>');
+-- then rebuild the owner's rolling summaries:
+--     python -m app.services.summary_service <same id>
+-- Memories already pushed to Supermemory stay under the "demo_user" container
+-- tag; re-push the notes if the owner's chat should see them.
+
+create or replace function claim_demo_user_rows(owner_id text)
+returns int
+language plpgsql
+as $$
+declare
+    moved int;
+begin
+    if not exists (select 1 from auth.users u where u.id::text = owner_id) then
+        raise exception 'claim_demo_user_rows: % is not a Supabase auth user id', owner_id;
+    end if;
+
+    update user_files set user_id = owner_id where user_id = 'demo_user';
+    get diagnostics moved = row_count;
+
+    update ingestion_jobs set user_id = owner_id where user_id = 'demo_user';
+
+    -- Derived from the notes - rebuilt for the owner instead of merged
+    delete from user_summaries where user_id = 'demo_user';
+
+    return moved;
+end;
+$$;
+
+-- The API's key could otherwise call it through RPC and claim the rows itself
+revoke execute on function claim_demo_user_rows(text) from public, anon, authenticated;
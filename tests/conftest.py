@@ -0,0 +1,8 @@
+import pytest
+
+from app.core.cache import PersistentCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PersistentCache(str(tmp_path / "cache.sqlite3"), 16 * 1024 * 1024)
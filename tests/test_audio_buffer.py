@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+from app.utilities import audio_buffer
+from app.utilities.audio_buffer import AudioByteBudget, AudioTooLargeError, InvalidUploadError, read_upload
+
+BOUNDARY = "trunqboundary"
+SPOOL = audio_buffer.settings.audio_spool_threshold
+
+
+class FakeRequest:
+    """Just what read_upload touches: headers and the raw body stream"""
+
+    def __init__(self, body: bytes, chunk_size: int = 64 * 1024, declare_length: bool = True, hang_after: int = None):
+        self.headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+        if declare_length:
+            self.headers["content-length"] = str(len(body))
+        self.body = body
+        self.chunk_size = chunk_size
+        self.hang_after = hang_after
+        self.read = 0
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.chunk_size):
+            if self.hang_after is not None and start >= self.hang_after:
+                await asyncio.Event().wait()  # client stalls until the request is cancelled
+            self.read += 1
+            yield self.body[start:start + self.chunk_size]
+
+
+def multipart(audio: bytes, field: str = "file", filename: str = "memo.wav", content_type: str = "audio/wav") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nhello\r\n"
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode() + audio + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.fixture(autouse=True)
+def budget(monkeypatch):
+    budget = AudioByteBudget(64 * 1024 * 1024)
+    monkeypatch.setattr(audio_buffer, "audio_budget", budget)
+    return budget
+
+
+def audio(size: int) -> bytes:
+    return bytes(range(256)) * (size // 256) + bytes(size % 256)
+
+
+def test_small_upload_stays_in_memory_and_holds_its_declared_size(budget):
+    body = multipart(audio(1000))
+
+    async def scenario():
+        buffer = await read_upload(FakeRequest(body), "file")
+        assert budget.in_use == len(body)
+        assert not buffer.spilled and buffer.payload == audio(1000)
+        assert (buffer.filename, buffer.content_type, buffer.size) == ("memo.wav", "audio/wav", 1000)
+        await buffer.close()
+        assert budget.in_use == 0
+
+    asyncio.run(scenario())
+
+
+def test_upload_past_the_threshold_spools_to_disk():
+    content = audio(SPOOL + 300_000)
+
+    async def scenario():
+        buffer = await read_upload(FakeRequest(multipart(content)), "file")
+        path = buffer.payload
+        assert buffer.spilled and path.read_bytes() == content
+        await buffer.close()
+        assert not path.exists()
+
+    asyncio.run(scenario())
+
+
+def test_declared_length_over_the_limit_is_rejected_before_reading(budget):
+    request = FakeRequest(multipart(audio(500_000)))
+
+    with pytest.raises(AudioTooLargeError):
+        asyncio.run(read_upload(request, "file", max_size=100_000))
+    assert request.read == 0
+    assert budget.in_use == 0
+
+
+def test_undeclared_upload_is_cut_off_mid_stream(budget, tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_buffer.tempfile, "tempdir", str(tmp_path))
+    request = FakeRequest(multipart(audio(SPOOL * 3)), declare_length=False)
+
+    with pytest.raises(AudioTooLargeError):
+        asyncio.run(read_upload(request, "file", max_size=SPOOL * 2))
+    assert request.read < len(request.body) // request.chunk_size  # stopped before the end
+    assert budget.in_use == 0
+    assert list(tmp_path.iterdir()) == []  # the spilled part was removed
+
+
+def test_undeclared_upload_reserves_its_real_size(budget):
+    content = audio(SPOOL * 2)
+
+    async def scenario():
+        buffer = await read_upload(FakeRequest(multipart(content), declare_length=False), "file")
+        assert budget.in_use == len(content)
+        await buffer.close()
+        assert budget.in_use == 0
+
+    asyncio.run(scenario())
+
+
+def test_rejected_part_headers_release_the_budget(budget):
+    def validate(filename, content_type):
+        raise ValueError(f"{filename} is not audio")
+
+    with pytest.raises(ValueError, match="notes.txt"):
+        asyncio.run(read_upload(FakeRequest(multipart(b"x", filename="notes.txt", content_type="text/plain")), "file", validate=validate))
+    assert budget.in_use == 0
+
+
+def test_missing_field_and_non_multipart_bodies_are_invalid(budget):
+    with pytest.raises(InvalidUploadError, match="Missing file field 'audio'"):
+        asyncio.run(read_upload(FakeRequest(multipart(b"abc")), "audio"))
+
+    request = FakeRequest(b"{}")
+    request.headers["content-type"] = "application/json"
+    with pytest.raises(InvalidUploadError):
+        asyncio.run(read_upload(request, "file"))
+    assert budget.in_use == 0
+
+
+def test_cancelled_upload_releases_the_budget_and_temp_file(budget, tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_buffer.tempfile, "tempdir", str(tmp_path))
+    request = FakeRequest(multipart(audio(SPOOL * 3)), hang_after=SPOOL * 2)
+
+    async def scenario():
+        task = asyncio.create_task(read_upload(request, "file"))
+        while request.read * request.chunk_size < SPOOL * 2:
+            await asyncio.sleep(0)
+        assert budget.in_use > 0
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert budget.in_use == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_full_budget_makes_an_upload_wait_then_time_out(budget, monkeypatch):
+    monkeypatch.setattr(audio_buffer.settings, "audio_budget_wait_seconds", 0.05)
+
+    async def scenario():
+        held = await budget.acquire(budget.capacity)
+        with pytest.raises(asyncio.TimeoutError):
+            await read_upload(FakeRequest(multipart(b"abc")), "file")
+        await budget.release(held)
+        buffer = await read_upload(FakeRequest(multipart(b"abc")), "file")
+        await buffer.close()
+
+    asyncio.run(scenario())
+    assert budget.in_use == 0
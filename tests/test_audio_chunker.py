@@ -0,0 +1,62 @@
+import io
+import warnings
+from pathlib import Path
+
+import pytest
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", RuntimeWarning)  # pydub warns on import when ffmpeg isn't installed
+    from pydub import AudioSegment
+    from pydub.generators import Sine
+
+from app.utilities import audio_chunker
+
+
+@pytest.fixture
+def recording(monkeypatch):
+    """150s of speech-like tone with a 1s pause every 25s; ffmpeg replaced by slicing it"""
+    tone = Sine(440).to_audio_segment(duration=24_000).set_channels(1).set_frame_rate(16000)
+    pause = AudioSegment.silent(duration=1_000, frame_rate=16000)
+    audio = sum([tone + pause for _ in range(6)], AudioSegment.empty())
+    decoded = []
+
+    def decode_window(source, start_ms, length_ms):
+        decoded.append(length_ms)
+        return audio[start_ms:start_ms + length_ms]
+
+    monkeypatch.setattr(audio_chunker, "_decode_window", decode_window)
+    return audio, decoded
+
+
+def test_split_audio_cuts_in_pauses_one_window_at_a_time(recording):
+    audio, decoded = recording
+    chunks = audio_chunker.split_audio(Path("long.wav"), "long.wav", chunk_ms=60_000, overlap_ms=1_500)
+
+    first = next(chunks)
+    assert len(decoded) == 1 and decoded[0] <= 75_000  # nothing past the first window decoded yet
+    rest = list(chunks)
+
+    ends = [chunk.end_ms for chunk in [first, *rest]]
+    assert ends[-1] == len(audio)
+    # Cuts land in the pause nearest each target (the middle of 49-50s, then 99-100s, ...)
+    assert all(end % 25_000 == 24_500 for end in ends[:-1])
+    assert all(chunk.start_ms == previous.end_ms - 1_500 for previous, chunk in zip([first, *rest], rest))
+    assert max(decoded) <= 60_000 + 1_500 + 15_000
+
+
+def test_stitch_transcripts_drops_repeated_overlap():
+    parts = ["pick up the dry cleaning before", "the dry cleaning before five and call mom"]
+    assert audio_chunker.stitch_transcripts(parts) == "pick up the dry cleaning before five and call mom"
+
+
+def test_audio_seconds_reads_the_wav_header(tmp_path):
+    buffer = io.BytesIO()
+    AudioSegment.silent(duration=30_000, frame_rate=44100).set_sample_width(2).export(buffer, format="wav")
+    content = buffer.getvalue()
+    assert len(content) > 30 * 16_000 * 5  # what the size-based estimate would read as minutes
+    path = tmp_path / "clip.wav"
+    path.write_bytes(content)
+
+    assert audio_chunker.audio_seconds(content, "clip.wav") == pytest.approx(30.0)
+    assert audio_chunker.audio_seconds(path, "clip.wav") == pytest.approx(30.0)
+    assert audio_chunker.audio_seconds(b"not audio", "clip.m4a") is None
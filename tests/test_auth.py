@@ -0,0 +1,86 @@
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app.core import auth
+from app.core.auth import get_current_user_id
+
+SECRET = "test-jwt-secret"
+
+
+@pytest.fixture(autouse=True)
+def jwt_settings(monkeypatch):
+    monkeypatch.setattr(auth.settings, "supabase_jwt_secret", SECRET)
+    monkeypatch.setattr(auth.settings, "jwt_algorithm", "HS256")
+    monkeypatch.setattr(auth.settings, "jwt_audience", "authenticated")
+    monkeypatch.setattr(auth.settings, "dev_user_id", "")
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/me")
+    def me(user_id: str = Depends(get_current_user_id)):
+        return {"user_id": user_id}
+
+    return TestClient(app)
+
+
+def token(secret: str = SECRET, **claims) -> str:
+    claims = {"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 3600, **claims}
+    return jwt.encode({key: value for key, value in claims.items() if value is not None}, secret, algorithm="HS256")
+
+
+def get_me(client, bearer: str = None):
+    headers = {"Authorization": f"Bearer {bearer}"} if bearer is not None else {}
+    return client.get("/me", headers=headers)
+
+
+def test_valid_token_returns_its_subject(client):
+    response = get_me(client, token())
+
+    assert response.status_code == 200
+    assert response.json() == {"user_id": "user-1"}
+
+
+@pytest.mark.parametrize("bad_token", [
+    token(exp=int(time.time()) - 60),
+    token(secret="someone-elses-secret"),
+    token(sub=None),
+    token(aud="anon"),
+    "not-a-jwt",
+], ids=["expired", "bad-signature", "no-subject", "wrong-audience", "garbage"])
+def test_rejected_tokens_get_the_same_generic_401(client, bad_token):
+    response = get_me(client, bad_token)
+
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Invalid token"}
+    assert response.headers["www-authenticate"] == "Bearer"
+
+
+def test_missing_header_is_not_authenticated(client):
+    response = get_me(client)
+
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Not authenticated"}
+
+
+def test_unconfigured_secret_rejects_every_token(client, monkeypatch):
+    monkeypatch.setattr(auth.settings, "supabase_jwt_secret", "")
+
+    assert get_me(client, token()).status_code == 401
+
+
+def test_demo_user_handoff(client, monkeypatch):
+    # Until the owner runs claim_demo_user_rows (008), token-less local clients keep reading the demo rows
+    monkeypatch.setattr(auth.settings, "dev_user_id", "demo_user")
+
+    assert get_me(client).json() == {"user_id": "demo_user"}
+    # A signed-in owner is always scoped to their own id, never the demo rows
+    assert get_me(client, token(sub="owner-uuid")).json() == {"user_id": "owner-uuid"}
+    # and a bad token is rejected rather than falling back to demo_user
+    assert get_me(client, token(secret="someone-elses-secret")).status_code == 401
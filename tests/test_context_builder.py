@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+
+from app.services.context_builder import pack_context
+from app.utilities.tokens import count_tokens
+
+NOW = datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+
+
+def note(note_id: int, title: str, content: str, days_ago: float = 1) -> dict:
+    return {"id": note_id, "title": title, "formatted_content": content,
+            "uploaded_at": (NOW - timedelta(days=days_ago)).isoformat()}
+
+
+def test_packed_context_never_exceeds_the_budget():
+    notes = [note(i, f"Gym session {i}", f"Did squats and deadlifts, set {i} felt heavy today") for i in range(40)]
+    for budget in (0, 15, 60, 200):
+        packed = pack_context("gym squats", notes, [], budget, now=NOW)
+        lines = [f"- {n['title']}: {n['formatted_content']}" for n in packed.notes]
+        assert packed.tokens <= budget
+        assert packed.tokens == sum(count_tokens(line) + 1 for line in lines)
+        assert len(packed.notes) + packed.dropped_over_budget + packed.dropped_duplicates == len(notes)
+
+
+def test_near_duplicates_are_dropped():
+    notes = [
+        note(1, "Dentist", "Call the dentist to book a cleaning next week"),
+        note(2, "Dentist again", "call the dentist to book a cleaning next week!", days_ago=3),
+    ]
+    memories = ["User needs to call the dentist to book a cleaning next week", "User prefers morning appointments"]
+    packed = pack_context("dentist", notes, memories, 500, now=NOW)
+
+    assert [n["id"] for n in packed.notes] == [1]
+    assert packed.memories == ["User prefers morning appointments"]
+    assert packed.dropped_duplicates == 2
+
+
+def test_recency_breaks_ties_between_equally_relevant_items():
+    notes = [
+        note(1, "Idea", "An app that tracks houseplant watering", days_ago=30),
+        note(2, "Idea", "An app that reminds me to stretch", days_ago=1),
+        note(3, "Idea", "An app that splits grocery bills", days_ago=10),
+    ]
+    packed = pack_context("app idea", notes, [], 500, now=NOW)
+    assert [n["id"] for n in packed.notes] == [2, 3, 1]
+
+
+def test_relevance_outranks_a_slightly_newer_note():
+    notes = [note(1, "Groceries", "Buy eggs and bread", days_ago=0), note(2, "Plumber", "Call the plumber about the leak", days_ago=2)]
+    packed = pack_context("plumber leak", notes, [], 500, now=NOW)
+    assert [n["id"] for n in packed.notes] == [2, 1]
+
+
+def test_empty_input_packs_nothing():
+    packed = pack_context("anything at all", [], [], 500, now=NOW)
+    assert packed.notes == [] and packed.memories == []
+    assert packed.stats() == {"tokens": 0, "candidates": 0, "included": 0, "dropped_duplicates": 0, "dropped_over_budget": 0}
+
+
+def test_an_item_over_the_budget_is_skipped_for_smaller_ones_behind_it():
+    long_note = note(1, "Trip plan", "Lisbon trip: " + "book the hotel near the river and the tram pass, " * 30, days_ago=0)
+    short_note = note(2, "Trip", "Pack the passport for the trip", days_ago=5)
+    packed = pack_context("trip", [long_note, short_note], [], 40, now=NOW)
+
+    assert [n["id"] for n in packed.notes] == [2]
+    assert packed.dropped_over_budget == 1
+    assert packed.tokens <= 40
+
+
+def test_a_single_item_over_the_budget_leaves_the_context_empty():
+    packed = pack_context("trip", [note(1, "Trip", "word " * 500)], [], 40, now=NOW)
+    assert packed.notes == [] and packed.tokens == 0
+    assert packed.dropped_over_budget == 1
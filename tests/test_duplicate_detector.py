@@ -0,0 +1,45 @@
+from app.services.duplicate_detector import DuplicateDetector, normalize_transcript
+
+BRAIN_DUMP = (
+    "Okay so tomorrow I need to call the dentist about the cleaning, pick up the dry cleaning before six, "
+    "email Sarah the slides for Thursday's review, book flights to Denver for the conference, "
+    "and remember to water the plants because they're looking pretty sad"
+)
+
+
+def detector(cache) -> DuplicateDetector:
+    return DuplicateDetector(cache, num_perm=128, bands=16, threshold=0.8, window=3600)
+
+
+def test_exact_repeat_is_exact(cache):
+    detector_ = detector(cache)
+    detector_.remember("u1", BRAIN_DUMP, ["n1", "n2"])
+
+    match = detector_.find("u1", "Um, " + BRAIN_DUMP.upper() + "!")
+    assert match is not None and match.exact
+    assert match.note_ids == ["n1", "n2"]
+
+
+def test_changed_detail_is_never_exact(cache):
+    detector_ = detector(cache)
+    detector_.remember("u1", BRAIN_DUMP, ["n1"])
+
+    for changed in (
+        BRAIN_DUMP.replace("Denver", "Boston"),
+        BRAIN_DUMP + ", and also renew the car registration",
+    ):
+        match = detector_.find("u1", changed)
+        assert match is not None and not match.exact
+        assert match.similarity >= 0.8
+
+
+def test_other_users_and_unrelated_notes_dont_match(cache):
+    detector_ = detector(cache)
+    detector_.remember("u1", BRAIN_DUMP, ["n1"])
+
+    assert detector_.find("u2", BRAIN_DUMP) is None
+    assert detector_.find("u1", "Did 20 pull-ups and a 5k run this morning, time was 24 minutes") is None
+
+
+def test_normalize_keeps_meaningful_words():
+    assert normalize_transcript("Um, I'd like... uh, OKAY so pizza!") == "i d like okay so pizza"
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from app.services import job_service, voice_service
+from app.utilities.audio_buffer import AudioBuffer
+
+
+class FakeJobRepository:
+    def __init__(self, jobs=None):
+        self.jobs = {job["id"]: job for job in jobs or []}
+        self.writes = []
+
+    def create_job(self, user_id, filename):
+        job = {"id": f"job-{len(self.jobs)}", "user_id": user_id, "status": "queued", "stage": "queued",
+               "updated_at": datetime.now(timezone.utc)}
+        self.jobs[job["id"]] = job
+        return job
+
+    def update_job(self, job_id, fields):
+        self.writes.append(fields)
+        self.jobs[job_id].update(fields, updated_at=datetime.now(timezone.utc))
+
+    def touch_jobs(self, job_ids):
+        for job_id in job_ids:
+            self.jobs[job_id]["updated_at"] = datetime.now(timezone.utc)
+
+    def fail_stale_jobs(self, not_updated_since, error):
+        stale = [job for job in self.jobs.values()
+                 if job["status"] in ("queued", "running") and job["updated_at"] < not_updated_since]
+        for job in stale:
+            job.update(status="failed", error=error)
+        return stale
+
+
+def make_queue(repository) -> job_service.IngestionJobQueue:
+    queue = job_service.IngestionJobQueue(SimpleNamespace(supabase=None), num_workers=1)
+    queue.repository = repository
+    return queue
+
+
+def test_stages_only_move_forward(monkeypatch):
+    class OutOfOrderVoiceService:
+        def __init__(self, clients):
+            pass
+
+        async def upload_and_create(self, filename, audio, user_id, on_stage):
+            # transcription beat the storage upload
+            for stage in ("transcribed", "uploaded", "extracted", "saved", "indexed"):
+                await on_stage(stage)
+            return []
+
+    monkeypatch.setattr(voice_service, "VoiceService", OutOfOrderVoiceService)
+    repository = FakeJobRepository()
+
+    async def scenario():
+        queue = make_queue(repository)
+        await queue.start()
+        audio = AudioBuffer("a.wav")
+        audio.seal()
+        job = await queue.submit("a.wav", audio, "user-1")
+        await queue.queue.join()
+        await queue.stop()
+        return job["id"]
+
+    job_id = asyncio.run(scenario())
+    stages = [write["stage"] for write in repository.writes if "stage" in write]
+    assert stages == ["transcribed", "extracted", "saved", "indexed"]
+    assert repository.jobs[job_id]["status"] == "completed"
+
+
+def test_jobs_left_behind_by_a_dead_worker_fail_on_startup():
+    long_ago = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    repository = FakeJobRepository([
+        {"id": "orphan", "status": "running", "stage": "uploaded", "updated_at": long_ago},
+        {"id": "waiting", "status": "queued", "stage": "queued", "updated_at": long_ago},
+        {"id": "done", "status": "completed", "stage": "indexed", "updated_at": long_ago},
+        {"id": "live", "status": "running", "stage": "transcribed", "updated_at": datetime.now(timezone.utc)},
+    ])
+
+    async def scenario():
+        queue = make_queue(repository)
+        await queue.start()
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert {job_id for job_id, job in repository.jobs.items() if job["status"] == "failed"} == {"orphan", "waiting"}
+    assert repository.jobs["live"]["status"] == "running"
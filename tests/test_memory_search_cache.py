@@ -0,0 +1,33 @@
+import asyncio
+
+from app.services.supermemory_service import MemorySearchCache
+
+
+def test_write_on_one_worker_invalidates_the_others(cache):
+    # Two processes: separate entries, one shared PersistentCache
+    worker_a = MemorySearchCache(100, 120, cache)
+    worker_b = MemorySearchCache(100, 120, cache)
+
+    async def scenario():
+        version = await worker_b.version("user-1")
+        worker_b.set("user-1", "semantic", "gym", None, 5, ["went to the gym"], version)
+        worker_b.set("user-2", "semantic", "gym", None, 5, ["leg day"], await worker_b.version("user-2"))
+        assert await worker_b.get("user-1", "semantic", "gym", None, 5) == ["went to the gym"]
+
+        await worker_a.invalidate("user-1")
+        assert await worker_b.get("user-1", "semantic", "gym", None, 5) is None
+        assert await worker_b.get("user-2", "semantic", "gym", None, 5) == ["leg day"]
+
+    asyncio.run(scenario())
+
+
+def test_result_fetched_across_a_write_is_not_served(cache):
+    search_cache = MemorySearchCache(100, 120, cache)
+
+    async def scenario():
+        version = await search_cache.version("user-1")  # search starts
+        await search_cache.invalidate("user-1")         # a write lands mid-search
+        search_cache.set("user-1", "list", None, None, 10, ["stale"], version)
+        assert await search_cache.get("user-1", "list", None, None, 10) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.model_router import ModelRouter, _policies
+
+KINDS = ("chat", "transcription")
+
+
+def test_policy_overrides_apply_per_task():
+    policies = _policies({"extraction": {"escalate_above": 800}}, KINDS)
+    assert policies["extraction"].escalate_above == 800
+    assert policies["synthesis"].escalate_above is None
+
+
+@pytest.mark.parametrize("overrides, message", [
+    ({"extractoin": {"min_tier": 1}}, "unknown task(s) extractoin"),
+    ({"extraction": {"escalate_abov": 800}}, "unknown field(s) escalate_abov"),
+    ({"extraction": {"kind": "vision"}}, "kind must be one of"),
+    ({"extraction": 800}, "must be an object"),
+])
+def test_bad_policy_overrides_name_the_key(overrides, message):
+    with pytest.raises(ValueError, match=message.replace("(", r"\(").replace(")", r"\)")):
+        _policies(overrides, KINDS)
+
+
+def router(**overrides) -> ModelRouter:
+    return ModelRouter(
+        {"chat": ["small", "large"], "transcription": ["fast", "whisper"]},
+        _policies(overrides, KINDS),
+        min_samples=2
+    )
+
+
+def test_extraction_stays_on_the_stronger_model_by_default():
+    assert router().candidates("extraction", size=10) == ["large"]
+    opted_in = router(extraction={"min_tier": 0})
+    assert opted_in.candidates("extraction", size=10) == ["small", "large"]
+    assert opted_in.candidates("extraction", size=1000) == ["large"]
+    assert opted_in.candidates("extraction", size=10, complex=True) == ["large"]
+
+
+async def _answer(calls, model, text):
+    calls.append(model)
+    return text
+
+
+def test_run_escalates_on_error_and_rejected_output():
+    model_router = router()
+    calls = []
+
+    async def call(model):
+        calls.append(model)
+        if model == "small":
+            raise RuntimeError("rate limited")
+        return f"answer from {model}"
+
+    assert asyncio.run(model_router.run("synthesis", call)) == "answer from large"
+    assert calls == ["small", "large"]
+    assert model_router.stats["small"].escalations == 1
+
+    calls.clear()
+    result = asyncio.run(model_router.run("synthesis", lambda model: _answer(calls, model, ""), accept=bool))
+    assert calls == ["small", "large"] and result == ""  # the top tier's answer is returned either way
+
+
+def test_failing_tier_is_skipped_until_the_cooldown_passes():
+    model_router = router()
+    model_router.cooldown = 0.05
+    for _ in range(3):
+        model_router.record("small", False, 0.1)
+    assert model_router.candidates("synthesis") == ["large"]
+    time.sleep(0.06)
+    assert model_router.candidates("synthesis") == ["small", "large"]
+
+
+def test_routing_off_uses_the_default_tier():
+    model_router = router()
+    model_router.enabled = False
+    assert model_router.candidates("extraction", size=10) == ["large"]
+    assert model_router.candidates("synthesis", size=10_000) == ["small"]
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import voice
+from app.api.dependencies import get_voice_service
+from app.core.auth import get_current_user_id
+from app.services.voice_service import VoiceService
+from app.utilities.pagination import InvalidPageRequestError, decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("position, keys", [
+    ({"u": "2026-10-05T09:30:00.123456+00:00", "i": 1042}, ("u", "i")),
+    ({"r": 0.0607927, "i": 42, "f": True}, ("r", "i", "f")),
+    ({"r": 1, "i": 42, "f": False}, ("r", "i", "f")),
+    ({"p": 3}, ("p",)),
+])
+def test_cursor_round_trips(position, keys):
+    cursor = encode_cursor(position)
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor  # safe in a query string as-is
+    assert decode_cursor(cursor, keys) == position
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    encode_cursor({"u": "2026-10-05"}),   # missing "i"
+    "WzEsMl0",                             # valid base64 of a JSON list
+])
+def test_bad_cursors_are_the_clients_mistake(cursor):
+    with pytest.raises(InvalidPageRequestError):
+        decode_cursor(cursor, ("u", "i"))
+
+
+@pytest.mark.parametrize("position, keys", [
+    ({"u": 'x",id.gt.0', "i": 1}, ("u", "i")),                   # filter injection through the timestamp
+    ({"u": 1728120600, "i": 1}, ("u", "i")),
+    ({"u": "2026-10-05T09:30:00+00:00", "i": "1),id.gt.(0"}, ("u", "i")),
+    ({"u": "2026-10-05T09:30:00+00:00", "i": True}, ("u", "i")),
+    ({"u": "2026-10-05T09:30:00+00:00", "i": 1.5}, ("u", "i")),
+    ({"r": "0.5", "i": 1, "f": False}, ("r", "i", "f")),
+    ({"r": float("nan"), "i": 1, "f": False}, ("r", "i", "f")),
+    ({"r": 0.5, "i": 1, "f": "false"}, ("r", "i", "f")),
+    ({"p": 0}, ("p",)),
+    ({"p": "2"}, ("p",)),
+])
+def test_tampered_cursor_values_are_rejected(position, keys):
+    with pytest.raises(InvalidPageRequestError):
+        decode_cursor(encode_cursor(position), keys)
+
+
+def test_no_cursor_is_the_first_page():
+    assert decode_cursor(None, ("u", "i")) is None
+    assert decode_cursor("", ("u", "i")) is None
+
+
+class FakeNotes:
+    """list_notes over (uploaded_at desc, id desc), as the keyset query does it"""
+
+    def __init__(self, notes):
+        self.notes = sorted(notes, key=lambda note: (note["uploaded_at"], note["id"]), reverse=True)
+
+    def list_notes(self, user_id, fields, limit, after=None, contains=None):
+        rows = [note for note in self.notes if after is None or (note["uploaded_at"], note["id"]) < tuple(after)]
+        return [{field: note[field] for field in fields} for note in rows[:limit]]
+
+
+def test_walking_note_pages_returns_every_note_once():
+    # Same timestamp on several notes of one recording - the id breaks the tie
+    notes = [{"id": n, "uploaded_at": f"2026-10-0{1 + n // 3}T00:00:00+00:00", "title": f"note {n}"} for n in range(10)]
+    service = object.__new__(VoiceService)
+    service.repository = FakeNotes(notes)
+
+    async def walk():
+        seen, cursor = [], None
+        while True:
+            result = await service.list_notes("user-1", limit=3, fields="title", cursor=cursor)
+            seen += [item["id"] for item in result["items"]]
+            cursor = result["next_cursor"]
+            if cursor is None:
+                return seen
+
+    seen = asyncio.run(walk())
+    assert sorted(seen) == sorted(note["id"] for note in notes)
+    assert len(seen) == len(set(seen))
+
+
+def test_tampered_cursor_is_a_400_not_a_500():
+    app = FastAPI()
+    app.include_router(voice.router)
+    service = object.__new__(VoiceService)
+    service.repository = FakeNotes([])
+    app.dependency_overrides[get_voice_service] = lambda: service
+    app.dependency_overrides[get_current_user_id] = lambda: "user-1"
+
+    cursor = encode_cursor({"u": 'x",id.gt.0', "i": 1})
+    response = TestClient(app).get("/notes", params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
@@ -0,0 +1,61 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from app.models.response import QueryAnalysis
+from app.services import query_analyzer
+from app.services.query_analyzer import QueryAnalysisCache
+
+
+@pytest.fixture(autouse=True)
+def shared_cache(cache, monkeypatch):
+    monkeypatch.setattr(query_analyzer, "get_cache", lambda: cache)
+
+
+def october() -> QueryAnalysis:
+    return QueryAnalysis(
+        relevant_intents=["schedules"],
+        temporal_range_start=datetime(2026, 10, 1, tzinfo=timezone.utc),
+        temporal_range_end=datetime(2026, 10, 31, 23, 59, 59, tzinfo=timezone.utc),
+        semantic_query="plans in october",
+    )
+
+
+def test_ranged_analysis_is_served_unchanged_on_its_day_only():
+    cache = QueryAnalysisCache(max_entries=10, ttl=3600)
+    monday = datetime(2026, 10, 5, 9, tzinfo=timezone.utc)
+    asyncio.run(cache.set("What's on in October?", october(), monday))
+
+    same_day = asyncio.run(cache.get("what's on in october", monday.replace(hour=18)))
+    assert same_day == october()
+
+    # A month later - also a Monday - must not re-anchor the October range
+    assert asyncio.run(cache.get("what's on in october", datetime(2026, 11, 2, 9, tzinfo=timezone.utc))) is None
+
+
+def test_persistent_layer_is_shared_between_caches():
+    monday = datetime(2026, 10, 5, 9, tzinfo=timezone.utc)
+    asyncio.run(QueryAnalysisCache(10, 3600).set("What's on in October?", october(), monday))
+
+    assert asyncio.run(QueryAnalysisCache(10, 3600).get("what's on in october", monday)) == october()
+
+
+def test_rangeless_analysis_is_reused_on_other_days():
+    cache = QueryAnalysisCache(max_entries=10, ttl=3600)
+    analysis = QueryAnalysis(relevant_intents=["ideas"], semantic_query="software ideas")
+    asyncio.run(cache.set("my software ideas", analysis, datetime(2026, 10, 5, tzinfo=timezone.utc)))
+
+    assert asyncio.run(cache.get("My software ideas?", datetime(2026, 10, 6, tzinfo=timezone.utc))) == analysis
+
+
+def test_memory_entries_expire_with_the_ttl(cache):
+    lru = QueryAnalysisCache(max_entries=10, ttl=0.05)
+    analysis = QueryAnalysis(relevant_intents=["ideas"], semantic_query="software ideas")
+    now = datetime.now(timezone.utc)
+    asyncio.run(lru.set("my software ideas", analysis, now))
+    time.sleep(0.1)
+
+    assert asyncio.run(lru.get("my software ideas", now)) is None
+    assert lru.stats()["entries_in_memory"] == 0
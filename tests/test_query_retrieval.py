@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from app.services import query_service
+from app.services.query_service import QueryService
+
+NOTES = [{"id": 1, "title": "Dentist"}, {"id": 2, "title": "Plumber"}]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(query_service.settings, "semantic_retrieval", "both")
+    for timeout in ("supabase_retrieval_timeout", "supermemory_retrieval_timeout", "vector_retrieval_timeout"):
+        monkeypatch.setattr(query_service.settings, timeout, 0.05)
+
+    service = object.__new__(QueryService)
+    service.cancelled = []
+
+    def returning(value):
+        async def retrieve(analysis, user_id):
+            return value
+        return retrieve
+
+    service._query_supabase = returning(NOTES)
+    service._query_supermemory = returning(["dentist on friday", "call the plumber"])
+    service._query_vector_index = returning(["call the plumber", "buy milk"])
+    return service
+
+
+def slow(service, name):
+    async def retrieve(analysis, user_id):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            service.cancelled.append(name)
+            raise
+    return retrieve
+
+
+def failing(error):
+    async def retrieve(analysis, user_id):
+        raise error
+    return retrieve
+
+
+def retrieve(service):
+    return asyncio.run(service._retrieve(None, "user-1"))
+
+
+def test_all_sources_answer(service):
+    notes, memories, sources = retrieve(service)
+
+    assert notes == NOTES
+    # The note both semantic sources surfaced is kept once
+    assert memories == ["dentist on friday", "call the plumber", "buy milk"]
+    assert sources == {
+        "supabase": {"status": "ok", "count": 2},
+        "supermemory": {"status": "ok", "count": 2},
+        "vector_index": {"status": "ok", "count": 2}
+    }
+
+
+def test_slow_source_is_dropped_and_the_rest_still_answer(service):
+    service._query_supermemory = slow(service, "supermemory")
+
+    notes, memories, sources = retrieve(service)
+
+    assert notes == NOTES
+    assert memories == ["call the plumber", "buy milk"]
+    assert sources["supermemory"] == {"status": "timeout"}
+    assert sources["vector_index"]["status"] == "ok"
+    assert service.cancelled == ["supermemory"]
+
+
+def test_failing_source_is_dropped_without_leaking_its_message(service):
+    service._query_supabase = failing(RuntimeError("connection to db.internal:5432 refused"))
+
+    notes, memories, sources = retrieve(service)
+
+    assert notes == []
+    assert memories == ["dentist on friday", "call the plumber", "buy milk"]
+    assert sources["supabase"] == {"status": "error", "error": "RuntimeError"}
+
+
+def test_every_source_down_still_returns(service):
+    service._query_supabase = slow(service, "supabase")
+    service._query_supermemory = failing(ConnectionError("supermemory unreachable"))
+    service._query_vector_index = failing(ValueError("index not built"))
+
+    notes, memories, sources = retrieve(service)
+
+    assert (notes, memories) == ([], [])
+    assert [source["status"] for source in sources.values()] == ["timeout", "error", "error"]
+
+
+def test_semantic_retrieval_picks_the_sources(service, monkeypatch):
+    monkeypatch.setattr(query_service.settings, "semantic_retrieval", "local")
+
+    notes, memories, sources = retrieve(service)
+
+    assert list(sources) == ["supabase", "vector_index"]
+    assert memories == ["call the plumber", "buy milk"]
@@ -0,0 +1,83 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services.query_rules import analyze_with_rules, is_pattern_query, resolve_temporal_range
+
+NOW = datetime(2026, 10, 5, 12, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("question", [
+    "What am I avoiding?",
+    "what do I keep putting off lately?",
+    "Which tasks am I procrastinating on?",
+    "what do I talk about the most?",
+    "Any patterns in my ideas?",
+    "what are my habits",
+    "what do I always forget?",
+])
+def test_history_wide_questions_use_the_summaries(question):
+    assert is_pattern_query(question, NOW)
+
+
+@pytest.mark.parametrize("question", [
+    "am I avoiding the dentist?",            # names a topic
+    "do I keep mentioning Sarah's wedding?",
+    "what was I avoiding last week?",        # tied to a date range
+    "tasks for today",                       # not a pattern question
+    "what did I decide about the kitchen?",
+])
+def test_specific_questions_go_to_retrieval(question):
+    assert not is_pattern_query(question, NOW)
+
+
+def at(day: str, time: str = "12:00:00") -> datetime:
+    return datetime.fromisoformat(f"{day}T{time}+00:00")
+
+
+def resolved(phrase: str, now: datetime) -> tuple[str, str]:
+    (start, end), _, _ = resolve_temporal_range(phrase, now)
+    return start.isoformat(timespec="seconds")[:19], end.isoformat(timespec="seconds")[:19]
+
+
+@pytest.mark.parametrize("phrase, now, expected", [
+    ("today", at("2026-10-18", "23:30:00"), ("2026-10-18T00:00:00", "2026-10-18T23:59:59")),
+    ("yesterday", at("2026-10-18"), ("2026-10-17T00:00:00", "2026-10-17T23:59:59")),
+    ("yesterday", at("2026-03-01"), ("2026-02-28T00:00:00", "2026-02-28T23:59:59")),
+    ("tomorrow", at("2026-12-31"), ("2027-01-01T00:00:00", "2027-01-01T23:59:59")),
+    # Weeks run Monday to Sunday - Sunday is still "this week"
+    ("this week", at("2026-10-18"), ("2026-10-12T00:00:00", "2026-10-18T23:59:59")),
+    ("this week", at("2026-10-12"), ("2026-10-12T00:00:00", "2026-10-18T23:59:59")),
+    ("last week", at("2026-10-18"), ("2026-10-05T00:00:00", "2026-10-11T23:59:59")),
+    ("next week", at("2026-12-30"), ("2027-01-04T00:00:00", "2027-01-10T23:59:59")),
+    ("this weekend", at("2026-10-14"), ("2026-10-17T00:00:00", "2026-10-18T23:59:59")),  # Wednesday
+    ("this weekend", at("2026-10-17"), ("2026-10-17T00:00:00", "2026-10-18T23:59:59")),  # Saturday
+    ("this weekend", at("2026-10-18"), ("2026-10-17T00:00:00", "2026-10-18T23:59:59")),  # Sunday
+    ("this month", at("2026-10-31", "23:59:00"), ("2026-10-01T00:00:00", "2026-10-31T23:59:59")),
+    ("next month", at("2026-01-31"), ("2026-02-01T00:00:00", "2026-02-28T23:59:59")),
+    ("last month", at("2026-03-01", "00:00:01"), ("2026-02-01T00:00:00", "2026-02-28T23:59:59")),
+    ("last month", at("2026-01-15"), ("2025-12-01T00:00:00", "2025-12-31T23:59:59")),
+    ("last friday", at("2026-10-16"), ("2026-10-09T00:00:00", "2026-10-09T23:59:59")),  # asked on a Friday
+    ("on friday", at("2026-10-16"), ("2026-10-16T00:00:00", "2026-10-16T23:59:59")),
+])
+def test_relative_dates_resolve_against_now(phrase, now, expected):
+    assert resolved(phrase, now) == expected
+
+
+def test_no_date_phrase_leaves_the_text_alone():
+    assert resolve_temporal_range("ideas about software", at("2026-10-18")) == (None, "", "ideas about software")
+
+
+def test_rules_analysis_carries_the_resolved_range():
+    analysis = analyze_with_rules("What tasks do I have this weekend?", at("2026-10-18"))
+    assert analysis.relevant_intents == ["tasks"]
+    assert analysis.temporal_range_start == at("2026-10-17", "00:00:00")
+    assert analysis.temporal_range_end == at("2026-10-18", "23:59:59")
+    assert analysis.semantic_query == "tasks this weekend"
+
+
+def test_rules_analysis_without_a_date_has_no_range():
+    analysis = analyze_with_rules("show my ideas about software", at("2026-10-18"))
+    assert analysis.relevant_intents == ["ideas"]
+    assert analysis.temporal_range_start is None and analysis.temporal_range_end is None
+    assert analysis.requires_synthesis is False
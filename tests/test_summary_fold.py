@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from app.services import summary_service
+from app.services.summary_service import OVERALL, SummaryService
+
+
+class FakeSummaryRepository:
+    """user_summaries rows with the compare-and-set save of SummaryRepository"""
+
+    def __init__(self):
+        self.rows: dict[str, dict] = {}
+        self.saves = 0
+
+    def get_summaries(self, user_id):
+        return {scope: dict(row) for scope, row in self.rows.items()}
+
+    def save_summary(self, user_id, scope, summary, item_count, version):
+        self.saves += 1
+        if self.rows.get(scope, {}).get("version", 0) != version:
+            return False
+        self.rows[scope] = {"scope": scope, "summary": summary, "item_count": item_count, "version": version + 1}
+        return True
+
+    def write_elsewhere(self, scope, summary, item_count):
+        """Another worker's fold landing first"""
+        row = self.rows.get(scope, {"version": 0})
+        self.rows[scope] = {"scope": scope, "summary": summary, "item_count": item_count, "version": row["version"] + 1}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(summary_service.settings, "summary_fold_retries", 3)
+    service = object.__new__(SummaryService)
+    service.repository = FakeSummaryRepository()
+    service.folded_from = []
+    service.rivals = 0  # how many of the next folds another worker beats to the write
+
+    async def fold(scope, previous, new_notes):
+        service.folded_from.append(previous)
+        if service.rivals:
+            service.rivals -= 1
+            service.repository.write_elsewhere(scope, f"rival {service.rivals}", 5)
+        return f"{previous} + {new_notes.count(chr(10)) + 1} notes".strip(" +")
+
+    service._fold = fold
+    return service
+
+
+def fold_one(service, current=None):
+    note = {"intent": "tasks", "title": "Milk", "formatted_content": "buy milk"}
+    asyncio.run(service._fold_scope("user-1", OVERALL, [note], False, current))
+
+
+def test_first_write_creates_the_row(service):
+    fold_one(service)
+
+    assert service.repository.rows[OVERALL] == {"scope": OVERALL, "summary": "1 notes", "item_count": 1, "version": 1}
+    assert service.repository.saves == 1
+
+
+def test_lost_write_refolds_from_the_winner(service):
+    service.repository.rows[OVERALL] = {"scope": OVERALL, "summary": "old", "item_count": 4, "version": 2}
+    service.rivals = 1
+
+    fold_one(service, current=service.repository.get_summaries("user-1")[OVERALL])
+
+    # The second fold starts from the rival's summary, not the stale one, and keeps its count
+    assert service.folded_from == ["old", "rival 0"]
+    assert service.repository.rows[OVERALL] == {"scope": OVERALL, "summary": "rival 0 + 1 notes", "item_count": 6, "version": 4}
+
+
+def test_lost_create_race_becomes_an_update(service):
+    service.rivals = 1
+
+    fold_one(service)
+
+    assert service.folded_from == ["", "rival 0"]
+    assert service.repository.rows[OVERALL]["version"] == 2
+
+
+def test_gives_up_after_the_retries_run_out(service, capsys):
+    service.repository.rows[OVERALL] = {"scope": OVERALL, "summary": "old", "item_count": 4, "version": 2}
+    service.rivals = 10
+
+    fold_one(service, current=service.repository.get_summaries("user-1")[OVERALL])
+
+    assert service.repository.saves == 3
+    assert len(service.folded_from) == 3
+    # The last rival's row is left alone rather than overwritten
+    assert service.repository.rows[OVERALL]["summary"] == "rival 7"
+    assert "Gave up folding 1 notes into the overall summary" in capsys.readouterr().out
@@ -0,0 +1,127 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import supermemory_service
+from app.services.supermemory_service import MemorySearchCache, SupermemoryService
+
+
+class FakeDocuments:
+    def __init__(self, failing: set[str] = ()):
+        self.failing = failing
+        self.added = []
+
+    async def add(self, content, container_tag, metadata):
+        await asyncio.sleep(0)
+        if content in self.failing:
+            raise ConnectionError(f"rejected {content!r}")
+        self.added.append(content)
+        return {"id": f"doc-{metadata['note_id']}"}
+
+
+@pytest.fixture
+def service(cache, monkeypatch):
+    monkeypatch.setattr(supermemory_service, "search_cache", MemorySearchCache(16, 60, cache))
+    service = object.__new__(SupermemoryService)
+    service.client = SimpleNamespace(documents=FakeDocuments())
+    return service
+
+
+def note(note_id: int, content: str) -> dict:
+    return {"id": note_id, "title": content, "formatted_content": content, "uploaded_at": "2026-10-18T09:00:00+00:00",
+            "metadata": {"intent": "tasks", "tags": []}}
+
+
+def test_fan_out_keeps_going_past_failed_items(service):
+    async def write(item):
+        if item % 3 == 0:
+            raise ValueError(f"item {item}")
+        return item * 10
+
+    outcome = asyncio.run(service._fan_out(list(range(1, 8)), write))
+
+    assert outcome["results"] == [10, 20, 40, 50, 70]
+    assert outcome["errors"] == [{"index": 2, "error": "item 3"}, {"index": 5, "error": "item 6"}]
+
+
+def test_fan_out_caps_concurrent_writes(service, monkeypatch):
+    monkeypatch.setattr(supermemory_service.settings, "supermemory_concurrency", 2)
+    running, peak = 0, 0
+
+    async def write(item):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return item
+
+    outcome = asyncio.run(service._fan_out(list(range(6)), write))
+
+    assert outcome["results"] == list(range(6))
+    assert peak == 2
+
+
+def test_a_rejected_note_does_not_stop_the_others(service):
+    service.client.documents.failing = {"call the plumber"}
+    version = asyncio.run(supermemory_service.search_cache.version("user-1"))
+
+    outcome = asyncio.run(service.add_note_memories(
+        [note(1, "buy milk"), note(2, "call the plumber"), note(3, "book the dentist")], "user-1"
+    ))
+
+    assert service.client.documents.added == ["buy milk", "book the dentist"]
+    assert outcome["results"] == [{"id": "doc-1"}, {"id": "doc-3"}]
+    assert [error["index"] for error in outcome["errors"]] == [1]
+    # Cached searches are dropped even though one write failed
+    assert asyncio.run(supermemory_service.search_cache.version("user-1")) != version
+
+
+class FakeMemoryPages:
+    """memories.list over a fixed set of pages; `total_pages` is what Supermemory reports"""
+
+    def __init__(self, pages: list[list[str]], total_pages: int):
+        self.pages = pages
+        self.total_pages = total_pages
+        self.calls = []
+
+    async def list(self, container_tags, limit, page, filters=None):
+        self.calls.append({"page": page, "limit": limit, "filters": filters})
+        memories = self.pages[page - 1] if page <= len(self.pages) else []
+        return SimpleNamespace(memories=memories, pagination=SimpleNamespace(total_pages=self.total_pages))
+
+
+def listed(service, pages: list[list[str]], total_pages: int, **kwargs) -> list[str]:
+    service.client = SimpleNamespace(memories=FakeMemoryPages(pages, total_pages))
+
+    async def collect():
+        return [memory async for memory in service.iter_memories("user-1", **kwargs)]
+
+    return asyncio.run(collect())
+
+
+def test_iter_memories_stops_at_the_last_reported_page(service):
+    # A stray extra page past total_pages is never fetched
+    memories = listed(service, [["a", "b"], ["c", "d"], ["e"], ["stray"]], total_pages=3, page_size=2)
+
+    assert memories == ["a", "b", "c", "d", "e"]
+    assert [call["page"] for call in service.client.memories.calls] == [1, 2, 3]
+
+
+def test_iter_memories_stops_on_an_empty_page(service):
+    # total_pages overstates what's there (memories deleted mid-listing)
+    memories = listed(service, [["a", "b"], []], total_pages=5, page_size=2)
+
+    assert memories == ["a", "b"]
+    assert [call["page"] for call in service.client.memories.calls] == [1, 2]
+
+
+def test_iter_memories_fetches_only_what_max_items_needs(service):
+    memories = listed(service, [["a", "b", "c"], ["d", "e", "f"]], total_pages=2, max_items=3, page_size=50,
+                      filters={"AND": [{"key": "intent", "value": "tasks"}]})
+
+    assert memories == ["a", "b", "c"]
+    assert service.client.memories.calls == [
+        {"page": 1, "limit": 3, "filters": '{"AND": [{"key": "intent", "value": "tasks"}]}'}
+    ]
@@ -0,0 +1,175 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import voice
+from app.api.dependencies import get_voice_service
+from app.core.auth import get_current_user_id
+from app.services.duplicate_detector import DuplicateDetector
+from app.services.voice_service import VoiceService
+
+
+class FakeVoiceRepository:
+    """user_files rows and storage objects in memory"""
+
+    def __init__(self):
+        self.notes: dict[int, dict] = {}
+        self.objects: set[str] = set()
+
+    def upload_audio_file(self, filename, content):
+        self.objects.add(filename)
+        return f"https://storage.test/{filename}"
+
+    def delete_audio_file(self, filename):
+        self.objects.discard(filename)
+
+    def create_notes_with_metadata(self, user_id, notes):
+        created = []
+        for note in notes:
+            row = {**note, "id": len(self.notes) + 1, "user_id": user_id, "uploaded_at": "2026-10-18T09:00:00+00:00"}
+            self.notes[row["id"]] = row
+            created.append(row)
+        return created
+
+    def get_notes_by_ids(self, user_id, note_ids):
+        return [self.notes[i] for i in note_ids if i in self.notes and self.notes[i]["user_id"] == user_id]
+
+    def update_note_metadata(self, user_id, note_id, metadata):
+        self.notes[note_id]["metadata"] = metadata
+        return self.notes[note_id]
+
+
+class FakeMemories:
+    def __init__(self):
+        self.pushed = []
+        self.rejected: set[str] = set()
+
+    async def add_note_memories(self, notes, user_id):
+        """Same result shape as SupermemoryService._fan_out"""
+        errors = [{"index": index, "error": "rejected"} for index, note in enumerate(notes) if note["formatted_content"] in self.rejected]
+        self.pushed += [note for note in notes if note["formatted_content"] not in self.rejected]
+        return {"results": [], "errors": errors}
+
+
+@pytest.fixture
+def service(cache, monkeypatch):
+    """A VoiceService over fakes; transcripts come from `service.transcripts[audio bytes]`"""
+    service = object.__new__(VoiceService)
+    service.cache = cache
+    service.repository = FakeVoiceRepository()
+    service.superMemoryService = FakeMemories()
+    service.duplicates = DuplicateDetector(cache, 128, 16, 0.8, 3600)
+    service.summaries = SimpleNamespace(fold_notes=lambda *args: _no_scopes())
+    service.transcripts = {}
+
+    async def transcribe(audio, filename):
+        content = audio if isinstance(audio, bytes) else audio.read_bytes()
+        return service.transcripts[content]
+
+    async def extract_and_split(transcript, user_id):
+        return {"items": [
+            {"isQuestion": False, "title": part.strip().capitalize(), "formattedText": part.strip(), "intent": "tasks",
+             "tags": [], "scheduled_for": None, "has_deadline": False}
+            for part in transcript.split(" and ")
+        ]}
+
+    service.transcribe = transcribe
+    service.extract_and_split = extract_and_split
+    monkeypatch.setattr(voice.settings, "near_duplicate_detection", True)
+    monkeypatch.setattr(voice.settings, "semantic_retrieval", "supermemory")
+    monkeypatch.setattr(voice.settings, "vector_index_enabled", False)
+    return service
+
+
+async def _no_scopes():
+    return []
+
+
+@pytest.fixture
+def client(service):
+    app = FastAPI()
+    app.include_router(voice.router)
+    app.dependency_overrides[get_voice_service] = lambda: service
+    app.dependency_overrides[get_current_user_id] = lambda: "user-1"
+    return TestClient(app)
+
+
+def upload(client, content: bytes):
+    return client.post("/upload", files={"file": ("memo.wav", content, "audio/wav")})
+
+
+def test_new_recording_reports_the_notes_it_created(client, service):
+    service.transcripts[b"first take"] = "buy milk and call the plumber"
+    response = upload(client, b"first take")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "uploaded"
+    assert body["notes_created"] == 2
+    assert [note["title"] for note in body["notes"]] == ["Buy milk", "Call the plumber"]
+
+
+def test_saying_the_same_thing_again_reports_a_repeat(client, service):
+    service.transcripts[b"first take"] = "buy milk and call the plumber"
+    service.transcripts[b"second take"] = "Um, buy milk and call the plumber."
+    first = upload(client, b"first take").json()
+
+    response = upload(client, b"second take")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "duplicate"
+    assert body["notes_created"] == 0
+    assert body["duplicate_of"] == [note["id"] for note in first["notes"]]
+    assert [note["metadata"]["repeat_count"] for note in body["notes"]] == [2, 2]
+    assert len(service.repository.notes) == 2
+    assert len(service.superMemoryService.pushed) == 2
+    # The repeat's own recording was uploaded alongside Whisper - it's removed, not left orphaned
+    assert service.repository.objects == {note["audio_filename"] for note in first["notes"]}
+    assert service.cache.get("audio_url", body["notes"][0]["audio_filename"]) is not None
+
+
+def test_uploading_the_same_audio_again_reuses_the_first_result(client, service):
+    service.transcripts[b"first take"] = "buy milk and call the plumber"
+    first = upload(client, b"first take").json()
+    del service.transcripts[b"first take"]  # a second transcription would fail
+
+    response = upload(client, b"first take")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "duplicate"
+    assert body["notes_created"] == 0
+    assert body["duplicate_of"] == [note["id"] for note in first["notes"]]
+    assert len(service.repository.notes) == 2
+    assert len(service.superMemoryService.pushed) == 2
+
+
+def test_failing_side_effects_keep_the_notes_and_the_rest(client, service, monkeypatch):
+    async def index_down(notes, user_id):
+        raise ConnectionError("embeddings unavailable")
+
+    async def summaries_down(*args):
+        raise RuntimeError("summary model timed out")
+
+    monkeypatch.setattr(voice.settings, "vector_index_enabled", True)
+    monkeypatch.setattr(voice.settings, "rolling_summaries", True)
+    service.vectorService = SimpleNamespace(add_notes=index_down)
+    service.summaries = SimpleNamespace(fold_notes=summaries_down)
+    service.superMemoryService.rejected = {"call the plumber"}
+    service.transcripts[b"first take"] = "buy milk and call the plumber"
+    service.transcripts[b"second take"] = "Buy milk and call the plumber!"
+
+    response = upload(client, b"first take")
+
+    assert response.status_code == 200
+    assert response.json()["notes_created"] == 2
+    assert len(service.repository.notes) == 2
+    assert [note["formatted_content"] for note in service.superMemoryService.pushed] == ["buy milk"]
+    # Dedup and the ingestion cache were still fed: both kinds of repeat are recognised
+    assert upload(client, b"second take").json()["status"] == "duplicate"
+    del service.transcripts[b"first take"]
+    assert upload(client, b"first take").json()["status"] == "duplicate"
+    assert len(service.repository.notes) == 2
@@ -0,0 +1,49 @@
+import numpy as np
+
+from app.core.vector_index import VectorIndex
+
+
+def vectors(n: int, seed: int) -> np.ndarray:
+    raw = np.random.default_rng(seed).normal(size=(n, 8)).astype(np.float32)
+    return raw / np.linalg.norm(raw, axis=1, keepdims=True)
+
+
+def rows(ids):
+    return [{"id": i, "title": f"t{i}", "text": f"x{i}"} for i in ids]
+
+
+def test_two_instances_on_one_root_keep_each_others_rows(tmp_path):
+    # Two worker processes sharing the directory
+    first, second = VectorIndex(str(tmp_path), shard_size=4), VectorIndex(str(tmp_path), shard_size=4)
+    first.count("space", "u1")
+    second.count("space", "u1")
+
+    assert first.add("space", "u1", vectors(2, 1), rows(["a", "b"])) == 2
+    assert second.add("space", "u1", vectors(1, 2), rows(["c"])) == 1
+
+    assert VectorIndex(str(tmp_path), shard_size=4).count("space", "u1") == 3
+    assert first.count("space", "u1") == 3
+
+
+def test_add_skips_known_ids_and_search_finds_appended_rows(tmp_path):
+    index = VectorIndex(str(tmp_path), shard_size=4)
+    data = vectors(10, 3)
+    ids = [str(i) for i in range(10)]
+    assert index.add("space", "u1", data[:6], rows(ids[:6])) == 6
+    assert index.add("space", "u1", data, rows(ids)) == 4
+
+    hits = index.search("space", "u1", data[[1, 8]], k=1)
+    assert [hit[0]["id"] for hit in hits] == ["1", "8"]
+    assert index.count("space", "u2") == 0
+
+
+def test_partial_shards_are_compacted(tmp_path):
+    index = VectorIndex(str(tmp_path), shard_size=4, max_partial_shards=2)
+    data = vectors(5, 4)
+    for i in range(5):
+        index.add("space", "u1", data[i:i + 1], rows([str(i)]))
+
+    meta = index._read_meta(index._user_dir("space", "u1"))
+    assert len(meta["shards"]) <= 3
+    assert index.count("space", "u1") == 5
+    assert index.search("space", "u1", data[4], k=1)[0][0]["id"] == "4"